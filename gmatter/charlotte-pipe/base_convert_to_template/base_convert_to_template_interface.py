@@ -2,32 +2,51 @@
 SAP Sales Data Processor — Local Web UI
 Run with:  python base_convert_to_template_interface.py
 Then open: http://127.0.0.1:8080
+
+Scanning and processing run as background jobs on a worker pool (jobs.py);
+the page polls for progress and fills in results as files finish.
 """
 
 import json
+import os
 import threading
+import uuid
 import webbrowser
 from pathlib import Path
 
-from flask import Flask, jsonify, render_template_string, request
+from flask import Flask, jsonify, render_template_string, request, session
 
 from base_convert_to_template import (
     FIELD_LABELS,
     INPUT_DIR,
+    ScanCache,
     OUTPUT_HEADERS,
     REQUIRED_FIELDS,
+    OVERRIDES_PATH,
     _normalise_header,
     check_missing_required_fields,
     headers_signature,
-    process_file_with_map,
+    list_input_files,
+    open_mapping_store,
+    read_overrides,
     save_mapping,
-    scan_input_files,
+    scan_error_info,
+    scan_file,
 )
+from jobs import JobManager, process_task, scan_task
+
+try:
+    from preview import preview_mapping
+except ImportError:  # pragma: no cover - optional dependency (pyarrow)
+    preview_mapping = None
 
 app = Flask(__name__)
+app.secret_key = os.urandom(16)
 
-# In-memory state for the current run
-_scan_results: list = []
+# Worker pool + per-session scan results and jobs
+jobs = JobManager()
+# Header detection results of unchanged input files, shared by all sessions
+scan_cache = ScanCache()
 
 
 # ============================================================
@@ -245,6 +264,20 @@ HTML = """
     margin-top: 16px;
   }
 
+  /* ── Mapping preview ── */
+  .preview { margin-top: 16px; overflow-x: auto; }
+  .preview:empty { display: none; }
+  .preview p { margin-bottom: 8px; }
+  .preview table { border-collapse: collapse; font-size: 12px; margin-bottom: 12px; }
+  .preview th, .preview td {
+    border: 1px solid var(--border);
+    padding: 4px 8px;
+    text-align: left;
+    white-space: nowrap;
+  }
+  .preview th { background: var(--surface); font-weight: 600; }
+  .preview td.num { text-align: right; font-family: var(--mono); }
+
   /* ── Summary bar ── */
   .summary {
     background: var(--card);
@@ -316,6 +349,10 @@ HTML = """
 <main>
   <div class="scan-bar">
     <h2>Input Files</h2>
+    <span id="progress" class="row-count"></span>
+    <button class="btn-ghost" id="process-all-btn" onclick="processAll()" disabled>
+      Process All Ready
+    </button>
     <button class="btn-primary" id="scan-btn" onclick="scanFiles()">
       Scan Folder
     </button>
@@ -347,6 +384,49 @@ async function api(url, opts = {}) {
   return r.json();
 }
 
+// ── Background jobs: start, then poll for progress ───────
+function setProgress(text) {
+  document.getElementById("progress").textContent = text || "";
+}
+
+async function runJob(url, body, onResult) {
+  const start = await api(url, { method: "POST", body: JSON.stringify(body || {}) });
+  if (start.error) throw new Error(start.error);
+
+  let seen = 0;
+  while (true) {
+    const job = await api(`/api/jobs/${start.job_id}?since=${seen}`);
+    if (job.error && job.status === undefined) throw new Error(job.error);
+    job.results.forEach(onResult);
+    seen += job.results.length;
+    setProgress(job.status === "running" ? `${job.completed} / ${job.total}` : "");
+    if (job.status !== "running") {
+      if (job.error) throw new Error(job.error);
+      return { ...job, input_dir: start.input_dir };
+    }
+    await new Promise(r => setTimeout(r, 400));
+  }
+}
+
+function applyProcessResult(result) {
+  const f = files.find(x => x.filename === result.filename);
+  if (!f) return;
+  if (result.error) {
+    f.status = "error";
+    f.error = result.error;
+  } else {
+    f.status = "done";
+    f.row_count = result.row_count;
+  }
+  rerenderCard(f);
+  updateSummary();
+}
+
+function esc(v) {
+  return String(v ?? "").replace(/[&<>"']/g, c =>
+    ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" })[c]);
+}
+
 // ── Toast ─────────────────────────────────────────────────
 function toast(msg, isError = false) {
   const el = document.getElementById("toast");
@@ -374,23 +454,47 @@ async function scanFiles() {
   document.getElementById("summary").style.display = "none";
   document.getElementById("empty").style.display = "none";
   document.getElementById("scan-btn").disabled = true;
+  document.getElementById("process-all-btn").disabled = true;
+  files = [];
 
   try {
-    const data = await api("/api/scan");
-    files = data.files;
-    document.getElementById("dir-label").textContent = data.input_dir;
+    const job = await runJob("/api/scan", {}, f => {
+      files.push(f);
+      document.getElementById("loading").style.display = "none";
+      rerenderCard(f);
+      updateSummary();
+    });
+    files.sort((a, b) => a.filename.localeCompare(b.filename));
+    document.getElementById("dir-label").textContent = job.input_dir;
     renderAll();
 
     // Auto-process any files that are already ready
-    const ready = files.filter(f => f.status === "ready");
-    for (const f of ready) {
-      await processFile(f.filename);
+    if (files.some(f => f.status === "ready")) {
+      await processAll();
     }
   } catch (e) {
     toast("Scan failed: " + e.message, true);
   } finally {
     document.getElementById("loading").style.display = "none";
     document.getElementById("scan-btn").disabled = false;
+    document.getElementById("process-all-btn").disabled = false;
+  }
+}
+
+// ── Process every ready file as one batch job ─────────────
+async function processAll() {
+  const btn = document.getElementById("process-all-btn");
+  btn.disabled = true;
+  try {
+    const job = await runJob("/api/process_all", {}, applyProcessResult);
+    if (job.total) {
+      const failed = job.results.filter(r => r.error).length;
+      toast(`✓ ${job.total - failed} of ${job.total} ready files processed`, failed > 0);
+    }
+  } catch (e) {
+    toast("Processing failed: " + e.message, true);
+  } finally {
+    btn.disabled = false;
   }
 }
 
@@ -440,7 +544,8 @@ function buildCard(f) {
   }[f.status] || "badge-mapping";
 
   const badgeText = {
-    ready: f.from_saved_mapping ? "saved mapping" : "auto-mapped",
+    ready: !f.from_saved_mapping ? "auto-mapped"
+      : f.saved_mapping_similarity < 1 ? "similar saved mapping" : "saved mapping",
     needs_mapping: "needs mapping",
     done: "done",
     error: "error",
@@ -517,10 +622,65 @@ function buildMappingPanel(f, isReview = false) {
         <button class="btn-success" onclick="applyMapping('${f.filename}', ${isReview})">
           ${buttonLabel}
         </button>
+        <button class="btn-ghost" onclick="previewMapping('${f.filename}', ${isReview})">
+          Preview
+        </button>
       </div>
+      <div class="preview" id="preview-${isReview ? 'review-' : ''}${f.filename}"></div>
     </div>`;
 }
 
+// ── Mapping selected in a panel ───────────────────────────
+function selectedMapping(filename, prefix) {
+  const allFields = {{ field_labels | tojson }};
+  const userMap = {};
+  for (const field of Object.keys(allFields)) {
+    const sel = document.getElementById(`sel-${prefix}${filename}-${field}`);
+    if (sel && sel.value !== "") {
+      userMap[field] = parseInt(sel.value, 10);
+    }
+  }
+  return userMap;
+}
+
+// ── Preview the selected mapping (first rows + column stats) ──
+async function previewMapping(filename, isReview = false) {
+  const allFields = {{ field_labels | tojson }};
+  const prefix = isReview ? `review-` : ``;
+  const el = document.getElementById(`preview-${prefix}${filename}`);
+  el.innerHTML = `<p><span class="spinner"></span> Building preview…</p>`;
+
+  const res = await api("/api/preview", {
+    method: "POST",
+    body: JSON.stringify({ filename, col_map: selectedMapping(filename, prefix) }),
+  });
+  if (res.error) {
+    el.innerHTML = "";
+    toast(res.error, true);
+    return;
+  }
+
+  const pct = v => v == null ? "—" : `${v}%`;
+  const statRows = Object.entries(res.stats).map(([field, s]) => `
+    <tr><td>${esc(allFields[field] || field)}</td><td>${esc(s.header)}</td>
+        <td class="num">${pct(s.empty_pct)}</td><td class="num">${pct(s.numeric_pct)}</td>
+        <td class="num">${pct(s.date_pct)}</td></tr>`).join("");
+  const fields = Object.keys(allFields);
+  const previewRows = res.preview.map(r =>
+    `<tr>${fields.map(k => `<td>${esc(r[k])}</td>`).join("")}</tr>`).join("");
+
+  el.innerHTML = `
+    <p>${res.data_rows} data rows · first ${res.preview.length} shown · ${res.elapsed_ms} ms${res.cached ? "" : " (first preview of this file)"}</p>
+    <table>
+      <tr><th>Field</th><th>Column</th><th>Empty</th><th>Numeric</th><th>Date</th></tr>
+      ${statRows}
+    </table>
+    <table>
+      <tr>${fields.map(k => `<th>${esc(allFields[k])}</th>`).join("")}</tr>
+      ${previewRows}
+    </table>`;
+}
+
 // ── Apply manual mapping ──────────────────────────────────
 async function applyMapping(filename, isReview = false) {
   const f = files.find(x => x.filename === filename);
@@ -530,13 +690,7 @@ async function applyMapping(filename, isReview = false) {
   const required  = {{ required_fields | tojson }};
   const prefix = isReview ? `review-` : ``;
 
-  const userMap = {};
-  for (const field of Object.keys(allFields)) {
-    const sel = document.getElementById(`sel-${prefix}${filename}-${field}`);
-    if (sel && sel.value !== "") {
-      userMap[field] = parseInt(sel.value, 10);
-    }
-  }
+  const userMap = selectedMapping(filename, prefix);
 
   const missing = required.filter(r => userMap[r] == null);
   if (missing.length) {
@@ -553,16 +707,14 @@ async function applyMapping(filename, isReview = false) {
   }
 
   try {
-    const result = await api("/api/process", {
-      method: "POST",
-      body: JSON.stringify({
-        filename,
-        col_map: userMap,
-        header_map: headerMap,
-        save_mapping: saveIt,
-        headers_signature: f.headers_signature,
-      }),
-    });
+    let result = {};
+    await runJob("/api/process", {
+      filename,
+      col_map: userMap,
+      header_map: headerMap,
+      save_mapping: saveIt,
+      headers_signature: f.headers_signature,
+    }, r => { result = r; });
 
     if (result.error) {
       toast(result.error, true);
@@ -582,34 +734,6 @@ async function applyMapping(filename, isReview = false) {
   }
 }
 
-// ── Process a ready file ──────────────────────────────────
-async function processFile(filename) {
-  const f = files.find(x => x.filename === filename);
-  if (!f) return;
-
-  try {
-    const result = await api("/api/process", {
-      method: "POST",
-      body: JSON.stringify({ filename, col_map: f.col_map }),
-    });
-
-    if (result.error) {
-      f.status = "error";
-      f.error = result.error;
-    } else {
-      f.status = "done";
-      f.row_count = result.row_count;
-    }
-
-    rerenderCard(f);
-    updateSummary();
-  } catch (e) {
-    f.status = "error";
-    f.error = e.message;
-    rerenderCard(f);
-  }
-}
-
 // ── Re-render a single card in place ─────────────────────
 function rerenderCard(f) {
   const list = document.getElementById("file-list");
@@ -640,29 +764,76 @@ def index():
     )
 
 
-@app.route("/api/scan")
-def api_scan():
-    results = scan_input_files()
-
-    global _scan_results
-    _scan_results = results
+def _session_state():
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return jobs.session(session["sid"])
+
+
+def _slim(r):
+    """File info as sent to the browser (no paths / overrides)."""
+    return {
+        "filename":           r["filename"],
+        "status":             r["status"],
+        "headers":            r["headers"],
+        "col_map":            {k: v for k, v in r.get("col_map", {}).items()
+                               if not k.startswith("_")},
+        "missing_fields":     r.get("missing_fields", []),
+        "error":              r.get("error", ""),
+        "from_saved_mapping": r.get("from_saved_mapping", False),
+        "saved_mapping_similarity": r.get("saved_mapping_similarity"),
+        "headers_signature":  r.get("headers_signature", ""),
+        "row_count":          r.get("row_count"),
+    }
 
-    slim = []
-    for r in results:
-        slim.append({
-            "filename":           r["filename"],
-            "status":             r["status"],
-            "headers":            r["headers"],
-            "col_map":            {k: v for k, v in r.get("col_map", {}).items()
-                                   if not k.startswith("_")},
-            "missing_fields":     r.get("missing_fields", []),
-            "error":              r.get("error", ""),
-            "from_saved_mapping": r.get("from_saved_mapping", False),
-            "headers_signature":  r.get("headers_signature", ""),
-            "row_count":          None,
-        })
 
-    return jsonify({"files": slim, "input_dir": str(INPUT_DIR)})
+@app.route("/api/scan", methods=["GET", "POST"])
+def api_scan():
+    state = _session_state()
+    with state.lock:
+        state.scan_results.clear()
+
+    overrides = read_overrides(OVERRIDES_PATH)
+    saved_mappings = open_mapping_store()
+
+    # Unchanged files come straight from the scan cache; only new or
+    # modified ones are parsed on the pool.
+    items, hits = [], []
+    for path in list_input_files():
+        cached = scan_cache.lookup(path)
+        if cached:
+            info = scan_file(path, overrides, saved_mappings, cached=cached)
+            state.set_file(info)
+            hits.append(_slim(info))
+        else:
+            items.append((str(path), overrides, saved_mappings))
+
+    def on_result(info):
+        if "layout" in info:
+            scan_cache.store(Path(info["path"]), info["fingerprint"], info["layout"])
+        state.set_file(info)
+        return _slim(info)
+
+    def on_error(item, error):
+        return on_result(scan_error_info(Path(item[0]), error))
+
+    job = jobs.submit(state, "scan", scan_task, items, on_result, precomputed=hits, on_done=scan_cache.save,
+                      on_error=on_error)
+    return jsonify({"job_id": job.id, "total": job.total, "input_dir": str(INPUT_DIR)})
+
+
+def _mark_processed(state, result, do_save=False, sig="", header_map=None):
+    """Record a finished process task in the session; save the mapping on success."""
+    if not result.get("error"):
+        info = state.get_file(result["filename"])
+        if info is not None:
+            info["status"] = "done"
+            info["row_count"] = result.get("row_count")
+            scan_cache.set_row_count(Path(info["path"]), result.get("row_count"))
+            scan_cache.save()
+        if do_save and sig and header_map:
+            save_mapping(sig, header_map, info["headers"] if info is not None else None)
+    return result
 
 
 @app.route("/api/process", methods=["POST"])
@@ -674,7 +845,8 @@ def api_process():
     do_save      = data.get("save_mapping", False)
     sig          = data.get("headers_signature", "")
 
-    file_info = next((r for r in _scan_results if r["filename"] == filename), None)
+    state = _session_state()
+    file_info = state.get_file(filename)
     if not file_info:
         return jsonify({"error": f"File not found in scan results: {filename}"})
 
@@ -683,15 +855,53 @@ def api_process():
         merged[k] = int(v)
     file_info["col_map"] = merged
 
+    job = jobs.submit(
+        state, "process", process_task, [dict(file_info)],
+        lambda result: _mark_processed(state, result, do_save, sig, header_map),
+    )
+    return jsonify({"job_id": job.id, "total": job.total})
+
+
+@app.route("/api/process_all", methods=["POST"])
+def api_process_all():
+    state = _session_state()
+    job = jobs.submit(
+        state, "process_all", process_task, state.ready_files(),
+        lambda result: _mark_processed(state, result),
+    )
+    return jsonify({"job_id": job.id, "total": job.total})
+
+
+@app.route("/api/preview", methods=["POST"])
+def api_preview():
+    """First rows and column stats for a proposed mapping (see preview.py)."""
+    data = request.get_json()
+    filename = data.get("filename")
+
+    state = _session_state()
+    file_info = state.get_file(filename)
+    if not file_info:
+        return jsonify({"error": f"File not found in scan results: {filename}"})
+    if preview_mapping is None:
+        return jsonify({"error": "Previews need pyarrow (pip install pyarrow)"})
+
+    merged = dict(file_info.get("col_map") or {})
+    for k, v in data.get("col_map", {}).items():
+        merged[k] = int(v)
     try:
-        row_count, out_name = process_file_with_map(file_info)
+        return jsonify(preview_mapping(file_info, merged))
     except Exception as e:
         return jsonify({"error": str(e)})
 
-    if do_save and sig and header_map:
-        save_mapping(sig, header_map)
 
-    return jsonify({"row_count": row_count, "output_filename": out_name})
+@app.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    state = _session_state()
+    job = state.jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    since = request.args.get("since", 0, type=int)
+    return jsonify(job.snapshot(since))
 
 
 # ============================================================
@@ -706,4 +916,7 @@ if __name__ == "__main__":
     threading.Timer(1.2, open_browser).start()
     print("Starting SAP Sales Processor...")
     print("Opening http://127.0.0.1:8080")
-    app.run(debug=False, port=8080, host="127.0.0.1")
\ No newline at end of file
+    try:
+        app.run(debug=False, port=8080, host="127.0.0.1", threaded=True)
+    finally:
+        jobs.shutdown()
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Background jobs for the convert-to-template web app.
+
+Scans and processing run on a shared process pool instead of inside Flask
+request handlers. Each request starts a Job and returns its id right away;
+the browser polls /api/jobs/<id>?since=N for progress and the results that
+finished since its last poll, so the UI stays responsive and fills in file
+by file.
+
+State is kept per browser session (SessionState): the scan results used
+for processing and that session's jobs. Nothing is shared between sessions;
+sessions idle for SESSION_IDLE_SECONDS, or beyond the MAX_SESSIONS most
+recently used, are dropped unless a job of theirs is still running.
+
+A task whose worker dies (e.g. out of memory on a huge sheet) fails on its
+own; the broken pool is replaced, so later jobs run on fresh workers.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from base_convert_to_template import process_file_with_map, scan_file
+
+# Worker processes shared by all sessions (None = one per CPU)
+MAX_WORKERS: Optional[int] = None
+# Finished jobs kept per session for late polls
+JOB_HISTORY = 20
+# Sessions kept in memory
+MAX_SESSIONS = 50
+SESSION_IDLE_SECONDS = 6 * 60 * 60
+
+
+# ============================================================
+# WORKER ENTRY POINTS  (run in pool processes)
+# ============================================================
+
+def scan_task(args) -> Dict:
+    path, overrides, saved_mappings = args
+    return scan_file(path, overrides, saved_mappings)
+
+
+def process_task(file_info: Dict) -> Dict:
+    try:
+        row_count, out_name = process_file_with_map(file_info)
+        return {"filename": file_info["filename"], "row_count": row_count, "output_filename": out_name}
+    except Exception as e:
+        return {"filename": file_info["filename"], "error": str(e)}
+
+
+def failed_result(item, error: Exception) -> Dict:
+    """Result reported for an item whose task or on_result raised."""
+    if isinstance(item, dict):
+        filename = item.get("filename", "")
+    elif isinstance(item, (tuple, list)) and item:
+        filename = Path(str(item[0])).name
+    else:
+        filename = str(item)
+    return {"filename": filename, "status": "error", "error": str(error)}
+
+
+# ============================================================
+# JOBS
+# ============================================================
+
+class Job:
+    """A batch of tasks; results are appended in completion order."""
+
+    def __init__(self, kind: str, total: int):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.total = total
+        self.results: List[Dict] = []
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.error is not None or len(self.results) >= self.total
+
+    def add_result(self, result: Dict) -> bool:
+        """Append a result; True when it was the job's last one."""
+        with self._lock:
+            self.results.append(result)
+            return len(self.results) == self.total
+
+    def snapshot(self, since: int = 0) -> Dict:
+        """Progress plus the results from index `since` on."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": "error" if self.error else ("done" if self.done else "running"),
+                "total": self.total,
+                "completed": len(self.results),
+                "results": self.results[since:],
+                "error": self.error,
+            }
+
+
+class SessionState:
+    """Per-browser-session scan results and jobs."""
+
+    def __init__(self):
+        self.scan_results: Dict[str, Dict] = {}
+        self.jobs: Dict[str, Job] = {}
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        with self.lock:
+            return any(not job.done for job in self.jobs.values())
+
+    def add_job(self, job: Job):
+        with self.lock:
+            self.jobs[job.id] = job
+            finished = [j for j in self.jobs.values() if j.done]
+            for old in finished[:-JOB_HISTORY]:
+                self.jobs.pop(old.id, None)
+
+    def set_file(self, info: Dict):
+        with self.lock:
+            self.scan_results[info["filename"]] = info
+
+    def get_file(self, filename: str) -> Optional[Dict]:
+        with self.lock:
+            return self.scan_results.get(filename)
+
+    def ready_files(self) -> List[Dict]:
+        with self.lock:
+            return [dict(info) for info in self.scan_results.values() if info.get("status") == "ready"]
+
+
+class JobManager:
+    def __init__(self, max_workers: Optional[int] = MAX_WORKERS):
+        self._max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._sessions: Dict[str, SessionState] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._max_workers)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool; the next submit starts a new one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, item):
+        pool = self.pool
+        try:
+            return pool, pool.submit(fn, item)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            pool = self.pool
+            return pool, pool.submit(fn, item)
+
+    def session(self, session_id: str) -> SessionState:
+        now = time.monotonic()
+        with self._lock:
+            # Re-inserted on every use, so the dict runs from least to most recently used
+            state = self._sessions.pop(session_id, None) or SessionState()
+            state.last_used = now
+            self._sessions[session_id] = state
+            for sid, old in list(self._sessions.items()):
+                if len(self._sessions) <= MAX_SESSIONS and now - old.last_used < SESSION_IDLE_SECONDS:
+                    break
+                if sid != session_id and not old.busy:
+                    del self._sessions[sid]
+            return state
+
+    def submit(
+        self,
+        state: SessionState,
+        kind: str,
+        fn: Callable[[Any], Dict],
+        items: List[Any],
+        on_result: Optional[Callable[[Dict], Dict]] = None,
+        precomputed: Optional[List[Dict]] = None,
+        on_done: Optional[Callable[[], None]] = None,
+        on_error: Callable[[Any, Exception], Dict] = failed_result,
+    ) -> Job:
+        """
+        Run fn(item) for every item on the pool. on_result runs in this
+        process for each finished item (e.g. to update session state) and
+        returns what the browser sees for it. `precomputed` results (e.g.
+        scan cache hits) count towards the job and are reported right away;
+        on_done runs once after the last result. An item whose task or
+        on_result raises is reported as on_error(item, exception).
+        """
+        precomputed = precomputed or []
+        job = Job(kind, len(items) + len(precomputed))
+        state.add_job(job)
+
+        def finish(result: Dict):
+            if job.add_result(result) and on_done:
+                try:
+                    on_done()
+                except Exception as e:
+                    job.error = str(e)
+
+        def collect(item, pool, future):
+            try:
+                result = future.result()
+                finish(on_result(result) if on_result else result)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_pool(pool)
+                try:
+                    finish(on_error(item, e))
+                except Exception:
+                    finish(failed_result(item, e))
+
+        for result in precomputed:
+            finish(result)
+        if not job.total and on_done:
+            on_done()
+
+        try:
+            for item in items:
+                pool, future = self._submit(fn, item)
+                future.add_done_callback(partial(collect, item, pool))
+        except Exception as e:
+            job.error = str(e)
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
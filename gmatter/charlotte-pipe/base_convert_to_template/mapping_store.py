@@ -0,0 +1,159 @@
+"""
+Saved column mappings, kept in a small SQLite database.
+
+A mapping is {field: original header string}, saved under the file's header
+signature (headers_signature). Every save is a single upsert transaction, so
+concurrent saves from the web UI (or its worker processes) never overwrite
+each other.
+
+Besides the exact signature, each mapping's individual normalized headers are
+indexed (mapping_headers), so a layout that is close to a saved one — an
+extra column, a renamed column — can reuse it: find() ranks saved layouts by
+header overlap (Jaccard similarity) with one indexed join instead of
+comparing against every saved mapping.
+
+The store holds only its path; connections are opened per call, so it can be
+handed to worker processes.
+"""
+
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Saved layouts sharing less than this share of headers are not offered
+MIN_SIMILARITY = 0.6
+# Candidates returned by find() besides the exact match
+MAX_CANDIDATES = 5
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS mappings (
+        signature    TEXT PRIMARY KEY,
+        header_count INTEGER NOT NULL,
+        col_map      TEXT NOT NULL,
+        updated_at   TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS mapping_headers (
+        header    TEXT NOT NULL,
+        signature TEXT NOT NULL REFERENCES mappings (signature) ON DELETE CASCADE,
+        PRIMARY KEY (header, signature)
+    ) WITHOUT ROWID;
+"""
+
+
+def normalise_header(h) -> str:
+    return " ".join(str(h or "").lower().split())
+
+
+def _header_set(headers: Iterable) -> List[str]:
+    return sorted({normalise_header(h) for h in headers} - {""})
+
+
+class MappingStore:
+    def __init__(self, path: Path, legacy_json: Optional[Path] = None):
+        self.path = Path(path)
+        self.legacy_json = legacy_json
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        con.execute("PRAGMA foreign_keys = ON")
+        if not self._initialised:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.executescript(SCHEMA)
+            self._initialised = True
+            self._import_legacy(con)
+        return con
+
+    def _import_legacy(self, con: sqlite3.Connection):
+        """One-time import of the old saved_column_mappings.json."""
+        if not self.legacy_json or not Path(self.legacy_json).exists():
+            return
+        if con.execute("SELECT COUNT(*) FROM mappings").fetchone()[0]:
+            return
+        try:
+            with open(self.legacy_json, encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        for signature, col_map in legacy.items():
+            self._upsert(con, signature, signature.split("|"), col_map)
+
+    def _upsert(self, con: sqlite3.Connection, signature: str, headers: Iterable, col_map: Dict[str, str]):
+        header_set = _header_set(headers)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute(
+                """
+                INSERT INTO mappings (signature, header_count, col_map, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (signature) DO UPDATE
+                SET header_count = excluded.header_count,
+                    col_map      = excluded.col_map,
+                    updated_at   = excluded.updated_at
+                """,
+                (signature, len(header_set), json.dumps(col_map), datetime.now().isoformat()),
+            )
+            con.execute("DELETE FROM mapping_headers WHERE signature = ?", (signature,))
+            con.executemany(
+                "INSERT INTO mapping_headers (header, signature) VALUES (?, ?)",
+                [(h, signature) for h in header_set],
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def save(self, signature: str, headers: Iterable, col_map: Dict[str, str]):
+        """Insert or replace the mapping for `signature` (headers: the file's full header row)."""
+        with closing(self._connect()) as con:
+            self._upsert(con, signature, headers, col_map)
+
+    def get(self, signature: str) -> Optional[Dict[str, str]]:
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT col_map FROM mappings WHERE signature = ?", (signature,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> Dict[str, Dict[str, str]]:
+        with closing(self._connect()) as con:
+            return {sig: json.loads(m) for sig, m in con.execute("SELECT signature, col_map FROM mappings")}
+
+    def find(self, signature: str, headers: Iterable) -> List[Tuple[Dict[str, str], float]]:
+        """
+        Saved mappings that may fit a file, best first, as (col_map, similarity):
+        the exact signature (1.0) followed by up to MAX_CANDIDATES layouts
+        sharing at least MIN_SIMILARITY of their headers with the file.
+        """
+        header_set = _header_set(headers)
+        with closing(self._connect()) as con:
+            out = []
+            row = con.execute("SELECT col_map FROM mappings WHERE signature = ?", (signature,)).fetchone()
+            if row:
+                out.append((json.loads(row[0]), 1.0))
+            if not header_set:
+                return out
+            values = ", ".join("(?)" for _ in header_set)
+            rows = con.execute(
+                f"""
+                WITH file_headers (header) AS (VALUES {values}),
+                overlap AS (
+                    SELECT h.signature, COUNT(*) AS shared
+                    FROM file_headers f
+                    JOIN mapping_headers h ON h.header = f.header
+                    GROUP BY h.signature
+                )
+                SELECT m.col_map, o.shared * 1.0 / (m.header_count + ? - o.shared) AS similarity
+                FROM overlap o
+                JOIN mappings m ON m.signature = o.signature
+                WHERE m.signature <> ?
+                  AND o.shared * 1.0 / (m.header_count + ? - o.shared) >= ?
+                ORDER BY similarity DESC, m.updated_at DESC
+                LIMIT ?
+                """,
+                (*header_set, len(header_set), signature, len(header_set), MIN_SIMILARITY, MAX_CANDIDATES),
+            ).fetchall()
+        out.extend((json.loads(col_map), similarity) for col_map, similarity in rows)
+        return out
@@ -0,0 +1,231 @@
+"""
+Mapped previews for the convert-to-template web app.
+
+preview_mapping applies a proposed col_map to the first PREVIEW_ROWS data
+rows of a file, and reports for each mapped field how its source column looks
+over the whole sheet: the share of empty cells, and of non-empty cells that
+parse as numbers and as dates.
+
+Both come from a columnar copy of the sheet — the rows below the header, one
+Arrow column per sheet column — written once per file content to
+PREVIEW_CACHE_DIR as an Arrow IPC file and memory-mapped after that. Column
+stats don't depend on the mapping, so they are computed once per column and
+kept with the loaded copy; trying another mapping takes milliseconds instead
+of re-reading the workbook. Needs pyarrow.
+"""
+
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice, zip_longest
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from base_convert_to_template import (
+    OUTPUT_HEADERS,
+    RECORD_BATCH_ROWS,
+    SAVED_MAPPINGS_PATH,
+    SHEET_NAME,
+    _arrow_column,
+    _data_row_mask,
+    _number_column,
+    _output_rows,
+    _record_batch,
+    check_missing_required_fields,
+    file_fingerprint,
+    iter_sheet_rows,
+)
+
+PREVIEW_CACHE_DIR = SAVED_MAPPINGS_PATH.parent / "preview_cache"
+# Columnar copies kept on disk (oldest removed first)
+PREVIEW_CACHE_FILES = 50
+# Sheets kept loaded in the web process, with their column stats
+PREVIEW_MEMORY_SHEETS = 8
+PREVIEW_ROWS = 25
+
+# Text counted as a date by the date parse rate
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%m/%d/%y", "%Y%m%d", "%d-%b-%Y", "%d-%b-%y")
+
+
+# ============================================================
+# COLUMNAR COPY
+# ============================================================
+
+def _unify(chunks: List[pa.Array]) -> pa.ChunkedArray:
+    """One sheet column from its per-batch arrays; mixed types become text, as in _arrow_column."""
+    types = {c.type for c in chunks if not pa.types.is_null(c.type)}
+    if not types:
+        return pa.chunked_array(chunks, pa.null())
+    if len(types) == 1:
+        dtype = types.pop()
+        return pa.chunked_array([c.cast(dtype) for c in chunks], dtype)
+    return pa.chunked_array(
+        [pa.array([None if v is None else str(v) for v in c.to_pylist()], pa.string()) for c in chunks],
+        pa.string(),
+    )
+
+
+def _build_sheet_table(path: Path, header_row_index: int) -> pa.Table:
+    rows = islice(iter_sheet_rows(path, SHEET_NAME), header_row_index + 1, None)
+    batches: List[Tuple[int, List[pa.Array]]] = []
+    for chunk in iter(lambda: list(islice(rows, RECORD_BATCH_ROWS)), []):
+        batches.append((len(chunk), [_arrow_column(values) for values in zip_longest(*chunk)]))
+
+    width = max((len(arrays) for _, arrays in batches), default=0)
+    return pa.table({
+        f"c{j}": _unify([arrays[j] if j < len(arrays) else pa.nulls(n) for n, arrays in batches])
+        for j in range(width)
+    })
+
+
+def _prune_cache(keep: int = PREVIEW_CACHE_FILES):
+    files = sorted(PREVIEW_CACHE_DIR.glob("*.arrow"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def sheet_table(path: Path, header_row_index: int, sha256: Optional[str] = None) -> Tuple[pa.Table, bool]:
+    """(columnar copy of the rows below the header, whether it came from the cache)."""
+    sha256 = sha256 or file_fingerprint(path)["sha256"]
+    cache_path = PREVIEW_CACHE_DIR / f"{sha256[:24]}.h{header_row_index}.arrow"
+    if cache_path.exists():
+        try:
+            return ipc.open_file(pa.memory_map(str(cache_path))).read_all(), True
+        except (OSError, pa.ArrowInvalid):
+            pass
+
+    table = _build_sheet_table(path, header_row_index)
+    try:
+        PREVIEW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        tmp_path.replace(cache_path)
+        _prune_cache()
+    except OSError:
+        pass
+    return table, False
+
+
+# ============================================================
+# PREVIEW
+# ============================================================
+
+def _pct(part: int, whole: int) -> Optional[float]:
+    return round(100.0 * part / whole, 1) if whole else None
+
+
+def _column_stats(arr: pa.Array) -> Dict:
+    """Empty share, and number / date parse rates of the non-empty cells."""
+    if pa.types.is_string(arr.type):
+        text = pc.utf8_trim_whitespace(arr)
+        filled = pc.fill_null(pc.greater(pc.utf8_length(text), 0), False)
+    else:
+        text = None
+        filled = arr.is_valid()
+    non_empty = pc.sum(filled).as_py() or 0
+
+    if pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type) or text is not None:
+        numbers = pc.sum(_number_column(arr, ()).is_valid()).as_py() or 0
+    else:
+        numbers = 0
+
+    if pa.types.is_temporal(arr.type):
+        dates = non_empty
+    elif text is not None:
+        parsed = pa.array([False] * len(text))
+        for fmt in DATE_FORMATS:
+            ok = pc.strptime(text, format=fmt, unit="s", error_is_null=True).is_valid()
+            parsed = pc.or_(parsed, ok)
+        dates = pc.sum(parsed).as_py() or 0
+    else:
+        dates = 0
+
+    return {
+        "empty_pct": _pct(len(arr) - non_empty, len(arr)),
+        "numeric_pct": _pct(numbers, non_empty),
+        "date_pct": _pct(dates, non_empty),
+    }
+
+
+def _json_value(v):
+    return v.isoformat() if isinstance(v, (datetime, date)) else v
+
+
+class _Sheet:
+    """A loaded columnar copy with its data-row mask and per-column stats."""
+
+    def __init__(self, table: pa.Table, from_cache: bool):
+        self.from_cache = from_cache
+        self.table = table
+        self.columns = [c.combine_chunks() for c in table.columns]
+        self.keep = _data_row_mask(self.columns, table.num_rows)
+        self.data_rows = pc.sum(self.keep).as_py() or 0
+        self._stats: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def stats(self, idx: int) -> Dict:
+        with self._lock:
+            if idx not in self._stats:
+                self._stats[idx] = _column_stats(self.columns[idx].filter(self.keep))
+            return self._stats[idx]
+
+    def head(self, n: int) -> List[Tuple]:
+        """The first n data rows as cell tuples."""
+        head = self.table.take(pc.indices_nonzero(self.keep)[:n])
+        return list(zip(*(c.to_pylist() for c in head.columns)))
+
+
+@lru_cache(maxsize=PREVIEW_MEMORY_SHEETS)
+def _load_sheet(path: str, header_row_index: int, sha256: str) -> _Sheet:
+    return _Sheet(*sheet_table(Path(path), header_row_index, sha256))
+
+
+def preview_mapping(file_info: Dict, col_map: Dict[str, int], rows: int = PREVIEW_ROWS) -> Dict:
+    """
+    The first `rows` records col_map would produce for file_info's file, plus
+    column stats per mapped field over all data rows (rows that pass
+    is_data_row). The first call per file builds the columnar copy.
+    """
+    started = time.perf_counter()
+    path = Path(file_info["path"])
+    sha256 = (file_info.get("fingerprint") or {}).get("sha256") or file_fingerprint(path)["sha256"]
+    hits = _load_sheet.cache_info().hits
+    sheet = _load_sheet(str(path), col_map.get("_header_row_index", 0), sha256)
+    cached = sheet.from_cache or _load_sheet.cache_info().hits > hits
+
+    # A few spare rows: rows without an order / SKU / description are dropped
+    batch = _record_batch(sheet.head(rows * 2), col_map, file_info.get("contractor", "")).slice(0, rows)
+    preview = [
+        {k: _json_value(v) for k, v in zip(OUTPUT_HEADERS, row)}
+        for row in _output_rows([batch])
+    ]
+
+    headers = file_info.get("headers") or []
+    stats = {}
+    for field, idx in col_map.items():
+        if field.startswith("_") or idx is None or idx >= len(sheet.columns):
+            continue
+        stats[field] = {
+            "column": idx,
+            "header": headers[idx] if idx < len(headers) else "",
+            **sheet.stats(idx),
+        }
+
+    return {
+        "filename": file_info["filename"],
+        "data_rows": sheet.data_rows,
+        "preview": preview,
+        "stats": stats,
+        "missing_fields": check_missing_required_fields(col_map),
+        "cached": cached,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -1,11 +1,32 @@
 import csv
+import hashlib
 import json
-import tempfile
+import os
+import pickle
+import sys
+import threading
+from datetime import date, datetime
+from itertools import chain, islice, zip_longest
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+# Input workbooks are read through the shared values-only reader.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from workbook_reader import open_workbook
+
+from mapping_store import MappingStore
 
 
 # ============================================================
@@ -17,11 +38,21 @@ INPUT_DIR = BASE_DIR / "Input"
 OUTPUT_DIR = BASE_DIR / "Output"
 OVERRIDES_PATH = BASE_DIR / "contractor_overrides.csv"
 SAVED_MAPPINGS_PATH = BASE_DIR / "saved_column_mappings.json"
+SAVED_MAPPINGS_DB = SAVED_MAPPINGS_PATH.with_suffix(".sqlite3")
+SCAN_CACHE_PATH = SAVED_MAPPINGS_PATH.parent / "scan_cache.json"
 
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 INPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 SHEET_NAME = "REPORTED SALES DATA"
+
+# Output files written per input: any of "xlsx", "csv", "parquet"
+# (parquet needs pyarrow). process_file_with_map reports the first one.
+OUTPUT_FORMATS = ("xlsx",)
+
+# Set to a folder to cache each input sheet's rows on disk (keyed by file
+# content), so re-scanning unchanged workbooks skips parsing them. Off by default.
+ROW_CACHE_DIR: Optional[Path] = None
 HEADER_ROW = 6
 DATA_START_ROW = 7
 
@@ -38,6 +69,8 @@ OUTPUT_HEADERS = [
     "extended_price",
 ]
 
+NUMERIC_OUTPUT_FIELDS = {"unit_price", "ship_quantity", "extended_price"}
+
 # Fields the user MUST map if not auto-detected
 REQUIRED_FIELDS = [
     "order_date",
@@ -78,27 +111,23 @@ FIELD_LABELS = {
 # SAVED MAPPINGS
 # ============================================================
 
-def load_saved_mappings() -> Dict[str, Dict[str, str]]:
-    """Load saved column header → field mappings from disk."""
-    if not SAVED_MAPPINGS_PATH.exists():
-        return {}
-    try:
-        with open(SAVED_MAPPINGS_PATH, encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+def open_mapping_store() -> MappingStore:
+    """
+    Saved column header → field mappings (see mapping_store.py). Mappings
+    from the old saved_column_mappings.json are imported on first use.
+    """
+    return MappingStore(SAVED_MAPPINGS_DB, legacy_json=SAVED_MAPPINGS_PATH)
 
 
-def save_mapping(mapping_key: str, col_map: Dict[str, str]):
+def save_mapping(mapping_key: str, col_map: Dict[str, str], headers: Optional[List[str]] = None):
     """
     Persist a mapping for future runs.
     mapping_key: a string identifying the file's header signature
     col_map: {field_name: original_header_string}
+    headers: the file's full header row (indexed for near-match lookups)
     """
-    all_mappings = load_saved_mappings()
-    all_mappings[mapping_key] = col_map
-    with open(SAVED_MAPPINGS_PATH, "w", encoding="utf-8") as f:
-        json.dump(all_mappings, f, indent=2)
+    headers = headers if headers is not None else mapping_key.split("|")
+    open_mapping_store().save(mapping_key, headers, col_map)
 
 
 def headers_signature(headers: List[str]) -> str:
@@ -117,8 +146,10 @@ def clean_text(v) -> str:
 
 
 def clean_number(v):
-    if v is None:
+    if v is None or isinstance(v, bool):
         return None
+    if isinstance(v, (int, float)):
+        return None if v != v else float(v)  # NaN check
     t = str(v).strip().replace("$", "").replace(",", "")
     if t == "":
         return None
@@ -158,75 +189,131 @@ def contractor_fallback(path: Path, overrides: Dict[str, Dict[str, str]]) -> str
 
 
 # ============================================================
-# EXCEL → CSV  (openpyxl, cross-platform)
+# EXCEL → ROWS  (shared workbook reader, cross-platform)
 # ============================================================
 
-def export_sheet_to_csv(path: Path, sheet_name: str) -> Path:
-    tmp_dir = Path(tempfile.mkdtemp(prefix="sap_csv_"))
-    csv_path = tmp_dir / f"{path.stem}.csv"
-
-    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
-
-    ws = None
-    for name in wb.sheetnames:
-        if name.strip().lower() == sheet_name.lower():
-            ws = wb[name]
-            break
-    if ws is None:
-        for name in wb.sheetnames:
-            if any(kw in name.lower() for kw in ("detail", "sales", "data", "report")):
-                ws = wb[name]
-                break
-    if ws is None:
-        ws = wb[wb.sheetnames[0]]
+def _row_cache_path(path: Path, sheet_name: str, cache_dir: Path) -> Path:
+    h = hashlib.sha256(sheet_name.encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return cache_dir / f"{path.stem}.{h.hexdigest()[:16]}.rows.pickle"
 
-    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.writer(f)
-        for row in ws.iter_rows(values_only=True):
-            writer.writerow([c if c is not None else "" for c in row])
 
-    wb.close()
-    return csv_path
+def read_sheet_rows(
+    path: Path,
+    sheet_name: str,
+    cache_dir: Optional[Path] = ROW_CACHE_DIR,
+    max_rows: Optional[int] = None,
+) -> List[List]:
+    """
+    Rows of the data sheet as lists of typed cell values (None for empty
+    cells), streamed straight from the workbook reader — no temp files.
+    max_rows reads only the first rows (the header window used by scans).
+    With cache_dir set, full reads are cached there by file content and
+    windowed reads are served from the cache when it exists.
+    """
+    cache_path = _row_cache_path(path, sheet_name, Path(cache_dir)) if cache_dir else None
+    if cache_path and cache_path.exists():
+        try:
+            with open(cache_path, "rb") as f:
+                rows = pickle.load(f)
+            return rows[:max_rows] if max_rows else rows
+        except Exception:
+            pass
 
+    rows = list(islice(iter_sheet_rows(path, sheet_name, cache_dir=None), max_rows))
 
-def read_csv(csv_path: Path) -> List[List[str]]:
-    for enc in ("utf-8-sig", "cp1252", "latin1"):
+    if cache_path and not max_rows:
         try:
-            with open(csv_path, newline="", encoding=enc) as f:
-                return list(csv.reader(f))
-        except Exception:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(cache_path)
+        except OSError:
             pass
-    return []
+
+    return rows
+
+
+def iter_sheet_rows(path: Path, sheet_name: str, cache_dir: Optional[Path] = ROW_CACHE_DIR) -> Iterator[List]:
+    """Stream the data sheet's rows one at a time (from the row cache when enabled)."""
+    if cache_dir:
+        yield from read_sheet_rows(path, sheet_name, cache_dir)
+        return
+    with open_workbook(path) as wb:
+        ws_name = wb.first_sheet_matching(sheet_name, ("detail", "sales", "data", "report"))
+        for row in wb.rows(ws_name):
+            yield list(row)
 
 
 # ============================================================
 # HEADER DETECTION
 # ============================================================
 
-def _normalise_header(h: str) -> str:
-    return " ".join(h.lower().split())
+def _normalise_header(h) -> str:
+    return " ".join(clean_text(h).lower().split())
+
+
+# Rows searched for the header, and the score at which the search stops early
+HEADER_SEARCH_ROWS = 50
+HEADER_MIN_FIELDS = 2
+HEADER_EARLY_EXIT_FIELDS = 4
+
+
+def _build_alias_index() -> Dict[str, Tuple[str, ...]]:
+    """Normalized alias → fields it can mean (a few aliases are shared), in COLUMN_ALIASES order."""
+    index: Dict[str, List[str]] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            fields = index.setdefault(_normalise_header(alias), [])
+            if field not in fields:
+                fields.append(field)
+    return {alias: tuple(fields) for alias, fields in index.items()}
+
 
+ALIAS_INDEX = _build_alias_index()
 
-def detect_column_map(rows: List[List[str]]) -> Optional[Dict[str, int]]:
+
+def _match_header_row(row: List) -> Dict[str, int]:
+    """{field: col_index} for one row — first matching column per field."""
+    mapping: Dict[str, int] = {}
+    for col_idx, cell in enumerate(row):
+        if cell is None:
+            continue
+        for field in ALIAS_INDEX.get(_normalise_header(cell), ()):
+            mapping.setdefault(field, col_idx)
+    return mapping
+
+
+def detect_column_map(rows: List[List]) -> Optional[Dict[str, int]]:
     """
-    Returns {field_name: col_index, '_header_row_index': int} if ≥2 fields matched,
-    otherwise None.
+    Returns {field_name: col_index, '_header_row_index': int} for the best
+    header candidate in the first HEADER_SEARCH_ROWS rows, or None when no
+    row matches ≥ HEADER_MIN_FIELDS fields.
+
+    Candidates are scored by (required fields matched, fields matched); the
+    earliest row wins ties. The search stops at the first row that has every
+    required field and ≥ HEADER_EARLY_EXIT_FIELDS fields, so its cost does
+    not depend on how many data rows follow.
     """
-    for row_idx, row in enumerate(rows):
-        normalised = [_normalise_header(c) for c in row]
-        mapping: Dict[str, int] = {}
-        for field, aliases in COLUMN_ALIASES.items():
-            for col_idx, cell in enumerate(normalised):
-                if cell in aliases:
-                    mapping[field] = col_idx
-                    break
-        if len(mapping) >= 2:
-            mapping["_header_row_index"] = row_idx
-            return mapping
-    return None
-
-
-def get_header_row(rows: List[List[str]]) -> Tuple[Optional[int], Optional[List[str]]]:
+    best: Optional[Dict[str, int]] = None
+    best_score = (0, 0)
+    for row_idx, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        mapping = _match_header_row(row)
+        if len(mapping) < HEADER_MIN_FIELDS:
+            continue
+        score = (sum(1 for f in REQUIRED_FIELDS if f in mapping), len(mapping))
+        if score > best_score:
+            best, best_score = mapping, score
+            best["_header_row_index"] = row_idx
+            if score[0] == len(REQUIRED_FIELDS) and score[1] >= HEADER_EARLY_EXIT_FIELDS:
+                break
+    return best
+
+
+def get_header_row(rows: List[List]) -> Tuple[Optional[int], Optional[List[str]]]:
     """
     Find the header row index and return its column names.
     Falls back to the row with the most non-empty cells if alias detection fails.
@@ -257,18 +344,21 @@ def check_missing_required_fields(col_map: Dict[str, int]) -> List[str]:
 # ROW PARSING
 # ============================================================
 
-def is_data_row(row: List[str]) -> bool:
+TOTAL_LABELS = ("total", "subtotal", "grand total", "totals")
+
+
+def is_data_row(row: List) -> bool:
     non_empty = [c for c in row if clean_text(c)]
     if len(non_empty) < 2:
         return False
     first = clean_text(non_empty[0]).lower()
-    if first in ("total", "subtotal", "grand total", "totals"):
+    if first in TOTAL_LABELS:
         return False
     return True
 
 
 def parse_row(
-    row: List[str],
+    row: List,
     col_map: Dict[str, int],
     contractor: str,
 ) -> Optional[Dict]:
@@ -284,6 +374,14 @@ def parse_row(
             return None
         return clean_number(row[idx])
 
+    def get_date(field: str):
+        idx = col_map.get(field)
+        if idx is None or idx >= len(row):
+            return None
+        if isinstance(row[idx], (datetime, date)):
+            return row[idx]
+        return clean_text(row[idx]) or None
+
     sales_order = get("sales_order_number")
     sku         = get("item_sku")
     description = get("item_description")
@@ -303,7 +401,7 @@ def parse_row(
     return {
         "contractor_name":    get("contractor_name") or contractor,
         "sales_order_number": sales_order or "",
-        "order_date":         get("order_date") or "",
+        "order_date":         get_date("order_date") or "",
         "item_sku":           sku or "",
         "item_sku_category":  get("item_sku_category") or "",
         "item_upc":           get("item_upc") or "",
@@ -314,30 +412,51 @@ def parse_row(
     }
 
 
-def build_records(
-    rows: List[List[str]],
-    contractor: str,
+def _data_rows(
+    rows: Iterable[List],
     manual_col_map: Optional[Dict[str, int]] = None,
-) -> Tuple[List[Dict], Dict[str, int], List[str]]:
+) -> Tuple[Optional[Iterator[List]], Dict[str, int], List[str]]:
     """
-    Returns (records, col_map_used, missing_required_fields).
-    If manual_col_map is provided, it overrides auto-detection.
+    (rows below the header, col_map_used, missing_required_fields); the
+    rows are None when required fields are missing.
     """
+    rows = iter(rows)
+    window = list(islice(rows, HEADER_SEARCH_ROWS))
+
     if manual_col_map is not None:
         col_map = manual_col_map
         missing = check_missing_required_fields(col_map)
     else:
-        col_map = detect_column_map(rows)
+        col_map = detect_column_map(window)
         if col_map is None:
-            return [], {}, list(REQUIRED_FIELDS)
+            return None, {}, list(REQUIRED_FIELDS)
         missing = check_missing_required_fields(col_map)
 
     if missing:
-        return [], col_map, missing
+        return None, col_map, missing
 
     header_row_idx = col_map.get("_header_row_index", 0)
+    if header_row_idx + 1 < len(window):
+        return chain(window[header_row_idx + 1:], rows), col_map, []
+    return islice(rows, header_row_idx + 1 - len(window), None), col_map, []
+
+
+def build_records(
+    rows: Iterable[List],
+    contractor: str,
+    manual_col_map: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict], Dict[str, int], List[str]]:
+    """
+    Returns (records, col_map_used, missing_required_fields).
+    If manual_col_map is provided, it overrides auto-detection.
+    rows may be any iterable (e.g. iter_sheet_rows); it is consumed once.
+    """
+    data_rows, col_map, missing = _data_rows(rows, manual_col_map)
+    if data_rows is None:
+        return [], col_map, missing
+
     records = []
-    for row in rows[header_row_idx + 1:]:
+    for row in data_rows:
         if not is_data_row(row):
             continue
         rec = parse_row(row, col_map, contractor)
@@ -347,127 +466,595 @@ def build_records(
     return records, col_map, []
 
 
+# ============================================================
+# COLUMNAR RECORDS  (pyarrow) — same output as build_records, except:
+#   • number text "nan" / "inf" / non-ASCII digits is empty (_NUMBER_PATTERN)
+#   • an order_date column holding both dates and datetimes gives midnight
+#     datetimes for the plain dates (_date_columns)
+# ============================================================
+
+# Sheet rows converted per Arrow batch
+RECORD_BATCH_ROWS = 50_000
+
+TEXT_FIELDS = [
+    "contractor_name", "sales_order_number", "item_sku",
+    "item_sku_category", "item_upc", "item_description",
+]
+# What float() accepts once "$", "," and "(…)" negatives are handled,
+# including "_" between digits ("1_000"). Non-numeric text such as "n/a"
+# becomes empty, as in clean_number; so do "nan" and "inf", and digits
+# outside 0-9 (e.g. full-width "１２"), which float() would accept.
+_DIGITS = r"\d(_?\d)*"
+_NUMBER_PATTERN = rf"^\s*[+-]?({_DIGITS}(\.({_DIGITS})?)?|\.{_DIGITS})([eE][+-]?{_DIGITS})?\s*$"
+
+
+def _arrow_column(values: Tuple) -> "pa.Array":
+    """One sheet column as an Arrow array; mixed-type columns become text."""
+    try:
+        arr = pa.array(values)
+        # Arrow reads True after a float as 1.0; clean_number treats booleans as empty
+        if not (pa.types.is_floating(arr.type) and any(type(v) is bool for v in values)):
+            return arr
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, ValueError):
+        # ValueError: e.g. a date followed by NaN ("cannot convert float NaN to integer")
+        pass
+    return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def _text_column(arr: "pa.Array", values: Tuple) -> "pa.Array":
+    """clean_text over a column: trimmed text, null when empty."""
+    if pa.types.is_string(arr.type):
+        text = pc.utf8_trim_whitespace(arr)
+    elif pa.types.is_integer(arr.type) or pa.types.is_null(arr.type):
+        text = arr.cast(pa.string())
+    else:
+        # str() of floats, dates and booleans differs from Arrow's casts
+        text = pa.array([None if v is None else str(v).strip() for v in values], pa.string())
+    return pc.if_else(pc.equal(text, ""), pa.scalar(None, pa.string()), text)
+
+
+def _number_column(arr: "pa.Array", values: Tuple) -> "pa.Array":
+    """clean_number over a column, as float64 (null when not a number)."""
+    if pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type):
+        # safe=False: integers beyond 2**53 round, as float() does
+        num = arr.cast(pa.float64(), safe=False)
+        return pc.if_else(pc.is_nan(num), pa.scalar(None, pa.float64()), num)
+    if pa.types.is_null(arr.type):
+        return pa.nulls(len(arr), pa.float64())
+    if not pa.types.is_string(arr.type):
+        return pa.array([clean_number(v) for v in values], pa.float64())
+    text = pc.utf8_trim_whitespace(arr)
+    text = pc.replace_substring(pc.replace_substring(text, "$", ""), ",", "")
+    text = pc.replace_substring_regex(text, r"(?s)^\((.*)\)$", r"-\1")
+    valid = pc.fill_null(pc.match_substring_regex(text, _NUMBER_PATTERN), False)
+    text = pc.replace_substring(pc.utf8_trim_whitespace(text), "_", "")
+    num = pc.if_else(valid, text, pa.scalar(None, pa.string())).cast(pa.float64())
+    if any(v is not None and not isinstance(v, str) for v in values):
+        # Mixed column (text since _arrow_column): cells that were numbers keep their own value (inf too)
+        direct = pa.array([None if isinstance(v, str) else clean_number(v) for v in values], pa.float64())
+        num = pc.coalesce(direct, num)
+    return num
+
+
+def _date_columns(values: Tuple) -> Tuple["pa.Array", "pa.Array"]:
+    """(date cells, text of the other cells) — dates stay typed, as in parse_row."""
+    try:
+        arr = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, ValueError):
+        arr = None
+    if arr is not None and (pa.types.is_string(arr.type) or pa.types.is_null(arr.type)):
+        return pa.nulls(len(arr)), _text_column(arr, values)
+    # Split in Python otherwise: Arrow would also read numbers into a timestamp column
+    dates = [v if isinstance(v, (datetime, date)) else None for v in values]
+    if any(isinstance(d, datetime) for d in dates):
+        # One Arrow column can't hold both: plain dates become midnight datetimes
+        dates = [d if d is None or isinstance(d, datetime) else datetime(d.year, d.month, d.day) for d in dates]
+    date_arr = pa.array(dates)
+    texts = [None if v is None or isinstance(v, (datetime, date)) else (str(v).strip() or None) for v in values]
+    return date_arr, pa.array(texts, pa.string())
+
+
+def _data_row_mask(columns: List["pa.Array"], n: int) -> "pa.Array":
+    """is_data_row over a batch: at least two non-empty cells, first one not a total label."""
+    count = pa.array([0] * n, pa.int32())
+    first = pa.nulls(n, pa.string())
+    for arr in columns:
+        if pa.types.is_null(arr.type):
+            continue
+        if pa.types.is_string(arr.type):
+            text = pc.utf8_trim_whitespace(arr)
+            non_empty = pc.fill_null(pc.greater(pc.utf8_length(text), 0), False)
+            label = pc.utf8_lower(text)
+        else:
+            # Numbers, dates and booleans are never blank and never a total label
+            non_empty = arr.is_valid()
+            label = pa.array([""] * n, pa.string())
+        count = pc.add(count, non_empty.cast(pa.int32()))
+        first = pc.coalesce(first, pc.if_else(non_empty, label, pa.scalar(None, pa.string())))
+    return pc.and_(pc.greater_equal(count, 2), pc.invert(pc.is_in(first, pa.array(TOTAL_LABELS))))
+
+
+def _record_batch(rows: List[List], col_map: Dict[str, int], contractor: str) -> "pa.RecordBatch":
+    """parse_row over a chunk of sheet rows, one column operation per field."""
+    n = len(rows)
+    raw = list(zip_longest(*rows))
+    columns = [_arrow_column(values) for values in raw]
+
+    def field_index(name: str) -> Optional[int]:
+        idx = col_map.get(name)
+        return idx if idx is not None and idx < len(raw) else None
+
+    text = {}
+    for name in TEXT_FIELDS:
+        idx = field_index(name)
+        text[name] = pa.nulls(n, pa.string()) if idx is None else _text_column(columns[idx], raw[idx])
+
+    numbers = {}
+    for name in NUMERIC_OUTPUT_FIELDS:
+        idx = field_index(name)
+        numbers[name] = pa.nulls(n, pa.float64()) if idx is None else _number_column(columns[idx], raw[idx])
+
+    idx = field_index("order_date")
+    order_date, order_date_text = (pa.nulls(n), pa.nulls(n, pa.string())) if idx is None \
+        else _date_columns(raw[idx])
+
+    keep = _data_row_mask(columns, n)
+    has_key = pc.or_(pc.or_(text["sales_order_number"].is_valid(), text["item_sku"].is_valid()),
+                     text["item_description"].is_valid())
+    keep = pc.and_(keep, has_key)
+
+    out = {}
+    for name in TEXT_FIELDS:
+        out[name] = pc.fill_null(text[name].filter(keep), "")
+    out["contractor_name"] = pc.fill_null(text["contractor_name"].filter(keep), contractor or "")
+    out["order_date"] = order_date.filter(keep)
+    out["order_date_text"] = pc.fill_null(order_date_text.filter(keep), "")
+
+    ext, qty, unit = (numbers[k].filter(keep) for k in ("extended_price", "ship_quantity", "unit_price"))
+    derive = pc.fill_null(pc.and_(unit.is_null(), pc.and_(pc.not_equal(ext, 0), pc.not_equal(qty, 0))), False)
+    if pc.any(derive).as_py():
+        # Python's round() keeps derived prices identical to parse_row
+        derived = [round(e / q, 4) for e, q in zip(ext.filter(derive).to_pylist(), qty.filter(derive).to_pylist())]
+        unit = pc.replace_with_mask(unit, derive, pa.array(derived, pa.float64()))
+    out.update(extended_price=ext, ship_quantity=qty, unit_price=unit)
+
+    names = [*OUTPUT_HEADERS, "order_date_text"]
+    return pa.RecordBatch.from_arrays([out[name] for name in names], names=names)
+
+
+def build_record_batches(
+    rows: Iterable[List],
+    contractor: str,
+    manual_col_map: Optional[Dict[str, int]] = None,
+) -> Tuple[List["pa.RecordBatch"], Dict[str, int], List[str]]:
+    """
+    Columnar build_records: the same records as Arrow record batches, with
+    row filtering, number parsing and unit-price derivation done as column
+    operations on RECORD_BATCH_ROWS rows at a time. Needs pyarrow.
+    """
+    if pa is None:
+        raise RuntimeError("Columnar record building needs pyarrow (pip install pyarrow)")
+    data_rows, col_map, missing = _data_rows(rows, manual_col_map)
+    if data_rows is None:
+        return [], col_map, missing
+
+    batches = []
+    for chunk in iter(lambda: list(islice(data_rows, RECORD_BATCH_ROWS)), []):
+        batch = _record_batch(chunk, col_map, contractor)
+        if batch.num_rows:
+            batches.append(batch)
+    return batches, col_map, []
+
+
 # ============================================================
 # OUTPUT
 # ============================================================
 
+def _output_rows(records: Iterable) -> Iterator[Tuple]:
+    """Output values in OUTPUT_HEADERS order, from record dicts or record batches."""
+    for rec in records:
+        if isinstance(rec, dict):
+            yield tuple(rec.get(k) for k in OUTPUT_HEADERS)
+            continue
+        columns = {name: rec.column(name).to_pylist() for name in rec.schema.names}
+        columns["order_date"] = [
+            d if d is not None else t for d, t in zip(columns["order_date"], columns["order_date_text"])
+        ]
+        yield from zip(*(columns[k] for k in OUTPUT_HEADERS))
+
+
+def _column_widths(records: List, title_values: List[str]) -> List[float]:
+    """Width per output column: longest value + 4, capped at 50."""
+    longest = [len(h) for h in OUTPUT_HEADERS]
+    longest[0] = max([longest[0], *(len(v) for v in title_values)])
+    for row in _output_rows(records):
+        for i, value in enumerate(row):
+            if value is not None:
+                n = len(str(value))
+                if n > longest[i]:
+                    longest[i] = n
+    return [min(n + 4, 50) for n in longest]
+
+
 def write_output(
-    records: List[Dict],
+    records: List,
     meta: Dict[str, str],
     out_path: Path,
 ):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = SHEET_NAME
-
-    for row_num, value in [
-        (1, "POS Transactional Detail Report"),
-        (2, f"Submitted by: {meta.get('wholesaler_name', '')}"),
-        (3, meta.get("wholesaler_address", "")),
-        (4, meta.get("date_of_this_report", "")),
-    ]:
-        cell = ws.cell(row=row_num, column=1, value=value)
-        cell.font = Font(bold=True)
-
-    for i, h in enumerate(OUTPUT_HEADERS, start=1):
-        cell = ws.cell(row=HEADER_ROW, column=i, value=h)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="left")
+    """
+    Write the Charlotte template with a write-only (streaming) worksheet:
+    rows go straight to the file instead of building a cell object per value.
+    Column widths are computed from the record values before the first row,
+    since write-only sheets need them up front.
+    """
+    title_values = [
+        "POS Transactional Detail Report",
+        f"Submitted by: {meta.get('wholesaler_name', '')}",
+        meta.get("wholesaler_address", ""),
+        meta.get("date_of_this_report", ""),
+    ]
 
-    for r, rec in enumerate(records, start=DATA_START_ROW):
-        for c, k in enumerate(OUTPUT_HEADERS, start=1):
-            ws.cell(row=r, column=c, value=rec.get(k))
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
 
-    for col_cells in ws.columns:
-        max_len = max((len(str(cell.value or "")) for cell in col_cells), default=10)
-        ws.column_dimensions[col_cells[0].column_letter].width = min(max_len + 4, 50)
+    for i, width in enumerate(_column_widths(records, title_values), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    bold = Font(bold=True)
+    for value in title_values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = bold
+        ws.append([cell])
+    for _ in range(len(title_values) + 1, HEADER_ROW):
+        ws.append([])
+
+    header_cells = []
+    for h in OUTPUT_HEADERS:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = bold
+        cell.alignment = Alignment(horizontal="left")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for _ in range(HEADER_ROW + 1, DATA_START_ROW):
+        ws.append([])
+    for row in _output_rows(records):
+        ws.append(list(row))
 
     wb.save(out_path)
 
 
-# ============================================================
-# SCAN — used by the web app to pre-flight all files
-# ============================================================
+def write_output_csv(records: Iterable, out_path: Path):
+    """Same records as a flat CSV (OUTPUT_HEADERS, no title rows) for loaders."""
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_HEADERS)
+        for row in _output_rows(records):
+            writer.writerow(["" if v is None else v for v in row])
 
-def scan_input_files() -> List[Dict]:
+
+# Parquet output columns: numbers as float64, everything else as text
+PARQUET_SCHEMA = pa.schema([
+    (k, pa.float64() if k in NUMERIC_OUTPUT_FIELDS else pa.string()) for k in OUTPUT_HEADERS
+]) if pa is not None else None
+
+
+def _null_if_empty(arr: "pa.Array") -> "pa.Array":
+    return pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+
+
+def _iso_text(arr: "pa.Array") -> "pa.Array":
+    """date / datetime .isoformat() over an Arrow date or timestamp column."""
+    if pa.types.is_null(arr.type):
+        return arr.cast(pa.string())
+    if pa.types.is_date(arr.type):
+        return arr.cast(pa.string())
+    arr = arr.cast(pa.timestamp("us"))
+    whole = pc.floor_temporal(arr, unit="second")
+    text = pc.strftime(whole.cast(pa.timestamp("s")), format="%Y-%m-%dT%H:%M:%S")
+    micros = pc.subtract(arr.cast(pa.int64()), whole.cast(pa.int64()))
+    fraction = pc.utf8_lpad(micros.cast(pa.string()), width=6, padding="0")
+    return pc.if_else(pc.equal(micros, 0), text, pc.binary_join_element_wise(text, fraction, "."))
+
+
+def _parquet_batch(columns: Dict[str, "pa.Array"]) -> "pa.RecordBatch":
+    return pa.RecordBatch.from_arrays([columns[k] for k in OUTPUT_HEADERS], schema=PARQUET_SCHEMA)
+
+
+def _parquet_from_dicts(records: List[Dict]) -> "pa.RecordBatch":
+    def text(value):
+        if value is None or value == "":
+            return None
+        return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+    values = list(zip(*_output_rows(records)))
+    return _parquet_batch({
+        k: pa.array(column, pa.float64()) if k in NUMERIC_OUTPUT_FIELDS
+        else pa.array([text(v) for v in column], pa.string())
+        for k, column in zip(OUTPUT_HEADERS, values)
+    })
+
+
+def _parquet_from_batch(batch: "pa.RecordBatch") -> "pa.RecordBatch":
+    """A build_record_batches batch cast straight to PARQUET_SCHEMA, without Python values."""
+    columns = {}
+    for k in OUTPUT_HEADERS:
+        if k in NUMERIC_OUTPUT_FIELDS:
+            columns[k] = batch.column(k).cast(pa.float64())
+        elif k == "order_date":
+            columns[k] = pc.coalesce(_iso_text(batch.column(k)), _null_if_empty(batch.column("order_date_text")))
+        else:
+            columns[k] = _null_if_empty(batch.column(k))
+    return _parquet_batch(columns)
+
+
+def _parquet_batches(records: Iterable) -> Iterator["pa.RecordBatch"]:
+    """Records (dicts or record batches) as PARQUET_SCHEMA batches; dicts go RECORD_BATCH_ROWS at a time."""
+    pending: List[Dict] = []
+    for rec in records:
+        if isinstance(rec, dict):
+            pending.append(rec)
+            if len(pending) >= RECORD_BATCH_ROWS:
+                yield _parquet_from_dicts(pending)
+                pending = []
+            continue
+        if pending:
+            yield _parquet_from_dicts(pending)
+            pending = []
+        yield _parquet_from_batch(rec)
+    if pending:
+        yield _parquet_from_dicts(pending)
+
+
+def write_output_parquet(records: Iterable, out_path: Path):
     """
-    For each Excel file in INPUT_DIR, attempt header detection.
-    Returns a list of file info dicts:
-      { filename, path, status: 'ready'|'needs_mapping',
-        headers, col_map, missing_fields, rows, contractor }
+    Same records as Parquet: numbers as float64, everything else as text.
+    Written batch by batch, so the output is never held in memory whole.
     """
-    overrides = read_overrides(OVERRIDES_PATH)
-    saved_mappings = load_saved_mappings()
+    if pa is None:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+    with pq.ParquetWriter(out_path, PARQUET_SCHEMA) as writer:
+        for batch in _parquet_batches(records):
+            writer.write_batch(batch)
+
+
+OUTPUT_WRITERS = {
+    "xlsx":    lambda records, meta, path: write_output(records, meta, path),
+    "csv":     lambda records, meta, path: write_output_csv(records, path),
+    "parquet": lambda records, meta, path: write_output_parquet(records, path),
+}
+
 
-    files = [
+# ============================================================
+# SCAN — used by the web app to pre-flight all files
+# ============================================================
+
+def list_input_files() -> List[Path]:
+    """Excel files in INPUT_DIR, sorted (Office lock files skipped)."""
+    return sorted(
         f for f in INPUT_DIR.iterdir()
         if f.is_file()
         and f.suffix.lower() in (".xlsx", ".xlsm")
         and not f.name.startswith("~$")
-    ]
+    )
 
-    results = []
-    for path in sorted(files):
+
+# Bump when header detection changes so cached layouts are recomputed
+SCAN_CACHE_VERSION = 1
+
+
+def file_fingerprint(path: Path, known: Optional[Dict] = None) -> Dict:
+    """
+    {size, mtime_ns, sha256} of a file. When size and mtime match `known`,
+    its sha256 is reused instead of re-reading the file.
+    """
+    st = os.stat(path)
+    fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if known and known.get("size") == fp["size"] and known.get("mtime_ns") == fp["mtime_ns"]:
+        fp["sha256"] = known.get("sha256")
+        return fp
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    fp["sha256"] = h.hexdigest()
+    return fp
+
+
+class ScanCache:
+    """
+    Header-detection results per input file, persisted as JSON and keyed by
+    path + size + mtime + content hash. A file is re-parsed only when its
+    content changed; a touched or re-copied but identical file stays cached.
+    """
+
+    def __init__(self, path: Path = SCAN_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: Dict[str, Dict] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == SCAN_CACHE_VERSION:
+                self._entries = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, path: Path) -> Optional[Tuple[Dict, Dict]]:
+        """(layout, fingerprint) when the cached entry still matches the file."""
+        with self._lock:
+            entry = self._entries.get(str(path))
+        if not entry:
+            return None
         try:
-            csv_path = export_sheet_to_csv(path, SHEET_NAME)
-            rows = read_csv(csv_path)
-            contractor = contractor_fallback(path, overrides)
-
-            header_idx, raw_headers = get_header_row(rows)
-            headers = [clean_text(h) for h in (raw_headers or [])]
-            sig = headers_signature(headers)
-
-            col_map = detect_column_map(rows)
-            missing = check_missing_required_fields(col_map) if col_map else list(REQUIRED_FIELDS)
-
-            # Check saved mappings by header signature
-            saved_col_map = None
-            if sig in saved_mappings:
-                # Convert saved {field: header_string} → {field: col_index}
-                header_lower = [_normalise_header(h) for h in headers]
-                saved_col_map = {}
-                for field, hdr in saved_mappings[sig].items():
-                    norm = _normalise_header(hdr)
-                    if norm in header_lower:
-                        saved_col_map[field] = header_lower.index(norm)
-                if col_map:
-                    saved_col_map["_header_row_index"] = col_map.get("_header_row_index", header_idx or 0)
-                else:
-                    saved_col_map["_header_row_index"] = header_idx or 0
-                missing = check_missing_required_fields(saved_col_map)
-
-            status = "ready" if not missing else "needs_mapping"
-
-            results.append({
-                "filename": path.name,
-                "path": str(path),
-                "status": status,
-                "headers": headers,
-                "header_row_index": header_idx,
-                "col_map": saved_col_map or col_map or {},
-                "missing_fields": missing,
-                "rows": rows,
-                "contractor": contractor,
-                "overrides": overrides.get(path.name.lower(), {}),
-                "headers_signature": sig,
-                "from_saved_mapping": saved_col_map is not None,
-            })
-        except Exception as e:
-            results.append({
-                "filename": path.name,
-                "path": str(path),
-                "status": "error",
-                "error": str(e),
-                "headers": [],
-                "col_map": {},
-                "missing_fields": [],
-                "rows": [],
-                "contractor": "",
-                "overrides": {},
-                "headers_signature": "",
-                "from_saved_mapping": False,
-            })
+            fp = file_fingerprint(path, entry["fingerprint"])
+        except OSError:
+            return None
+        if fp["sha256"] != entry["fingerprint"].get("sha256"):
+            return None
+        if fp != entry["fingerprint"]:
+            with self._lock:
+                entry["fingerprint"] = fp
+                self._dirty = True
+        return entry["layout"], fp
+
+    def store(self, path: Path, fingerprint: Dict, layout: Dict):
+        with self._lock:
+            old = self._entries.get(str(path), {})
+            if old.get("fingerprint", {}).get("sha256") == fingerprint.get("sha256"):
+                layout.setdefault("row_count", old.get("layout", {}).get("row_count"))
+            self._entries[str(path)] = {"fingerprint": fingerprint, "layout": layout}
+            self._dirty = True
+
+    def set_row_count(self, path: Path, row_count: int):
+        with self._lock:
+            entry = self._entries.get(str(path))
+            if entry:
+                entry["layout"]["row_count"] = row_count
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            live = {p: e for p, e in self._entries.items() if os.path.exists(p)}
+            data = json.dumps({"version": SCAN_CACHE_VERSION, "files": live})
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(data, encoding="utf-8")
+        tmp_path.replace(self.path)
+
+
+def detect_file_layout(path: Path) -> Dict:
+    """Header window analysis of one file: the part of a scan worth caching."""
+    rows = read_sheet_rows(path, SHEET_NAME, max_rows=HEADER_SEARCH_ROWS)
+    header_idx, raw_headers = get_header_row(rows)
+    headers = [clean_text(h) for h in (raw_headers or [])]
+    return {
+        "headers": headers,
+        "header_row_index": header_idx,
+        "col_map": detect_column_map(rows) or {},
+        "headers_signature": headers_signature(headers),
+        "row_count": None,
+    }
+
 
+def scan_file(
+    path: Path,
+    overrides: Dict[str, Dict[str, str]],
+    saved_mappings: Optional[MappingStore],
+    cached: Optional[Tuple[Dict, Dict]] = None,
+) -> Dict:
+    """
+    Header detection for one input file. Only the first HEADER_SEARCH_ROWS
+    rows of the sheet are read (none at all when `cached` holds a
+    ScanCache.lookup hit); the rows themselves are streamed again by
+    process_file_with_map. Returns a file info dict:
+      { filename, path, status: 'ready'|'needs_mapping'|'error',
+        headers, col_map, missing_fields, contractor, layout, fingerprint, ... }
+    """
+    path = Path(path)
+    try:
+        if cached:
+            layout, fingerprint = cached
+        else:
+            fingerprint = file_fingerprint(path)
+            layout = detect_file_layout(path)
+        contractor = contractor_fallback(path, overrides)
+
+        headers = layout["headers"]
+        header_idx = layout["header_row_index"]
+        sig = layout["headers_signature"]
+        col_map = dict(layout["col_map"]) or None
+        missing = check_missing_required_fields(col_map) if col_map else list(REQUIRED_FIELDS)
+
+        # Check saved mappings: the exact header signature first, then saved
+        # layouts sharing most of these headers. A near match is only used
+        # when it resolves every required field.
+        saved_col_map = None
+        saved_similarity = None
+        header_lower = [_normalise_header(h) for h in headers]
+        for saved, similarity in (saved_mappings.find(sig, headers) if saved_mappings else []):
+            # Convert saved {field: header_string} → {field: col_index}
+            candidate = {}
+            for field, hdr in saved.items():
+                norm = _normalise_header(hdr)
+                if norm in header_lower:
+                    candidate[field] = header_lower.index(norm)
+            if col_map:
+                candidate["_header_row_index"] = col_map.get("_header_row_index", header_idx or 0)
+            else:
+                candidate["_header_row_index"] = header_idx or 0
+            candidate_missing = check_missing_required_fields(candidate)
+            if similarity < 1.0 and candidate_missing:
+                continue
+            saved_col_map, saved_similarity, missing = candidate, similarity, candidate_missing
+            break
+
+        status = "ready" if not missing else "needs_mapping"
+
+        return {
+            "filename": path.name,
+            "path": str(path),
+            "status": status,
+            "headers": headers,
+            "header_row_index": header_idx,
+            "col_map": saved_col_map or col_map or {},
+            "missing_fields": missing,
+            "contractor": contractor,
+            "overrides": overrides.get(path.name.lower(), {}),
+            "headers_signature": sig,
+            "from_saved_mapping": saved_col_map is not None,
+            "saved_mapping_similarity": saved_similarity,
+            "row_count": layout.get("row_count"),
+            "layout": layout,
+            "fingerprint": fingerprint,
+            "from_cache": cached is not None,
+        }
+    except Exception as e:
+        return scan_error_info(path, e)
+
+
+def scan_error_info(path: Path, error) -> Dict:
+    """File info for a file whose scan failed."""
+    return {
+        "filename": path.name,
+        "path": str(path),
+        "status": "error",
+        "error": str(error),
+        "headers": [],
+        "col_map": {},
+        "missing_fields": [],
+        "contractor": "",
+        "overrides": {},
+        "headers_signature": "",
+        "from_saved_mapping": False,
+    }
+
+
+def scan_input_files() -> List[Dict]:
+    """
+    For each Excel file in INPUT_DIR, attempt header detection (see scan_file).
+    Unchanged files are served from the scan cache. The web app runs
+    scan_file per file on its worker pool instead.
+    """
+    overrides = read_overrides(OVERRIDES_PATH)
+    saved_mappings = open_mapping_store()
+    cache = ScanCache()
+
+    results = []
+    for path in list_input_files():
+        info = scan_file(path, overrides, saved_mappings, cached=cache.lookup(path))
+        if "layout" in info and not info["from_cache"]:
+            cache.store(path, info["fingerprint"], info["layout"])
+        results.append(info)
+
+    try:
+        cache.save()
+    except OSError:
+        pass
     return results
 
 
@@ -477,14 +1064,22 @@ def process_file_with_map(file_info: Dict) -> Tuple[int, str]:
     Returns (record_count, output_filename).
     """
     path = Path(file_info["path"])
-    rows = file_info["rows"]
+    rows = iter_sheet_rows(path, SHEET_NAME)
     col_map = file_info["col_map"]
     contractor = file_info["contractor"]
     overrides = file_info["overrides"]
 
-    records, _, missing = build_records(rows, contractor, manual_col_map=col_map)
+    if pa is not None:
+        records, _, missing = build_record_batches(rows, contractor, manual_col_map=col_map)
+        row_count = sum(batch.num_rows for batch in records)
+    else:
+        records, _, missing = build_records(rows, contractor, manual_col_map=col_map)
+        row_count = len(records)
 
-    out_path = OUTPUT_DIR / f"{path.stem}_Charlotte_Output.xlsx"
-    write_output(records, overrides, out_path)
+    out_names = []
+    for fmt in OUTPUT_FORMATS:
+        out_path = OUTPUT_DIR / f"{path.stem}_Charlotte_Output.{fmt}"
+        OUTPUT_WRITERS[fmt](records, overrides, out_path)
+        out_names.append(out_path.name)
 
-    return len(records), out_path.name
\ No newline at end of file
+    return row_count, out_names[0]
\ No newline at end of file
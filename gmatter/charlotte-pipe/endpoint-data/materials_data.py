@@ -6,8 +6,19 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 import os
 import pickle
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+import duckdb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from material_catalog import store_catalog
+from partitioned_fetch import DEFAULT_WORKERS, fetch_partitions, get_partition, make_session, plan_partitions
+
 # Google Sheets API scope
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
 
@@ -66,24 +77,7 @@ def fetch_api_data(endpoint_url: str, params: Optional[Dict] = None) -> Optional
         
         data = response.json()
         print(f"📊 API Response type: {type(data)}")
-        
-        # Handle different response structures
-        if isinstance(data, list):
-            print(f"✅ Found {len(data)} records")
-            return data
-        elif isinstance(data, dict):
-            # Look for common array keys
-            for key in ['data', 'results', 'items', 'records', 'list']:
-                if key in data and isinstance(data[key], list):
-                    print(f"✅ Found {len(data[key])} records in '{key}' field")
-                    return data[key]
-            
-            # If no array found, treat as single record
-            print("✅ Single record found, converting to list")
-            return [data]
-        else:
-            print(f"❌ Unexpected data type: {type(data)}")
-            return None
+        return extract_records(data)
             
     except requests.exceptions.RequestException as e:
         print(f"❌ API request failed: {e}")
@@ -92,6 +86,80 @@ def fetch_api_data(endpoint_url: str, params: Optional[Dict] = None) -> Optional
         print(f"❌ Invalid JSON response: {e}")
         return None
 
+def extract_records(data: Any, verbose: bool = True) -> Optional[List[Dict]]:
+    """
+    Pull the record list out of a parsed API response.
+    
+    Args:
+        data: Parsed JSON (a list, or an object holding the list)
+        verbose: Print what was found
+        
+    Returns:
+        List of records, or None for an unexpected response
+    """
+    # Handle different response structures
+    if isinstance(data, list):
+        if verbose:
+            print(f"✅ Found {len(data)} records")
+        return data
+    elif isinstance(data, dict):
+        # Look for common array keys
+        for key in ['data', 'results', 'items', 'records', 'list']:
+            if key in data and isinstance(data[key], list):
+                if verbose:
+                    print(f"✅ Found {len(data[key])} records in '{key}' field")
+                return data[key]
+        
+        # If no array found, treat as single record
+        if verbose:
+            print("✅ Single record found, converting to list")
+        return [data]
+    else:
+        print(f"❌ Unexpected data type: {type(data)}")
+        return None
+
+def fetch_api_data_partitioned(endpoint_url: str, params: Optional[Dict], partition_spec: Dict,
+                               workers: int = DEFAULT_WORKERS, max_retries: int = 3,
+                               timeout: int = 300) -> Optional[List[Dict]]:
+    """
+    Fetch data from API endpoint as concurrent partitions (see
+    shared/partitioned_fetch.py) and merge them into one list.
+    
+    Args:
+        endpoint_url: API endpoint URL
+        params: Optional query parameters, sent with every partition
+        partition_spec: How to split the extract, e.g. {"by": "page", ...}
+        workers: Concurrent requests
+        max_retries: Attempts per partition
+        timeout: Read timeout per request, in seconds
+        
+    Returns:
+        Records of all partitions in partition order, or None if any failed
+    """
+    partitions = plan_partitions(partition_spec)
+    print(f"🌐 Fetching data from: {endpoint_url} in {len(partitions)} partition(s)")
+    session = make_session(workers)
+
+    def fetch(partition: Dict) -> List[Dict]:
+        response = get_partition(session, endpoint_url, params, partition, stream=False, timeout=timeout)
+        records = extract_records(response.json(), verbose=False)
+        if records is None:
+            raise ValueError("unexpected response shape")
+        return records
+
+    try:
+        results, failures = fetch_partitions(partitions, fetch, workers, max_retries)
+    finally:
+        session.close()
+    if failures:
+        for name, error in failures.items():
+            print(f"❌ Partition {name} failed: {error}")
+        return None
+
+    data = [record for p in partitions for record in results[p["name"]]]
+    print(f"✅ Found {len(data)} records in {len(partitions)} partition(s)")
+    return data
+
 def extract_columns_from_data(data: List[Dict]) -> List[str]:
     """
     Extract all unique column names from the data.
@@ -289,6 +357,324 @@ def write_to_sheet(client: gspread.Client, sheet_id: str, worksheet_name: str,
         print(f"❌ Error writing to Google Sheets: {e}")
         return False
 
+# ========== DELTA SYNC ==========
+#
+# sync_to_sheet keeps a local snapshot of what it last pushed (headers, row
+# keys and cell values, in sheet order) and on the next run sends only the
+# difference: rows whose key disappeared are deleted, changed rows are
+# rewritten in place and new rows are appended, with contiguous rows merged
+# into one range and all ranges sent in a few large batch_update calls. An
+# unchanged catalog costs no writes at all. It falls back to a full rewrite
+# when there is no usable snapshot, the columns changed, the sheet no longer
+# matches the snapshot, or most rows changed anyway.
+
+SNAPSHOT_DIR = "sheet_snapshots"
+# Cells per values.batchUpdate call (keeps request bodies well under API limits)
+MAX_CELLS_PER_CALL = 50_000
+# Above this share of changed rows a full rewrite is simpler than a diff
+FULL_REFRESH_SHARE = 0.5
+
+def column_letter(n: int) -> str:
+    """Column letter(s) for a 1-based column number (1 → A, 27 → AA, 703 → AAA)."""
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+def sheet_snapshot_path(sheet_id: str, worksheet_name: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{sheet_id}_{worksheet_name}")
+    return os.path.join(SNAPSHOT_DIR, f"{safe_name}.json")
+
+def load_sheet_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_sheet_snapshot(path: str, snapshot: Dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+def pick_key_columns(headers: List[str], rows: List[List]) -> List[str]:
+    """
+    Choose the column that identifies a catalog row.
+    
+    Args:
+        headers: Column headers
+        rows: Sheet rows (as from prepare_sheet_data)
+        
+    Returns:
+        [column] for the first ID-like column (name ending in "id", or "sku")
+        whose values are all filled and unique; [] if none qualifies
+    """
+    for i, header in enumerate(headers):
+        name = header.lower().replace("_", "")
+        if not (name.endswith("id") or name == "sku"):
+            continue
+        values = [row[i] for row in rows]
+        if all(values) and len(set(values)) == len(values):
+            return [header]
+    return []
+
+def row_keys(headers: List[str], rows: List[List], key_columns: List[str]) -> List[str]:
+    """
+    One key per row: the key columns' values, or — without usable key columns
+    (none given, or their values repeat) — the row content itself, numbered
+    when identical rows repeat. Content-keyed rows that change show up as a
+    delete plus an append.
+    """
+    if key_columns and all(c in headers for c in key_columns):
+        idx = [headers.index(c) for c in key_columns]
+        keys = ["\x1f".join(row[i] for i in idx) for row in rows]
+        if len(set(keys)) == len(keys):
+            return keys
+        print(f"⚠️ Key columns {key_columns} repeat values — keying rows by content instead")
+    seen: Dict[str, int] = {}
+    keys = []
+    for row in rows:
+        content = "\x1f".join(row)
+        seen[content] = seen.get(content, 0) + 1
+        keys.append(f"{content}\x1e{seen[content]}")
+    return keys
+
+def diff_sheet_rows(old_keys: List[str], old_rows: List[List], new_keys: List[str], new_rows: List[List]) -> Dict:
+    """
+    Keyed row diff between the rows last pushed and the new data.
+    
+    Rows that stay keep their sheet order; new rows go after them.
+    
+    Returns:
+        {"deleted": old row indexes, "updated": indexes in the new layout,
+         "appended": indexes in the new layout, "keys" / "rows": the new layout}
+    """
+    new_by_key = dict(zip(new_keys, new_rows))
+    old_by_key = dict(zip(old_keys, old_rows))
+    deleted = [i for i, key in enumerate(old_keys) if key not in new_by_key]
+    keys = [key for key in old_keys if key in new_by_key]
+    rows = [new_by_key[key] for key in keys]
+    updated = [i for i, key in enumerate(keys) if rows[i] != old_by_key[key]]
+    appended = []
+    for key, row in zip(new_keys, new_rows):
+        if key not in old_by_key:
+            appended.append(len(rows))
+            keys.append(key)
+            rows.append(row)
+    return {"deleted": deleted, "updated": updated, "appended": appended, "keys": keys, "rows": rows}
+
+def _runs(indexes: List[int]) -> List[tuple]:
+    """Contiguous runs of sorted indexes as (first, last) pairs."""
+    runs = []
+    for i in sorted(indexes):
+        if runs and i == runs[-1][1] + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [tuple(r) for r in runs]
+
+def _with_quota_retry(call, label: str, max_retries: int = 3):
+    """Run one Sheets API call, waiting out rate limits (30, 60, 90 seconds)."""
+    for attempt in range(max_retries):
+        try:
+            return call()
+        except Exception as e:
+            error_str = str(e)
+            if ("Quota exceeded" in error_str or "429" in error_str) and attempt < max_retries - 1:
+                wait_time = (attempt + 1) * 30
+                print(f"⏳ Rate limit hit on {label}. Waiting {wait_time} seconds before retry...")
+                time.sleep(wait_time)
+            else:
+                raise
+
+def _write_rows(worksheet, rows: List[List], indexes: List[int], width: int, first_row: int = 2) -> int:
+    """
+    Write rows[i] for each index to sheet row first_row + i, merging contiguous
+    rows into one range and ranges into batch_update calls of up to
+    MAX_CELLS_PER_CALL cells. Returns the number of API calls made.
+    """
+    end_col = column_letter(width)
+    calls = 0
+    batch, cells = [], 0
+    for first, last in _runs(indexes):
+        start = first
+        # Split runs that alone exceed the per-call budget
+        while start <= last:
+            stop = min(last, start + max(MAX_CELLS_PER_CALL // width, 1) - 1)
+            if batch and cells + (stop - start + 1) * width > MAX_CELLS_PER_CALL:
+                _with_quota_retry(lambda b=batch: worksheet.batch_update(b, value_input_option='USER_ENTERED'), "batch update")
+                calls += 1
+                batch, cells = [], 0
+            batch.append({
+                "range": f"A{first_row + start}:{end_col}{first_row + stop}",
+                "values": rows[start:stop + 1],
+            })
+            cells += (stop - start + 1) * width
+            start = stop + 1
+    if batch:
+        _with_quota_retry(lambda: worksheet.batch_update(batch, value_input_option='USER_ENTERED'), "batch update")
+        calls += 1
+    return calls
+
+def _ensure_grid(worksheet, rows: int, cols: int, row_count: Optional[int] = None) -> int:
+    """
+    Grow the worksheet to at least rows × cols (row_count: its current row
+    count, if it changed since the worksheet was fetched). Returns the number
+    of API calls made.
+    """
+    row_count = worksheet.row_count if row_count is None else row_count
+    if row_count >= rows and worksheet.col_count >= cols:
+        return 0
+    new_rows = max(row_count, rows + 100)  # Extra buffer
+    new_cols = max(worksheet.col_count, cols)
+    print(f"📐 Resizing worksheet to {new_rows} rows × {new_cols} columns...")
+    _with_quota_retry(lambda: worksheet.resize(rows=new_rows, cols=new_cols), "resize")
+    return 1
+
+def _rewrite_sheet(worksheet, headers: List[str], rows: List[List]) -> int:
+    """Clear the worksheet and write headers + rows. Returns the number of API calls made."""
+    calls = _ensure_grid(worksheet, len(rows) + 1, len(headers))
+    _with_quota_retry(worksheet.clear, "clear")
+    calls += 1
+    all_rows = [headers] + rows
+    calls += _write_rows(worksheet, all_rows, list(range(len(all_rows))), len(headers), first_row=1)
+    return calls
+
+def _apply_sheet_diff(sheet, worksheet, headers: List[str], diff: Dict) -> int:
+    """Apply a diff_sheet_rows result to the worksheet. Returns the number of API calls made."""
+    calls = 0
+    row_count = worksheet.row_count
+    if diff["deleted"]:
+        # Bottom-up, so earlier deletions don't shift the later ones (row 1 is the header)
+        requests_ = [
+            {"deleteDimension": {"range": {
+                "sheetId": worksheet.id, "dimension": "ROWS", "startIndex": first + 1, "endIndex": last + 2,
+            }}}
+            for first, last in reversed(_runs(diff["deleted"]))
+        ]
+        _with_quota_retry(lambda: sheet.batch_update({"requests": requests_}), "row deletion")
+        calls += 1
+        row_count -= len(diff["deleted"])
+    if diff["appended"]:
+        calls += _ensure_grid(worksheet, len(diff["rows"]) + 1, len(headers), row_count)
+    calls += _write_rows(worksheet, diff["rows"], diff["updated"] + diff["appended"], len(headers))
+    return calls
+
+def sync_to_sheet(client: gspread.Client, sheet_id: str, worksheet_name: str, headers: List[str],
+                  data: List[List], key_columns: Optional[List[str]] = None,
+                  snapshot_file: Optional[str] = None, full_refresh: bool = False) -> bool:
+    """
+    Push data to Google Sheets, sending only the rows that changed since the
+    last sync (see DELTA SYNC above).
+    
+    Args:
+        client: Authenticated gspread client
+        sheet_id: Google Sheet ID
+        worksheet_name: Worksheet name
+        headers: Column headers
+        data: Data rows (as from prepare_sheet_data)
+        key_columns: Column(s) identifying a row; None picks an ID column
+        snapshot_file: Snapshot of the last push; defaults to SNAPSHOT_DIR/<sheet>_<worksheet>.json
+        full_refresh: Rewrite the whole sheet regardless of the snapshot
+        
+    Returns:
+        True if successful
+    """
+    snapshot_file = snapshot_file or sheet_snapshot_path(sheet_id, worksheet_name)
+    try:
+        print(f"📝 Opening Google Sheet...")
+        sheet = client.open_by_key(sheet_id)
+        try:
+            worksheet = sheet.worksheet(worksheet_name)
+            snapshot = None if full_refresh else load_sheet_snapshot(snapshot_file)
+        except gspread.WorksheetNotFound:
+            print(f"📄 Creating new worksheet: {worksheet_name}")
+            worksheet = sheet.add_worksheet(title=worksheet_name, rows=len(data) + 100, cols=len(headers))
+            snapshot = None
+
+        if key_columns is None:
+            key_columns = pick_key_columns(headers, data)
+        keys = row_keys(headers, data, key_columns)
+
+        reason = None
+        diff = None
+        if full_refresh:
+            reason = "full refresh requested"
+        elif snapshot is None:
+            reason = "no snapshot of the last push"
+        elif snapshot.get("headers") != headers:
+            reason = "columns changed"
+        elif snapshot.get("key_columns") != key_columns:
+            reason = "key columns changed"
+        elif worksheet.row_values(1) != headers or worksheet.row_count < len(snapshot["rows"]) + 1:
+            reason = "sheet no longer matches the last push"
+        else:
+            diff = diff_sheet_rows(snapshot["keys"], snapshot["rows"], keys, data)
+            changed = len(diff["deleted"]) + len(diff["updated"]) + len(diff["appended"])
+            print(f"🔍 {len(diff['updated'])} changed, {len(diff['appended'])} new, "
+                  f"{len(diff['deleted'])} removed row(s) since the last sync")
+            if not changed:
+                print("✅ Sheet already up to date — nothing to write")
+                return True
+            if changed > FULL_REFRESH_SHARE * max(len(data), len(snapshot["rows"])):
+                reason = f"{changed} of {len(data)} rows changed"
+
+        # Until the writes succeed, the snapshot no longer describes the sheet
+        if os.path.exists(snapshot_file):
+            os.remove(snapshot_file)
+
+        if reason:
+            print(f"🧹 Rewriting the whole sheet ({reason})...")
+            calls = _rewrite_sheet(worksheet, headers, data)
+            keys_out, rows_out = keys, data
+        else:
+            calls = _apply_sheet_diff(sheet, worksheet, headers, diff)
+            keys_out, rows_out = diff["keys"], diff["rows"]
+
+        save_sheet_snapshot(snapshot_file, {
+            "sheet_id": sheet_id,
+            "worksheet": worksheet_name,
+            "headers": headers,
+            "key_columns": key_columns,
+            "keys": keys_out,
+            "rows": rows_out,
+            "synced_at": datetime.now().isoformat(),
+        })
+        print(f"✅ Synced {len(rows_out)} rows with {calls} write call(s)")
+        print(f"🔗 View your sheet: https://docs.google.com/spreadsheets/d/{sheet_id}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error syncing to Google Sheets: {e}")
+        return False
+
+def save_catalog_locally(data: List[Dict], db_path: str) -> bool:
+    """
+    Persist the catalog to DuckDB (program_materials + material_codes) so QC
+    can classify pipe vs fitting by SKU / UPC instead of by description.
+    
+    Args:
+        data: Catalog records from the API
+        db_path: DuckDB file shared with the QC scripts
+        
+    Returns:
+        True if successful
+    """
+    try:
+        con = duckdb.connect(db_path)
+        try:
+            code_count = store_catalog(con, data)
+        finally:
+            con.close()
+        print(f"✅ Saved {len(data)} catalog records ({code_count} codes indexed) to {db_path}")
+        return True
+    except Exception as e:
+        print(f"❌ Error saving catalog to DuckDB: {e}")
+        return False
+
 def main():
     """Main function to run the API to Google Sheets sync."""
     
@@ -302,10 +688,21 @@ def main():
         # "page": 1
     }
     
+    # Split the fetch into concurrent partitions (None = one request), using
+    # query parameters the endpoint accepts; see shared/partitioned_fetch.py
+    API_PARTITIONS = None
+    # API_PARTITIONS = {"by": "page", "param": "page", "pages": 20, "size_param": "limit", "size": 5000}
+    FETCH_WORKERS = 4
+    
     # Google Sheets Configuration
     OAUTH2_CREDENTIALS_FILE = "/Users/lorimartella/Documents/gmatter/client_secret_490677366778-qkpf9k95otitjrneaof6sjtajod97bgc.apps.googleusercontent.com.json"  # Path to your OAuth2 client credentials file
     SHEET_ID = "1MXm6sngsqDxAErjZm9odsaS80AS1HPqvhstfCFhdmys"  # Replace with your Google Sheet ID
     WORKSHEET_NAME = "API_Data"  # Name of the worksheet to create/update
+    SHEET_SYNC = "delta"  # "delta": push only changed rows; "full": clear and rewrite the sheet
+    SHEET_KEY_COLUMNS = None  # Column(s) identifying a catalog row; None picks an ID column
+    
+    # Local catalog used by payment-run-qc/pipe_fitting_category.py
+    CATALOG_DB = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
     
     # ========== EXECUTION ==========
     
@@ -324,11 +721,17 @@ def main():
         return
     
     # Step 2: Fetch data from API
-    api_data = fetch_api_data(API_ENDPOINT, API_PARAMS)
+    if API_PARTITIONS:
+        api_data = fetch_api_data_partitioned(API_ENDPOINT, API_PARAMS, API_PARTITIONS, FETCH_WORKERS)
+    else:
+        api_data = fetch_api_data(API_ENDPOINT, API_PARAMS)
     if not api_data:
         print("❌ Failed to fetch data from API")
         return
     
+    # Step 2b: Keep a local, indexed copy for QC
+    save_catalog_locally(api_data, CATALOG_DB)
+    
     # Step 3: Extract column names
     columns = extract_columns_from_data(api_data)
     print(f"📋 Found {len(columns)} columns: {columns[:10]}{'...' if len(columns) > 10 else ''}")
@@ -342,7 +745,10 @@ def main():
     print(f"📊 Prepared {len(sheet_data)} rows for Google Sheets")
     
     # Step 5: Write to Google Sheets
-    success = write_to_sheet(client, SHEET_ID, WORKSHEET_NAME, columns, sheet_data)
+    if SHEET_SYNC == "delta":
+        success = sync_to_sheet(client, SHEET_ID, WORKSHEET_NAME, columns, sheet_data, SHEET_KEY_COLUMNS)
+    else:
+        success = write_to_sheet(client, SHEET_ID, WORKSHEET_NAME, columns, sheet_data)
     
     if success:
         print("\n🎉 Script completed successfully!")
@@ -389,5 +795,8 @@ NOTES:
 - The script automatically detects column structure from your API data
 - It handles different API response formats (arrays, objects with data arrays, etc.)
 - Large datasets are written in batches for better performance
+- With SHEET_SYNC = "delta" only rows that changed since the last run are written;
+  the last push is remembered in sheet_snapshots/ (delete it to force a full rewrite)
+- Large extracts can be fetched as concurrent partitions (API_PARTITIONS)
 - Credentials are saved locally for future runs (token.pickle file)
 """
@@ -1,18 +1,189 @@
+"""
+Fetch the GET_ContractorDB_POS extract.
+
+Modes:
+  file     — save the raw response to OUTPUT_FILE (default)
+  duckdb   — parse the JSON while it downloads and load the records into
+             POS_TABLE in the shared DuckDB file, in Arrow batches
+  parquet  — same, written as Parquet part files under PARQUET_DIR
+
+The ingest modes never hold the whole response: records are parsed one at a
+time from the stream and written every BATCH_RECORDS (see
+shared/json_ingest.py for schema inference / evolution). The table or folder
+is only replaced once the whole extract has loaded.
+
+Resuming: a pull that is cut off keeps its progress on disk, and retries (or
+the next run) pick up from there instead of starting over.
+  • file mode downloads to OUTPUT_FILE.part; the byte count synced to disk is
+    checkpointed in OUTPUT_FILE.part.json, and OUTPUT_FILE only appears, by
+    rename, once the download completes — checked against the response size,
+    or, when the server doesn't send one, by parsing the JSON to its end (a
+    connection closed early otherwise looks like the end of the body).
+  • ingest modes checkpoint with every batch (see json_ingest).
+If the server accepts HTTP Range requests, the transfer continues from the
+checkpointed byte — for ingest modes, the byte after the last loaded record.
+Otherwise the extract is requested again and the records already loaded are
+skipped (file mode starts the .part file again). If-Range with the ETag /
+Last-Modified of the interrupted response makes sure a resumed transfer is of
+the same extract; without either header, an extract re-sent in full is
+assumed to be the same one, in the same order.
+
+Partitioned pulls (ingest modes): with --from / --to the extract is split
+into date windows of --days days (POS_DATE_PARAMS name the endpoint's date
+filters) and fetched by --workers concurrent requests over one connection
+pool; see shared/partitioned_fetch.py. Each window is retried on its own and
+spooled to Parquet under <target>.partitions/; the windows are merged into
+the table / folder in one swap once all have arrived. Windows that finished
+are kept when others fail, and the next run of the same plan only fetches
+the rest.
+
+Run with:  python pos_data.py [--mode file|duckdb|parquet] [--db PATH] [--table NAME] [--parquet-dir DIR] [--restart]
+                              [--from YYYY-MM-DD --to YYYY-MM-DD [--days N] [--workers N]]
+"""
+
+import argparse
 import requests
 import json
+import shutil
+import sys
 import time
 import os
-from typing import Dict, Any, Optional
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
 
-def fetch_and_save_data(
+import duckdb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from json_ingest import (
+    BATCH_RECORDS,
+    DuckDBSink,
+    JsonRecordStream,
+    ParquetSink,
+    TruncatedJSONError,
+    decode_chunks,
+    ingest_records,
+    load_parquet_parts,
+    publish_parquet_parts,
+    write_json_atomic,
+)
+from partitioned_fetch import DEFAULT_WORKERS, fetch_partitions, get_partition, make_session, plan_key, plan_partitions
+
+MODES = ("file", "duckdb", "parquet")
+DATABASE_FILE = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
+POS_TABLE = "pos_data"
+PARQUET_DIR = "pos_data_parquet"
+# Date filter parameters of GET_ContractorDB_POS used by partitioned pulls
+POS_DATE_PARAMS = ("StartDate", "EndDate")  # fill in
+
+# Print download progress every this many bytes
+PROGRESS_BYTES = 50 * 1024 * 1024
+# File mode: sync the .part file and checkpoint its size every this many bytes
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+class TransferStats:
+    """Progress and throughput of a download, across its attempts."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.received = 0       # bytes received over all attempts
+        self.resumed_from = 0   # offset the latest attempt started at
+        self.position = 0       # current offset in the full response
+        self.total = None       # full response size, if the server sent it
+        self._attempt_started = self.started
+        self._attempt_received = 0
+        self._next_report = PROGRESS_BYTES
+
+    def begin_attempt(self, response: requests.Response, offset: int = 0):
+        self.attempts += 1
+        self.resumed_from = self.position = offset
+        self._attempt_started = time.perf_counter()
+        self._attempt_received = 0
+        self._next_report = PROGRESS_BYTES
+        content_range = response.headers.get("Content-Range", "")
+        length = response.headers.get("Content-Length")
+        if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+            self.total = int(content_range.rsplit("/", 1)[1])
+        elif length and length.isdigit() and not response.headers.get("Content-Encoding"):
+            self.total = offset + int(length)
+        else:
+            self.total = None
+        if offset:
+            print(f"↪ Resuming at byte {offset:,}")
+
+    def rate(self) -> float:
+        """Bytes per second over the current attempt."""
+        elapsed = time.perf_counter() - self._attempt_started
+        return self._attempt_received / elapsed if elapsed > 0 else 0.0
+
+    def on_bytes(self, n: int):
+        self.received += n
+        self._attempt_received += n
+        self.position += n
+        if self._attempt_received >= self._next_report:
+            self._next_report += PROGRESS_BYTES
+            print(f"  Received: {self.progress()}")
+
+    def progress(self) -> str:
+        done = _format_bytes(self.position)
+        if self.total:
+            done += f" of {_format_bytes(self.total)} ({100.0 * self.position / self.total:.0f}%)"
+        return f"{done} — {_format_bytes(self.rate())}/s"
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{_format_bytes(self.received)} received in {elapsed:.1f}s "
+                f"({_format_bytes(self.received / elapsed if elapsed > 0 else 0)}/s), "
+                f"{self.attempts} attempt(s)")
+
+
+def _validator(response: requests.Response) -> Optional[str]:
+    """Strong ETag or Last-Modified, usable in If-Range."""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _accepts_ranges(response: requests.Response) -> bool:
+    # Offsets are counted on the decoded body, so compressed responses can't be resumed by byte
+    if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+        return False
+    return response.status_code == 206 or response.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+
+def _range_headers(offset: Optional[int], validator: Optional[str]) -> Dict[str, str]:
+    if not offset:
+        return {}
+    headers = {"Range": f"bytes={offset}-"}
+    if validator:
+        headers["If-Range"] = validator
+    return headers
+
+
+def _fetch_with_retries(
     endpoint_url: str,
-    output_file: str,
+    consume: Callable[[requests.Response], None],
     headers: Optional[Dict[str, str]] = None,
     params: Optional[Dict[str, Any]] = None,
-    chunk_size: int = 8192,
     max_retries: int = 3,
-    timeout: int = 300  # bumped to 300 — large POS datasets can be slow to start
-):
+    timeout: int = 300,
+    resume_headers: Optional[Callable[[], Dict[str, str]]] = None
+) -> bool:
+    """
+    GET endpoint_url as a stream and hand the response to consume(), retrying
+    transient failures. resume_headers() adds per-attempt headers (Range).
+    """
     session = requests.Session()
     if headers:
         session.headers.update(headers)
@@ -24,38 +195,20 @@ def fetch_and_save_data(
             response = session.get(
                 endpoint_url,
                 params=params,
+                headers=resume_headers() if resume_headers else None,
                 stream=True,
-                timeout=(15, 300)  # (connect timeout, read timeout) — separate concerns
+                timeout=(15, timeout)  # (connect timeout, read timeout) — separate concerns
             )
             response.raise_for_status()
-
-            content_type = response.headers.get('content-type', '').lower()
-            total_bytes = 0
-
-            with open(output_file, 'w', encoding='utf-8') as f:
-                if 'application/json' in content_type:
-                    print("Streaming JSON response...")
-                    # Stream raw chunks to file instead of loading all into memory
-                    for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
-                        if chunk:
-                            f.write(chunk)
-                            total_bytes += len(chunk.encode('utf-8'))
-                            if total_bytes % (chunk_size * 100) == 0:
-                                print(f"  Received: {total_bytes:,} bytes")
-                else:
-                    print("Streaming text response...")
-                    for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
-                        if chunk:
-                            f.write(chunk)
-                            total_bytes += len(chunk.encode('utf-8'))
-
-            print(f"✅ Saved to: {output_file} ({get_file_size(output_file)})")
+            consume(response)
             return True
 
         except requests.exceptions.Timeout as e:
             print(f"⏱ Timeout on attempt {attempt + 1}: {e}")
-        except requests.exceptions.ConnectionError as e:
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
             print(f"🔌 Connection error on attempt {attempt + 1}: {e}")
+        except TruncatedJSONError as e:
+            print(f"🔌 Response cut off on attempt {attempt + 1}: {e}")
         except requests.exceptions.HTTPError as e:
             print(f"🚫 HTTP {response.status_code} on attempt {attempt + 1}: {response.text[:300]}")
             # Don't retry on auth errors — they won't resolve themselves
@@ -75,15 +228,253 @@ def fetch_and_save_data(
     return False
 
 
+def _check_json_complete(path: str, encoding: str = "utf-8"):
+    """Parse the saved JSON through to its end; TruncatedJSONError if it was cut off."""
+    with open(path, "rb") as f:
+        chunks = iter(lambda: f.read(1024 * 1024), b"")
+        for _ in JsonRecordStream(decode_chunks(chunks, encoding=encoding), encoding=encoding):
+            pass
+
+
+def fetch_and_save_data(
+    endpoint_url: str,
+    output_file: str,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = 8192,
+    max_retries: int = 3,
+    timeout: int = 300,  # bumped to 300 — large POS datasets can be slow to start
+    restart: bool = False
+):
+    part_file = output_file + ".part"
+    checkpoint_file = Path(part_file + ".json")
+    state: Dict[str, Any] = {}
+    if not restart and checkpoint_file.exists():
+        try:
+            with open(checkpoint_file, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        # The part file is trusted up to the checkpointed size only
+        if not os.path.exists(part_file) or os.path.getsize(part_file) < state.get("bytes", 0):
+            state = {}
+    stats = TransferStats()
+
+    def resume_headers() -> Dict[str, str]:
+        return _range_headers(state.get("bytes") if state.get("ranges") else None, state.get("validator"))
+
+    def save(response: requests.Response):
+        resumed = response.status_code == 206
+        offset = state["bytes"] if resumed else 0
+        state.update(bytes=offset, ranges=_accepts_ranges(response), validator=_validator(response))
+        stats.begin_attempt(response, offset)
+        content_type = response.headers.get('content-type', '').lower()
+        print("Streaming JSON response..." if 'application/json' in content_type else "Streaming text response...")
+
+        # Raw bytes go straight to the file: no decode / re-encode per chunk
+        with open(part_file, 'r+b' if resumed else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            unsynced = 0
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        stats.on_bytes(len(chunk))
+                        unsynced += len(chunk)
+                        if unsynced >= CHECKPOINT_BYTES:
+                            unsynced = 0
+                            f.flush()
+                            os.fsync(f.fileno())
+                            state["bytes"] = f.tell()
+                            write_json_atomic(checkpoint_file, state)
+            finally:
+                # Everything written so far is kept for the next attempt
+                f.flush()
+                os.fsync(f.fileno())
+                state["bytes"] = f.tell()
+                write_json_atomic(checkpoint_file, state)
+
+        # A connection closed early can look like the end of the body: check before the rename
+        if stats.total is not None:
+            if state["bytes"] != stats.total:
+                raise TruncatedJSONError(f"Download ended at byte {state['bytes']:,} of {stats.total:,}")
+        elif 'application/json' in content_type:
+            _check_json_complete(part_file, response.encoding or "utf-8")
+
+        os.replace(part_file, output_file)
+        checkpoint_file.unlink(missing_ok=True)
+        print(f"✅ Saved to: {output_file} ({get_file_size(output_file)})")
+
+    success = _fetch_with_retries(endpoint_url, save, headers, params, max_retries, timeout, resume_headers)
+    print(f"📊 {stats.summary()}")
+    if not success and state.get("bytes"):
+        print(f"Partial download kept: {part_file} ({state['bytes']:,} bytes) — the next run resumes it.")
+    return success
+
+
+def fetch_and_ingest(
+    endpoint_url: str,
+    db_path: Optional[str] = None,
+    table: str = POS_TABLE,
+    parquet_dir: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = 64 * 1024,
+    batch_records: int = BATCH_RECORDS,
+    max_retries: int = 3,
+    timeout: int = 300,
+    restart: bool = False
+):
+    """
+    Parse the JSON response while it downloads and load its records into
+    `table` in db_path (or Parquet part files under parquet_dir). A failed
+    pull leaves the existing table / folder untouched and keeps the records
+    loaded so far for the next attempt or run. restart=True discards what an
+    earlier run kept, once, before the first attempt.
+    """
+    stats = TransferStats()
+    con = None
+    # Always resumable, so retries in this run carry on from this run's progress
+    if parquet_dir:
+        sink = ParquetSink(Path(parquet_dir), resume=True)
+        target = parquet_dir
+    else:
+        con = duckdb.connect(db_path or DATABASE_FILE)
+        sink = DuckDBSink(con, table, resume=True)
+        target = f"{table} in {db_path or DATABASE_FILE}"
+    if restart:
+        sink.reset()
+    if sink.rows:
+        print(f"↪ {sink.rows:,} records already loaded by an earlier attempt")
+
+    def resume_headers() -> Dict[str, str]:
+        checkpoint = sink.checkpoint or {}
+        return _range_headers(checkpoint.get("offset"), checkpoint.get("validator"))
+
+    def ingest(response: requests.Response):
+        checkpoint = sink.checkpoint or {}
+        resumed = response.status_code == 206
+        validator = _validator(response)
+        if not resumed and sink.rows and checkpoint.get("validator") and checkpoint["validator"] != validator:
+            print("Extract changed since the records already loaded — starting over.")
+            sink.reset()
+        offset = checkpoint["offset"] if resumed else 0
+        ranges = _accepts_ranges(response)
+        stats.begin_attempt(response, offset)
+
+        stream = JsonRecordStream(
+            decode_chunks(response.iter_content(chunk_size=chunk_size), stats.on_bytes, response.encoding or "utf-8"),
+            encoding=response.encoding or "utf-8",
+            start_offset=offset,
+            resume=resumed,
+            in_object=resumed and checkpoint.get("in_object", False),
+        )
+        # Re-sent in full: skip the records loaded before the cut
+        skip = 0 if resumed else sink.rows
+        if skip:
+            print(f"↪ Skipping {skip:,} records already loaded")
+        records = islice(stream, skip, None)
+
+        def save_checkpoint() -> Dict:
+            return {"offset": stream.offset if ranges else None, "validator": validator, "in_object": stream.in_object}
+
+        def on_batch(rows: int):
+            print(f"  Loaded: {rows:,} records — {stats.progress()}")
+
+        rows = ingest_records(records, sink, batch_records, on_batch, save_checkpoint)
+        print(f"✅ Loaded {rows:,} records into {target}")
+
+    try:
+        success = _fetch_with_retries(endpoint_url, ingest, headers, params, max_retries, timeout, resume_headers)
+    finally:
+        if con is not None:
+            con.close()
+    print(f"📊 {stats.summary()}")
+    if not success and sink.rows:
+        print(f"Progress kept: {sink.rows:,} records — the next run resumes from there.")
+    return success
+
+
+def fetch_and_ingest_partitioned(
+    endpoint_url: str,
+    partitions: List[Dict],
+    db_path: Optional[str] = None,
+    table: str = POS_TABLE,
+    parquet_dir: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    workers: int = DEFAULT_WORKERS,
+    chunk_size: int = 64 * 1024,
+    batch_records: int = BATCH_RECORDS,
+    max_retries: int = 3,
+    timeout: int = 300,
+    restart: bool = False
+):
+    """
+    Fetch the extract as `partitions` (see partitioned_fetch) on `workers`
+    concurrent requests, spool each to Parquet, and merge them, in partition
+    order, into `table` in db_path (or the folder parquet_dir) in one swap.
+    """
+    target_path = Path(parquet_dir) if parquet_dir else Path(db_path or DATABASE_FILE).with_name(table)
+    spool_root = target_path.with_name(target_path.name + ".partitions")
+    spool = spool_root / plan_key(endpoint_url, params, partitions)
+    if restart:
+        shutil.rmtree(spool, ignore_errors=True)
+    folders = {p["name"]: spool / f"{i:04d}" for i, p in enumerate(partitions)}
+    session = make_session(workers, headers)
+    started = time.perf_counter()
+    received = []
+
+    def fetch(partition: Dict) -> Path:
+        folder = folders[partition["name"]]
+        if folder.exists():
+            return folder  # fetched by an earlier run of this plan
+        response = get_partition(session, endpoint_url, params, partition, timeout=timeout)
+        stats = TransferStats()
+        stats.begin_attempt(response)
+        encoding = response.encoding or "utf-8"
+        records = JsonRecordStream(
+            decode_chunks(response.iter_content(chunk_size=chunk_size), stats.on_bytes, encoding), encoding=encoding
+        )
+        rows = ingest_records(records, ParquetSink(folder), batch_records)
+        received.append(stats.received)
+        print(f"  {partition['name']}: {rows:,} records, {_format_bytes(stats.received)} at {_format_bytes(stats.rate())}/s")
+        return folder
+
+    try:
+        _, failures = fetch_partitions(partitions, fetch, workers, max_retries)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    total = sum(received)
+    print(f"📊 {_format_bytes(total)} received in {elapsed:.1f}s "
+          f"({_format_bytes(total / elapsed if elapsed > 0 else 0)}/s over {workers} worker(s))")
+    if failures:
+        print(f"❌ {len(failures)} partition(s) failed — the next run fetches only those:")
+        for name, error in failures.items():
+            print(f"   {name}: {error}")
+        return False
+
+    parts = [part for p in partitions for part in sorted(folders[p["name"]].glob("part-*.parquet"))]
+    if parquet_dir:
+        publish_parquet_parts(parts, Path(parquet_dir))
+        print(f"✅ Merged {len(partitions)} partition(s) into {parquet_dir}")
+    else:
+        con = duckdb.connect(db_path or DATABASE_FILE)
+        try:
+            rows = load_parquet_parts(con, table, parts)
+        finally:
+            con.close()
+        print(f"✅ Loaded {rows:,} records from {len(partitions)} partition(s) into {table} in {db_path or DATABASE_FILE}")
+    shutil.rmtree(spool_root, ignore_errors=True)
+    return True
+
+
 def get_file_size(file_path: str) -> str:
     """Get human-readable file size."""
     try:
-        size = os.path.getsize(file_path)
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024.0:
-                return f"{size:.1f} {unit}"
-            size /= 1024.0
-        return f"{size:.1f} TB"
+        return _format_bytes(os.path.getsize(file_path))
     except:
         return "Unknown"
 
@@ -102,13 +493,60 @@ def main():
         "Passcode": "258a1a49-a5b4-48fd-bf65-b549ea36143a",             # fill in
     }
 
+    parser = argparse.ArgumentParser(description="Fetch the POS extract.")
+    parser.add_argument("--mode", choices=MODES, default="file")
+    parser.add_argument("--db", default=DATABASE_FILE)
+    parser.add_argument("--table", default=POS_TABLE)
+    parser.add_argument("--parquet-dir", default=PARQUET_DIR)
+    parser.add_argument("--restart", action="store_true", help="discard progress kept from an interrupted pull")
+    parser.add_argument("--from", dest="date_from", help="partitioned pull: first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="partitioned pull: last day (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=7, help="partitioned pull: days per partition")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="partitioned pull: concurrent requests")
+    args = parser.parse_args()
+
+    partitions = None
+    if args.date_from or args.date_to:
+        if not (args.date_from and args.date_to):
+            parser.error("--from and --to go together")
+        if args.mode == "file":
+            parser.error("partitioned pulls need --mode duckdb or parquet")
+        partitions = plan_partitions({
+            "by": "date", "start": args.date_from, "end": args.date_to, "days": args.days,
+            "start_param": POS_DATE_PARAMS[0], "end_param": POS_DATE_PARAMS[1],
+        })
+
     print("Starting data fetch...")
-    success = fetch_and_save_data(
-        endpoint_url=ENDPOINT_URL,
-        output_file=OUTPUT_FILE,
-        headers=HEADERS,
-        params=PARAMS
-    )
+    if partitions:
+        success = fetch_and_ingest_partitioned(
+            endpoint_url=ENDPOINT_URL,
+            partitions=partitions,
+            db_path=args.db,
+            table=args.table,
+            parquet_dir=args.parquet_dir if args.mode == "parquet" else None,
+            headers=HEADERS,
+            params=PARAMS,
+            workers=args.workers,
+            restart=args.restart
+        )
+    elif args.mode == "file":
+        success = fetch_and_save_data(
+            endpoint_url=ENDPOINT_URL,
+            output_file=OUTPUT_FILE,
+            headers=HEADERS,
+            params=PARAMS,
+            restart=args.restart
+        )
+    else:
+        success = fetch_and_ingest(
+            endpoint_url=ENDPOINT_URL,
+            db_path=args.db,
+            table=args.table,
+            parquet_dir=args.parquet_dir if args.mode == "parquet" else None,
+            headers=HEADERS,
+            params=PARAMS,
+            restart=args.restart
+        )
 
     if success:
         print("Script completed successfully!")
@@ -2,6 +2,7 @@
 #remaining possible issue with templates where the data_range (and file_count) is 0, which causes the contractor values script to skip those files entirely instead of populating with blanks. Will need to confirm if this is actually an issue based on the real files we see in the folder.
 
 import os
+import sys
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Any
@@ -12,21 +13,10 @@ import warnings
 
 warnings.filterwarnings('ignore')
 
-
-# -----------------------------
-# Monkey-patch: silence invalid font family values (e.g. 34) in openpyxl - this fixes the issue with Template files
-# -----------------------------
-from openpyxl.descriptors.base import Min
-
-_original_min_set = Min.__set__
-
-def _patched_min_set(self, instance, value):
-    try:
-        _original_min_set(self, instance, value)
-    except ValueError:
-        pass
-
-Min.__set__ = _patched_min_set
+# Workbooks are read through the shared values-only reader, which also
+# tolerates invalid font family values (e.g. 34) in Template files.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from workbook_reader import open_workbook
 
 
 # -----------------------------
@@ -188,8 +178,11 @@ class ExcelStructureAnalyzer:
                 best_row, best_score = i, score
         return best_row if best_score > 0.3 else None
 
-    def get_data_range_info(self, file_path: str, sheet_name: str) -> Dict[str, Any]:
-        df_raw = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+    def get_data_range_info(self, wb, sheet_name: str) -> Dict[str, Any]:
+        df_raw = pd.DataFrame(list(wb.rows(sheet_name)))
+        if df_raw.empty:
+            return {'headers': [], 'data_range': '', 'header_range': '', 'use_header': False,
+                    'rows_count': 0, 'field_mappings': {}}
         header_row = self.find_header_row(df_raw)
         headers = df_raw.iloc[header_row].fillna('').astype(str).str.strip().tolist() if header_row is not None else []
         field_mappings = self.get_field_mappings(headers) if headers else {}
@@ -233,28 +226,28 @@ class ExcelStructureAnalyzer:
         }
 
     def analyze_file(self, file_path: str) -> List[Dict[str, Any]]:
-        xl = pd.ExcelFile(file_path)
         results = []
-        for sheet in xl.sheet_names:
-            info = self.get_data_range_info(str(file_path), sheet)
-            results.append({
-                'payment_run': 'YYYYMMDD',
-                'file_name': Path(file_path).name,
-                'sheet_name': sheet,
-                'structure_type': 'unspecified',
-                'headers': info['headers'] if isinstance(info['headers'], str) else '|'.join(info['headers']),
-                'data_range': info.get('data_range', ''),
-                'header_range': info.get('header_range', ''),
-                'use_header': info.get('use_header', 'FALSE'),
-                'rows_count': info.get('rows_count', 0),
-                'process': 'TRUE',
-                'submitted_by': '',
-                'contractor_vendor_number': '',
-                'contractor_name': None,
-                'wholesaler_vendor_number': '',
-                'wholesaler_name': '',
-                **info.get('field_mappings', {})
-            })
+        with open_workbook(file_path) as wb:
+            for sheet in wb.sheet_names:
+                info = self.get_data_range_info(wb, sheet)
+                results.append({
+                    'payment_run': 'YYYYMMDD',
+                    'file_name': Path(file_path).name,
+                    'sheet_name': sheet,
+                    'structure_type': 'unspecified',
+                    'headers': info['headers'] if isinstance(info['headers'], str) else '|'.join(info['headers']),
+                    'data_range': info.get('data_range', ''),
+                    'header_range': info.get('header_range', ''),
+                    'use_header': info.get('use_header', 'FALSE'),
+                    'rows_count': info.get('rows_count', 0),
+                    'process': 'TRUE',
+                    'submitted_by': '',
+                    'contractor_vendor_number': '',
+                    'contractor_name': None,
+                    'wholesaler_vendor_number': '',
+                    'wholesaler_name': '',
+                    **info.get('field_mappings', {})
+                })
         return results
 
 
@@ -4,9 +4,10 @@ Google Drive Scanner → Customer Name Mapping
 Scans a Google Drive folder (and all subfolders) for Google Sheets whose name
 contains a configurable keyword. From each matching sheet's "info" tab it
 extracts the mapping columns needed to later locate the "customer_name" column
-in the corresponding Excel files:
+(and the other profiled fields) in the corresponding Excel files:
 
     file_name | sheet_name | customer_name | header_range | data_range | static_value
+              | vendor | uom | item_sku_category
 
 If the value in the "customer_name" column is wrapped in $$ (e.g. $$Acme Corp$$),
 the literal text between the markers is written directly into the "static_value"
@@ -51,6 +52,10 @@ SEARCH_KEYWORD = "contractor_credit_unspecified"
 # Tab name written in the output sheet (created if it doesn't exist).
 OUTPUT_TAB_NAME = "credit_CustomerNameMapping"
 
+# Additional mapped columns carried through for value profiling. Their raw
+# identifiers (column letter, header text or $$literal$$) are copied as-is.
+EXTRA_FIELDS = ["vendor", "uom", "item_sku_category"]
+
 # ─────────────────────────────────────────────
 
 BASE_DIR = Path(__file__).parent
@@ -172,14 +177,16 @@ def extract_static_value(raw: str) -> str | None:
 def extract_customer_name_mapping(gc: gspread.Client, file: dict) -> list[list]:
     """
     Open the Google Sheet and pull mapping rows from its 'info' tab.
-    Only rows that have a value in the 'customer_name' column are kept.
+    Only rows that have a value in the 'customer_name' column or in one of
+    EXTRA_FIELDS are kept.
 
     If the customer_name value is wrapped in $$ (e.g. $$Acme Corp$$), the
     unwrapped text is stored in the 'static_value' column and the
     'customer_name' column is left empty — no Excel lookup will be needed.
 
     Returns a list of rows:
-        [source_file, file_name, sheet_name, customer_name, header_range, data_range, static_value]
+        [source_file, file_name, sheet_name, customer_name, header_range, data_range, static_value,
+         *EXTRA_FIELDS]
     """
     rows = []
     try:
@@ -200,9 +207,16 @@ def extract_customer_name_mapping(gc: gspread.Client, file: dict) -> list[list]:
             record_lower = {k.lower().strip(): v for k, v in record.items()}
 
             customer_name_raw = str(record_lower.get("customer_name", "")).strip()
+            if customer_name_raw.upper() == "NULL":
+                customer_name_raw = ""
+
+            extra_vals = []
+            for field in EXTRA_FIELDS:
+                raw = str(record_lower.get(field, "")).strip()
+                extra_vals.append("" if raw.upper() == "NULL" else raw)
 
-            # Skip rows that have no customer_name mapping at all
-            if not customer_name_raw:
+            # Skip rows that have no profiled field mapping at all
+            if not customer_name_raw and not any(extra_vals):
                 continue
 
             file_name_val    = str(record_lower.get("file_name", "")).strip()
@@ -228,6 +242,7 @@ def extract_customer_name_mapping(gc: gspread.Client, file: dict) -> list[list]:
                 header_range_val,   # e.g. "A1:Z1"
                 data_range_val,     # e.g. "A2:Z1000"
                 static_val,         # literal value (empty when Excel lookup is needed)
+                *extra_vals,        # vendor / uom / item_sku_category identifiers
             ]
             rows.append(row)
 
@@ -251,9 +266,10 @@ def write_mapping_to_sheet(gc: gspread.Client, all_rows: list[list]):
         ws = spreadsheet.worksheet(OUTPUT_TAB_NAME)
         ws.clear()
     except gspread.exceptions.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title=OUTPUT_TAB_NAME, rows=1, cols=7)
+        ws = spreadsheet.add_worksheet(title=OUTPUT_TAB_NAME, rows=1, cols=7 + len(EXTRA_FIELDS))
 
-    header = ["source_file", "file_name", "sheet_name", "customer_name", "header_range", "data_range", "static_value"]
+    header = ["source_file", "file_name", "sheet_name", "customer_name", "header_range", "data_range", "static_value",
+              *EXTRA_FIELDS]
     ws.update([header] + all_rows)
     print(f"✓ Wrote {len(all_rows)} mapping row(s) to '{OUTPUT_TAB_NAME}' tab.")
 
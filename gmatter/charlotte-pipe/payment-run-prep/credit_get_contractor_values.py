@@ -9,7 +9,12 @@ Reads the customer_name mapping produced by get_customer_name_mapping.py
   • Opens the matching local Excel file, finds the customer_name column,
     and collects every unique value found there.
 
-Results are written to a tab called "CustomerValues" in the output sheet.
+Every mapped field (customer_name, vendor, uom, item_sku_category) is
+profiled at the same time: each workbook is opened once and each sheet is
+streamed once, collecting distinct values with counts for all of its fields.
+
+Results are written to a tab called "CustomerValues" in the output sheet, and
+the per-field value counts to a "FieldValues" tab.
 
 Requirements:
     pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib gspread openpyxl
@@ -40,6 +45,18 @@ INPUT_TAB_NAME  = "credit_CustomerNameMapping"
 # Google Sheet where extracted customer values will be written.
 OUTPUT_SHEET_ID = "1LUKPMtd41o-0uvMXb6rk_tY1HIqcme3zkAAaMh2yF-Y"
 OUTPUT_TAB_NAME = "credit_CustomerValues"
+FIELD_VALUES_TAB_NAME = "credit_FieldValues"
+
+# Mapped fields profiled from each sheet.
+PROFILE_FIELDS = ["customer_name", "vendor", "uom", "item_sku_category"]
+
+# Fields counted exactly no matter how many distinct values they have.
+# customer_name feeds contractor matching, so no name may be dropped.
+EXACT_FIELDS = {"customer_name"}
+
+# Distinct values tracked per (file, sheet, field) for the other fields
+# before the counter switches to heavy-hitter mode.
+PROFILE_CAPACITY = 2000
 
 # ─────────────────────────────────────────────
 
@@ -131,70 +148,123 @@ def find_col_index(ws, col_identifier: str, header_range: str) -> int | None:
     return None
 
 
-# ── Excel extraction ──────────────────────────────────────────────────────────
+# ── Value profiling ───────────────────────────────────────────────────────────
 
-def get_unique_customer_names(
-    file_path: Path,
-    sheet_name: str,
-    customer_name_col: str,
-    header_range: str,
-    data_range: str,
-) -> list[str]:
+class ValueCounter:
     """
-    Open an Excel file and return a deduplicated list of non-empty customer_name
-    values found in the specified column / data range.
+    Distinct-value counter with an optional memory bound.
+
+    With capacity=None every value is counted exactly. Otherwise at most
+    `capacity` values are tracked (Misra-Gries heavy hitters): when a new
+    value arrives and the table is full, every count is decremented and
+    zero counts are dropped. Frequent values survive, and each reported
+    count under-estimates the true count by at most total / capacity.
     """
-    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
 
-    if sheet_name not in wb.sheetnames:
-        print(f"  ⚠  Sheet '{sheet_name}' not found in '{file_path.name}'. "
-              f"Available: {wb.sheetnames}")
-        wb.close()
-        return []
+    def __init__(self, capacity: int | None = None):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.total = 0
+        self.approximate = False
+
+    def add(self, value: str):
+        self.total += 1
+        if value in self.counts:
+            self.counts[value] += 1
+        elif self.capacity is None or len(self.counts) < self.capacity:
+            self.counts[value] = 1
+        else:
+            self.approximate = True
+            self.counts = {v: c - 1 for v, c in self.counts.items() if c > 1}
 
-    ws = wb[sheet_name]
-    print(f"    Opened sheet: '{sheet_name}'")
-    print(f"    customer_name col: '{customer_name_col}'")
-    print(f"    header_range: '{header_range}', data_range: '{data_range}'")
+    def items(self) -> list[tuple[str, int]]:
+        """(value, count) pairs in first-seen order."""
+        return list(self.counts.items())
 
-    col_idx = find_col_index(ws, customer_name_col, header_range)
-    if col_idx is None:
-        print(f"  ⚠  Could not locate customer_name column '{customer_name_col}', skipping file.")
-        wb.close()
-        return []
 
-    parsed_data = parse_range(data_range)
-    if not parsed_data:
-        print(f"  ⚠  Could not parse data_range '{data_range}'.")
-        wb.close()
-        return []
+def static_field_value(raw: str) -> str | None:
+    """Return the text inside a $$literal$$ identifier, or None."""
+    match = re.fullmatch(r"\$\$(.+?)\$\$", raw.strip())
+    return match.group(1).strip() if match else None
 
-    d_start_row, d_end_row, _d_start_col, _d_end_col = parsed_data
 
-    seen: set[str] = set()
-    unique_values: list[str] = []
+def profile_sheet(ws, tasks: list[dict]) -> dict[str, ValueCounter]:
+    """
+    Profile every task for one worksheet in a single pass over its rows.
 
-    for row in ws.iter_rows(
-        min_row=d_start_row, max_row=d_end_row,
-        min_col=col_idx, max_col=col_idx,
-        values_only=True,
+    Each task is {field, column, header_range, data_range}. Returns
+    {field: ValueCounter}; tasks whose column or range cannot be resolved
+    are reported and skipped.
+    """
+    resolved = []
+    for task in tasks:
+        col_idx = find_col_index(ws, task["column"], task["header_range"])
+        if col_idx is None:
+            print(f"  ⚠  Could not locate {task['field']} column '{task['column']}', skipping.")
+            continue
+        parsed_data = parse_range(task["data_range"])
+        if not parsed_data:
+            print(f"  ⚠  Could not parse data_range '{task['data_range']}' for {task['field']}.")
+            continue
+        d_start_row, d_end_row, _d_start_col, _d_end_col = parsed_data
+        resolved.append((task["field"], col_idx, d_start_row, d_end_row, clean_col_name(task["column"])))
+
+    counters: dict[str, ValueCounter] = {}
+    if not resolved:
+        return counters
+
+    for field, *_ in resolved:
+        if field not in counters:
+            counters[field] = ValueCounter(None if field in EXACT_FIELDS else PROFILE_CAPACITY)
+
+    min_row = min(r[2] for r in resolved)
+    max_row = max(r[3] for r in resolved)
+    max_col = max(r[1] for r in resolved)
+
+    for row_num, row in enumerate(
+        ws.iter_rows(min_row=min_row, max_row=max_row, min_col=1, max_col=max_col, values_only=True),
+        start=min_row,
     ):
-        cell_val = row[0]
-        val_str = str(cell_val).strip() if cell_val is not None else ""
+        for field, col_idx, d_start_row, d_end_row, header_name in resolved:
+            if row_num < d_start_row or row_num > d_end_row or col_idx > len(row):
+                continue
+            cell_val = row[col_idx - 1]
+            val_str = str(cell_val).strip() if cell_val is not None else ""
 
-        if not val_str:
-            continue
+            if not val_str:
+                continue
 
-        # Skip any header row that leaked into the data range
-        if val_str == clean_col_name(customer_name_col):
-            continue
+            # Skip any header row that leaked into the data range
+            if val_str == header_name:
+                continue
+
+            counters[field].add(val_str)
+
+    return counters
+
+
+def profile_workbook(file_path: Path, sheet_tasks: dict[str, list[dict]]) -> dict[str, dict[str, ValueCounter]]:
+    """
+    Open an Excel file once and profile every queued sheet.
+    Returns {sheet_name: {field: ValueCounter}}.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    results: dict[str, dict[str, ValueCounter]] = {}
 
-        if val_str not in seen:
-            seen.add(val_str)
-            unique_values.append(val_str)
+    try:
+        for sheet_name, tasks in sheet_tasks.items():
+            if sheet_name not in wb.sheetnames:
+                print(f"  ⚠  Sheet '{sheet_name}' not found in '{file_path.name}'. "
+                      f"Available: {wb.sheetnames}")
+                continue
+
+            columns = ", ".join(f"{t['field']}='{t['column']}'" for t in tasks)
+            print(f"    Opened sheet: '{sheet_name}' ({columns})")
+            results[sheet_name] = profile_sheet(wb[sheet_name], tasks)
+    finally:
+        wb.close()
 
-    wb.close()
-    return unique_values
+    return results
 
 
 # ── Sheet I/O ─────────────────────────────────────────────────────────────────
@@ -223,6 +293,21 @@ def write_customer_values(gc: gspread.Client, all_rows: list[list]):
     print(f"✓ Wrote {len(all_rows)} customer value row(s) to '{OUTPUT_TAB_NAME}' tab.")
 
 
+def write_field_values(gc: gspread.Client, all_rows: list[list]):
+    """Write per-field value counts to FIELD_VALUES_TAB_NAME in OUTPUT_SHEET_ID."""
+    spreadsheet = gc.open_by_key(OUTPUT_SHEET_ID)
+
+    try:
+        ws = spreadsheet.worksheet(FIELD_VALUES_TAB_NAME)
+        ws.clear()
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=FIELD_VALUES_TAB_NAME, rows=1, cols=6)
+
+    header = ["file_name", "sheet_name", "field", "value", "count", "approximate"]
+    ws.update([header] + all_rows)
+    print(f"✓ Wrote {len(all_rows)} field value row(s) to '{FIELD_VALUES_TAB_NAME}' tab.")
+
+
 # ── Main ──────────────────────────────────────────────────────────────────────
 
 def main():
@@ -233,55 +318,72 @@ def main():
     # 1. Read the mapping sheet
     mapping_rows = read_mapping_sheet(gc)
 
-    # 2. Split rows into static (no Excel needed) and lookup (Excel required).
-    #    Deduplicate lookup tasks by (file, sheet, column) combo.
-    all_output_rows: list[list] = []
+    # 2. Split fields into static (no Excel needed) and lookup (Excel required).
+    #    Lookup tasks are deduplicated by (file, sheet, field, column) and
+    #    grouped by workbook, then by sheet, so each file is opened once.
+    customer_rows: list[list] = []
+    field_rows: list[list] = []
     seen_combos: set[tuple] = set()
-    lookup_tasks: list[tuple] = []
+    workbook_tasks: dict[str, dict[str, list[dict]]] = {}
+    task_count = 0
 
     for i, row in enumerate(mapping_rows, start=1):
         file_name         = str(row.get("file_name", "")).strip()
         sheet_name        = str(row.get("sheet_name", "")).strip()
-        customer_name_col = str(row.get("customer_name", "")).strip()
         header_range      = str(row.get("header_range", "")).strip()
         data_range        = str(row.get("data_range", "")).strip()
         static_value      = str(row.get("static_value", "")).strip()
 
         print(f"  Row {i}: file='{file_name}' sheet='{sheet_name}' "
-              f"customer_name='{customer_name_col}' static_value='{static_value}'")
+              f"customer_name='{row.get('customer_name', '')}' static_value='{static_value}'")
 
         if not file_name:
             print(f"    -> Skipped: no file_name")
             continue
 
-        # ── Static value: no Excel lookup needed ──────────────────────────────
-        if static_value:
-            print(f"    -> Static value: '{static_value}'")
-            all_output_rows.append([file_name, static_value])
-            continue
-
-        # ── Excel lookup ──────────────────────────────────────────────────────
-        if not customer_name_col:
-            print(f"    -> Skipped: customer_name column identifier is blank (and no static_value)")
-            continue
+        for field in PROFILE_FIELDS:
+            column = str(row.get(field, "")).strip()
+            field_static = static_value if field == "customer_name" else static_field_value(column)
+
+            # ── Static value: no Excel lookup needed ──────────────────────────
+            if field_static:
+                print(f"    -> {field}: static value '{field_static}'")
+                if field == "customer_name":
+                    customer_rows.append([file_name, field_static])
+                field_rows.append([file_name, sheet_name, field, field_static, "", "FALSE"])
+                continue
+
+            # ── Excel lookup ──────────────────────────────────────────────────
+            if not column or column.upper() == "NULL":
+                if field == "customer_name":
+                    print(f"    -> {field}: skipped, column identifier is blank (and no static_value)")
+                continue
+
+            if not sheet_name:
+                print(f"    -> {field}: skipped, sheet_name is blank")
+                continue
+
+            combo = (file_name, sheet_name, field, column)
+            if combo in seen_combos:
+                print(f"    -> {field}: duplicate combo, skipped")
+                continue
 
-        if not sheet_name:
-            print(f"    -> Skipped: sheet_name is blank")
-            continue
-
-        combo = (file_name, sheet_name, customer_name_col)
-        if combo not in seen_combos:
             seen_combos.add(combo)
-            lookup_tasks.append((file_name, sheet_name, customer_name_col, header_range, data_range))
-            print(f"    -> Queued for Excel lookup")
-        else:
-            print(f"    -> Duplicate combo, skipped")
-
-    print(f"\n{len(all_output_rows)} static value row(s) collected.")
-    print(f"Processing {len(lookup_tasks)} unique Excel lookup task(s).\n")
-
-    # 3. Extract unique customer_name values from each Excel file
-    for file_name, sheet_name, customer_name_col, header_range, data_range in lookup_tasks:
+            workbook_tasks.setdefault(file_name, {}).setdefault(sheet_name, []).append({
+                "field": field,
+                "column": column,
+                "header_range": header_range,
+                "data_range": data_range,
+            })
+            task_count += 1
+            print(f"    -> {field}: queued for Excel lookup")
+
+    print(f"\n{len(customer_rows)} static customer value row(s) collected.")
+    print(f"Processing {task_count} unique Excel lookup task(s) "
+          f"across {len(workbook_tasks)} workbook(s).\n")
+
+    # 3. Profile every queued field, one pass per workbook sheet
+    for file_name, sheet_tasks in workbook_tasks.items():
         file_path = excel_folder / file_name
 
         if not file_path.exists():
@@ -289,20 +391,37 @@ def main():
             continue
 
         print(f"  Reading: {file_name}")
-        values = get_unique_customer_names(
-            file_path, sheet_name, customer_name_col, header_range, data_range
-        )
-        print(f"    → {len(values)} unique customer name(s) found")
+        try:
+            profiles = profile_workbook(file_path, sheet_tasks)
+        except Exception as e:
+            print(f"  ⚠  Could not read '{file_name}': {e}")
+            continue
 
-        for val in values:
-            all_output_rows.append([file_name, val])
+        for sheet_name, counters in profiles.items():
+            for field, counter in counters.items():
+                values = counter.items()
+                note = " (approximate)" if counter.approximate else ""
+                print(f"    → {sheet_name} / {field}: {len(values)} unique value(s){note}")
+
+                for val, count in values:
+                    if field == "customer_name":
+                        customer_rows.append([file_name, val])
+                    field_rows.append([
+                        file_name, sheet_name, field, val, count,
+                        "TRUE" if counter.approximate else "FALSE",
+                    ])
 
     # 4. Write everything to the output sheet
-    if all_output_rows:
-        write_customer_values(gc, all_output_rows)
+    if customer_rows:
+        write_customer_values(gc, customer_rows)
     else:
         print("No customer name values found to write.")
 
+    if field_rows:
+        write_field_values(gc, field_rows)
+    else:
+        print("No field values found to write.")
+
 
 if __name__ == "__main__":
     main()
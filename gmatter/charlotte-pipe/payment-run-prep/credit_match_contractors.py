@@ -0,0 +1,366 @@
+"""
+Customer Values → Contractor Matches
+-------------------------------------
+Reads the customer names produced by credit_get_contractor_values.py (the
+"CustomerValues" tab) and resolves each one to a known contractor.
+
+Names are normalised (case, punctuation, "&", legal suffixes such as INC /
+LLC / CO), then matched in this order:
+
+  1. Confirmed matches from earlier payment runs (instant cache hit).
+  2. Exact match on the normalised contractor name.
+  3. Fuzzy match, scored only against contractors that share a blocking key
+     (Soundex code or leading trigram of a significant token) — a new name is
+     never compared against every known contractor.
+
+The contractor list, blocking keys and confirmed matches are persisted in a
+small local SQLite index next to this script. To confirm a match, set the
+"confirmed" column to TRUE in the output tab (correcting contractor_name if
+needed); the next run stores it and resolves that name instantly from then on.
+
+Requirements:
+    pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib gspread
+"""
+
+import difflib
+import pickle
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import gspread
+from google.auth.transport.requests import Request
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+# ─────────────────────────────────────────────
+#  CONFIGURATION  ← edit these values
+# ─────────────────────────────────────────────
+
+# Google Sheet that holds the CustomerValues tab and the contractor master list.
+INPUT_SHEET_ID       = "1LUKPMtd41o-0uvMXb6rk_tY1HIqcme3zkAAaMh2yF-Y"
+CUSTOMER_TAB_NAME    = "credit_CustomerValues"
+CONTRACTOR_TAB_NAME  = "credit_Contractors"     # needs a "contractor_name" column
+
+# Google Sheet where match results will be written (and confirmations read back).
+OUTPUT_SHEET_ID = "1LUKPMtd41o-0uvMXb6rk_tY1HIqcme3zkAAaMh2yF-Y"
+OUTPUT_TAB_NAME = "credit_CustomerMatches"
+
+# Scores at or above AUTO_MATCH_SCORE are reported as "fuzzy"; between
+# REVIEW_SCORE and AUTO_MATCH_SCORE as "review". Anything lower is unmatched.
+AUTO_MATCH_SCORE = 0.90
+REVIEW_SCORE     = 0.70
+
+# Blocking keys shared by more contractors than this are too generic to
+# narrow the search and are ignored at lookup time.
+MAX_BLOCK_SIZE = 200
+
+# ─────────────────────────────────────────────
+
+BASE_DIR = Path(__file__).parent
+MATCH_INDEX_PATH = BASE_DIR / "contractor_match_index.sqlite"
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# Legal / filler tokens dropped during normalisation.
+LEGAL_SUFFIXES = {
+    "INC", "INCORPORATED", "LLC", "LLP", "LP", "LTD", "LIMITED", "CO", "COMPANY",
+    "CORP", "CORPORATION", "PC", "PLLC", "THE",
+}
+
+# Trade words that appear in most contractor names. They still count toward
+# the similarity score but never produce a blocking key.
+GENERIC_TOKENS = {
+    "AND", "OF", "PLUMBING", "MECHANICAL", "HEATING", "COOLING", "AIR",
+    "SERVICE", "SERVICES", "CONTRACTING", "CONTRACTORS", "CONTRACTOR",
+    "CONSTRUCTION", "ENTERPRISES", "GROUP", "SUPPLY", "UTILITIES", "HVAC",
+}
+
+
+# ── Auth ──────────────────────────────────────────────────────────────────────
+
+def get_credentials():
+    """Return valid OAuth credentials, refreshing or re-authorising as needed."""
+    creds = None
+    token_path = BASE_DIR / "token.pkl"
+    creds_path = BASE_DIR / "credentials.json"
+
+    if token_path.exists():
+        with open(token_path, "rb") as f:
+            creds = pickle.load(f)
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(str(creds_path), SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(token_path, "wb") as f:
+            pickle.dump(creds, f)
+
+    return creds
+
+
+# ── Normalisation / blocking ──────────────────────────────────────────────────
+
+def normalize_name(name: str) -> str:
+    """
+    Canonical form used for exact matching and scoring, e.g.
+    'Acme Plumbing, Inc.' and 'ACME PLUMBING INC' both become 'ACME PLUMBING'.
+    """
+    text = str(name or "").upper().replace("&", " AND ")
+    text = re.sub(r"[^A-Z0-9 ]+", " ", text.replace(".", ""))
+    tokens = [t for t in text.split() if t not in LEGAL_SUFFIXES]
+    return " ".join(tokens)
+
+
+def soundex(token: str) -> str:
+    """American Soundex code for a single alphabetic token (e.g. 'ROBERT' → 'R163')."""
+    codes = {
+        **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"),
+        **dict.fromkeys("DT", "3"), "L": "4", **dict.fromkeys("MN", "5"), "R": "6",
+    }
+    token = "".join(c for c in token.upper() if c.isalpha())
+    if not token:
+        return ""
+    out = token[0]
+    prev = codes.get(token[0], "")
+    for c in token[1:]:
+        code = codes.get(c, "")
+        if code and code != prev:
+            out += code
+        if c not in "HW":
+            prev = code
+    return (out + "000")[:4]
+
+
+def blocking_keys(normalized: str) -> set[str]:
+    """Phonetic and prefix keys for every significant token of a normalised name."""
+    keys = set()
+    for token in normalized.split():
+        if token in GENERIC_TOKENS or len(token) < 3:
+            continue
+        if token.isalpha():
+            keys.add(f"S:{soundex(token)}")
+        keys.add(f"P:{token[:3]}")
+    if not keys and normalized:
+        # Names made only of generic words still need somewhere to live.
+        keys.add(f"N:{normalized}")
+    return keys
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Blend of character-trigram Jaccard and difflib ratio on normalised names."""
+    if not a or not b:
+        return 0.0
+    ta, tb = trigrams(a), trigrams(b)
+    jaccard = len(ta & tb) / len(ta | tb)
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    return round((jaccard + ratio) / 2, 4)
+
+
+# ── Match index ───────────────────────────────────────────────────────────────
+
+class MatchIndex:
+    """
+    Persistent contractor index:
+
+      contractors        — known contractor names and their normalised form
+      block_keys         — blocking key → contractor (indexed by key)
+      confirmed_matches  — normalised customer name → confirmed contractor
+    """
+
+    def __init__(self, path: Path = MATCH_INDEX_PATH):
+        self.con = sqlite3.connect(str(path))
+        self.con.executescript("""
+            CREATE TABLE IF NOT EXISTS contractors (
+                contractor_id   INTEGER PRIMARY KEY,
+                contractor_name TEXT UNIQUE NOT NULL,
+                normalized      TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_contractors_normalized ON contractors(normalized);
+            CREATE TABLE IF NOT EXISTS block_keys (
+                key             TEXT NOT NULL,
+                contractor_id   INTEGER NOT NULL,
+                PRIMARY KEY (key, contractor_id)
+            );
+            CREATE TABLE IF NOT EXISTS confirmed_matches (
+                normalized      TEXT PRIMARY KEY,
+                contractor_name TEXT NOT NULL,
+                confirmed_at    TEXT NOT NULL
+            );
+        """)
+
+    def close(self):
+        self.con.close()
+
+    def add_contractors(self, names: list[str]) -> int:
+        """Insert contractors not already indexed. Returns the number added."""
+        added = 0
+        with self.con:
+            for name in names:
+                name = str(name).strip()
+                normalized = normalize_name(name)
+                if not normalized:
+                    continue
+                cur = self.con.execute(
+                    "INSERT OR IGNORE INTO contractors (contractor_name, normalized) VALUES (?, ?)",
+                    (name, normalized),
+                )
+                if not cur.rowcount:
+                    continue
+                added += 1
+                self.con.executemany(
+                    "INSERT OR IGNORE INTO block_keys (key, contractor_id) VALUES (?, ?)",
+                    [(key, cur.lastrowid) for key in blocking_keys(normalized)],
+                )
+        return added
+
+    def confirm(self, customer_name: str, contractor_name: str):
+        with self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO confirmed_matches VALUES (?, ?, ?)",
+                (normalize_name(customer_name), contractor_name.strip(), datetime.now().isoformat()),
+            )
+
+    def resolve(self, customer_name: str) -> tuple[str, float, str]:
+        """
+        Return (contractor_name, score, method) for one customer name.
+        method is one of: confirmed, exact, fuzzy, review, unmatched.
+        """
+        normalized = normalize_name(customer_name)
+        if not normalized:
+            return "", 0.0, "unmatched"
+
+        row = self.con.execute(
+            "SELECT contractor_name FROM confirmed_matches WHERE normalized = ?", (normalized,)
+        ).fetchone()
+        if row:
+            return row[0], 1.0, "confirmed"
+
+        row = self.con.execute(
+            "SELECT contractor_name FROM contractors WHERE normalized = ? LIMIT 1", (normalized,)
+        ).fetchone()
+        if row:
+            return row[0], 1.0, "exact"
+
+        keys = list(blocking_keys(normalized))
+        placeholders = ",".join("?" * len(keys))
+        candidates = self.con.execute(f"""
+            SELECT DISTINCT c.contractor_name, c.normalized
+            FROM block_keys b
+            JOIN contractors c USING (contractor_id)
+            WHERE b.key IN (
+                SELECT key FROM block_keys
+                WHERE key IN ({placeholders})
+                GROUP BY key
+                HAVING COUNT(*) <= ?
+            )
+        """, (*keys, MAX_BLOCK_SIZE)).fetchall()
+
+        best_name, best_score = "", 0.0
+        for contractor_name, contractor_norm in candidates:
+            score = similarity(normalized, contractor_norm)
+            if score > best_score:
+                best_name, best_score = contractor_name, score
+
+        if best_score >= AUTO_MATCH_SCORE:
+            return best_name, best_score, "fuzzy"
+        if best_score >= REVIEW_SCORE:
+            return best_name, best_score, "review"
+        return "", best_score, "unmatched"
+
+
+# ── Sheet I/O ─────────────────────────────────────────────────────────────────
+
+def read_tab(gc: gspread.Client, sheet_id: str, tab_name: str) -> list[dict]:
+    """Read all records from a tab; a missing tab reads as empty."""
+    try:
+        ws = gc.open_by_key(sheet_id).worksheet(tab_name)
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"  ℹ  Tab '{tab_name}' not found, treating as empty.")
+        return []
+    rows = ws.get_all_records()
+    print(f"Read {len(rows)} row(s) from '{tab_name}'.")
+    return rows
+
+
+def write_matches(gc: gspread.Client, all_rows: list[list]):
+    """Write match results to OUTPUT_TAB_NAME in OUTPUT_SHEET_ID."""
+    spreadsheet = gc.open_by_key(OUTPUT_SHEET_ID)
+
+    try:
+        ws = spreadsheet.worksheet(OUTPUT_TAB_NAME)
+        ws.clear()
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=OUTPUT_TAB_NAME, rows=1, cols=6)
+
+    header = ["file_name", "customer_name", "contractor_name", "score", "method", "confirmed"]
+    ws.update([header] + all_rows)
+    print(f"✓ Wrote {len(all_rows)} match row(s) to '{OUTPUT_TAB_NAME}' tab.")
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def main():
+    creds = get_credentials()
+    gc = gspread.authorize(creds)
+    index = MatchIndex()
+
+    try:
+        # 1. Sync the contractor master list into the index (new names only)
+        contractor_rows = read_tab(gc, INPUT_SHEET_ID, CONTRACTOR_TAB_NAME)
+        added = index.add_contractors(
+            [r.get("contractor_name", "") for r in contractor_rows if str(r.get("contractor_name", "")).strip()]
+        )
+        print(f"Indexed {added} new contractor(s).")
+
+        # 2. Store confirmations made in the previous run's output tab
+        confirmed = 0
+        for r in read_tab(gc, OUTPUT_SHEET_ID, OUTPUT_TAB_NAME):
+            customer_name = str(r.get("customer_name", "")).strip()
+            contractor_name = str(r.get("contractor_name", "")).strip()
+            if str(r.get("confirmed", "")).strip().upper() == "TRUE" and customer_name and contractor_name:
+                index.confirm(customer_name, contractor_name)
+                confirmed += 1
+        print(f"Stored {confirmed} confirmed match(es).")
+
+        # 3. Resolve every customer name, once per distinct name
+        customer_rows = read_tab(gc, INPUT_SHEET_ID, CUSTOMER_TAB_NAME)
+        resolved: dict[str, tuple[str, float, str]] = {}
+        output_rows: list[list] = []
+
+        for r in customer_rows:
+            file_name = str(r.get("file_name", "")).strip()
+            customer_name = str(r.get("customer_name", "")).strip()
+            if not customer_name:
+                continue
+            if customer_name not in resolved:
+                resolved[customer_name] = index.resolve(customer_name)
+            contractor_name, score, method = resolved[customer_name]
+            output_rows.append([
+                file_name, customer_name, contractor_name, score, method,
+                "TRUE" if method == "confirmed" else "",
+            ])
+
+        methods = [m for _, _, m in resolved.values()]
+        print(f"\nResolved {len(resolved)} distinct customer name(s): "
+              + ", ".join(f"{m}={methods.count(m)}" for m in
+                          ("confirmed", "exact", "fuzzy", "review", "unmatched")))
+
+        # 4. Write results
+        if output_rows:
+            write_matches(gc, output_rows)
+        else:
+            print("No customer names found to match.")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
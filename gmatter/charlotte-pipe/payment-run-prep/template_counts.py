@@ -1,115 +1,212 @@
+import hashlib
+import json
+import math
 import os
-import warnings
-import openpyxl
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import pandas as pd
 from datetime import datetime
 
-# updated to not require opening excel and Grant Access
-
-# --- Patch openpyxl to clamp font family values instead of raising ---
-# Some xlsx files use font family=34 which exceeds openpyxl's max of 14
-from openpyxl.descriptors import Max
-_original_max_set = Max.__set__
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from workbook_reader import open_workbook
 
-def _clamped_max_set(self, instance, value):
-    if value is not None:
-        try:
-            value = self.expected_type(value)
-            if value > self.max:
-                value = self.max  # clamp instead of raise
-        except (ValueError, TypeError):
-            pass
-    _original_max_set(self, instance, value)
-
-Max.__set__ = _clamped_max_set
-# --- End patch ---
+# updated to not require opening excel and Grant Access
+# updated to stream each template once (read-only), count files in parallel
+# and cache results by file hash so only new templates get recounted
+# workbooks are read through shared/workbook_reader.py, which tolerates bad
+# font family values (e.g. 34) without a per-script openpyxl patch
 
 
 # --- Paths ---
 folder_path = r'/Users/lorimartella/Documents/gmatter/charlotte_pipe/templates'
 excel_output_path = r'/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/template_counts.xlsx'
+cache_path = r'/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/template_counts_cache.json'
+
+# Bump when the counting rules change so cached results are recomputed
+CACHE_VERSION = 2
+max_workers = None  # None = one worker per CPU
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """sha256 of the file contents."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def to_number(value):
+    """
+    Numeric value of a cell, or None (mirrors pd.to_numeric(errors='coerce')
+    followed by a NaN-skipping sum: "nan" / "inf" text counts as no value).
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        number = value if isinstance(value, float) else float(str(value).strip())
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def count_template(file_path):
+    """
+    Stream the first usable sheet of a template once (read-only) and return
+    {'transaction_count', 'sales_total'}, or None when no usable sheet /
+    'extended_price' header is found.
+    """
+    filename = os.path.basename(file_path)
+
+    with open_workbook(file_path) as wb:
+        # Find first usable sheet
+        valid_sheets = [
+            sheet for sheet in wb.sheet_names
+            if 'sample' not in sheet.lower() and 'instructions' not in sheet.lower()
+        ]
+
+        if not valid_sheets:
+            print(f"No valid sheet found in {filename}. Skipping...")
+            return None
+
+        price_idx = None
+        transaction_count = 0
+        sales_total = 0.0
+
+        for row in wb.rows(valid_sheets[0]):
+            # Auto-detect header row by finding the row that contains 'extended_price'
+            if price_idx is None:
+                lower_cols = [str(c).lower().strip() if c else "" for c in row]
+                if "extended_price" in lower_cols:
+                    price_idx = lower_cols.index("extended_price")
+                continue
 
-file_data = []
+            # Count rows with ≥2 non-empty cells
+            if sum(1 for c in row if c is not None) >= 2:
+                transaction_count += 1
 
-for filename in os.listdir(folder_path):
-    if filename.endswith('.xlsx') and not filename.startswith('~$'):
-        file_path = os.path.join(folder_path, filename)
+            # Sum extended_price column
+            if price_idx < len(row):
+                amount = to_number(row[price_idx])
+                if amount is not None:
+                    sales_total += amount
+
+    if price_idx is None:
+        print(f"  ⚠️  Could not find 'extended_price' header in {filename} — skipping.")
+        return None
+
+    return {'transaction_count': transaction_count, 'sales_total': sales_total}
+
+
+def count_template_safe(file_path):
+    """Worker entry point: (file_path, counts, error)."""
+    try:
+        return file_path, count_template(file_path), None
+    except Exception as e:
+        return file_path, None, e
+
+
+def load_cache(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') == CACHE_VERSION:
+            return cache.get('files', {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def save_cache(path, files):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'saved_at': datetime.now().isoformat(), 'files': files}, f)
+    os.replace(tmp_path, path)
+
+
+def list_templates(folder):
+    return sorted(
+        filename for filename in os.listdir(folder)
+        if filename.endswith('.xlsx') and not filename.startswith('~$')
+    )
+
+
+def count_folder(folder, cache_file=None, workers=None):
+    """
+    {filename: {'transaction_count', 'sales_total'}} for every template in
+    folder. Files whose hash is in the cache are not reopened; the rest are
+    counted in parallel and added to the cache. Unreadable files get None counts.
+    """
+    cache_file = cache_file or cache_path
+    filenames = list_templates(folder)
+
+    cache = load_cache(cache_file)
+    hashes = {}
+    results = {}
+    to_count = []
+
+    for filename in filenames:
+        file_path = os.path.join(folder, filename)
+        try:
+            digest = file_hash(file_path)
+        except OSError as e:
+            print(f"Error reading {filename}: {e}")
+            results[filename] = {'transaction_count': None, 'sales_total': None}
+            continue
+        hashes[filename] = digest
+        if digest in cache:
+            results[filename] = cache[digest]
+        else:
+            to_count.append(file_path)
+
+    print(f"{len(filenames)} template(s): {len(filenames) - len(to_count)} cached, {len(to_count)} to count")
+
+    if to_count:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for file_path, counts, error in pool.map(count_template_safe, to_count):
+                filename = os.path.basename(file_path)
+                if error is not None:
+                    print(f"Error reading {filename}: {error}")
+                    results[filename] = {'transaction_count': None, 'sales_total': None}
+                    continue
+                counts = counts or {'transaction_count': 0, 'sales_total': 0}
+                results[filename] = counts
+                cache[hashes[filename]] = counts
 
         try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                wb = openpyxl.load_workbook(file_path, data_only=True, keep_links=False)
-
-            # Find first usable sheet
-            valid_sheets = [
-                sheet for sheet in wb.worksheets
-                if 'sample' not in sheet.title.lower() and 'instructions' not in sheet.title.lower()
-            ]
-
-            if not valid_sheets:
-                print(f"No valid sheet found in {filename}. Skipping...")
-                file_data.append({'file_name': "'" + filename, 'transaction_count': 0, 'sales_total': 0})
-                wb.close()
-                continue
+            save_cache(cache_file, cache)
+        except OSError as e:
+            print(f"⚠️ Error saving cache: {e}")
 
-            sheet = valid_sheets[0]
+    return {filename: results[filename] for filename in filenames}
 
-            # Read all rows as a list of tuples
-            data = [row for row in sheet.iter_rows(values_only=True)]
-            wb.close()
 
-            if not data:
-                file_data.append({'file_name': "'" + filename, 'transaction_count': 0, 'sales_total': 0})
-                continue
+def main():
+    results = count_folder(folder_path, cache_path, max_workers)
+    filenames = list(results)
 
-            # Auto-detect header row by finding the row that contains 'extended_price'
-            header_idx = None
-            for i, row in enumerate(data):
-                if row and any(str(c).lower().strip() == "extended_price" for c in row if c):
-                    header_idx = i
-                    break
-
-            if header_idx is None:
-                print(f"  ⚠️  Could not find 'extended_price' header in {filename} — skipping.")
-                file_data.append({'file_name': "'" + filename, 'transaction_count': 0, 'sales_total': 0})
-                continue
+    # --- Convert results to DataFrame ---
+    # Prefix filename with single quote to preserve spacing in Google Sheets
+    file_data = [
+        {'file_name': "'" + filename, **results[filename]}
+        for filename in filenames
+    ]
+    df_out = pd.DataFrame(file_data, columns=['file_name', 'transaction_count', 'sales_total'])
 
-            header_row = data[header_idx]
+    print(df_out)
 
-            df = pd.DataFrame(data[header_idx + 1:], columns=header_row)
+    # --- Save to Excel ---
+    try:
+        os.makedirs(os.path.dirname(excel_output_path), exist_ok=True)
+        df_out.to_excel(excel_output_path, index=False)
+        print(f"✅ Saved results to Excel: {excel_output_path}")
+    except Exception as e:
+        print(f"⚠️ Error saving Excel: {e}")
 
-            # Count rows with ≥2 non-empty cells
-            transaction_count = df.dropna(thresh=2).shape[0]
 
-            # Sum extended_price column
-            lower_cols = [str(c).lower().strip() if c else "" for c in header_row]
-            col_name = header_row[lower_cols.index("extended_price")]
-            sales_total = pd.to_numeric(df[col_name], errors="coerce").sum(skipna=True)
-
-            # Prefix filename with single quote to preserve spacing in Google Sheets
-            file_data.append({
-                'file_name': "'" + filename,
-                'transaction_count': transaction_count,
-                'sales_total': sales_total
-            })
-
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-            file_data.append({
-                'file_name': "'" + filename,
-                'transaction_count': None,
-                'sales_total': None
-            })
-
-# --- Convert results to DataFrame ---
-df_out = pd.DataFrame(file_data)
-
-print(df_out)
-
-# --- Save to Excel ---
-try:
-    os.makedirs(os.path.dirname(excel_output_path), exist_ok=True)
-    df_out.to_excel(excel_output_path, index=False)
-    print(f"✅ Saved results to Excel: {excel_output_path}")
-except Exception as e:
-    print(f"⚠️ Error saving Excel: {e}")
+if __name__ == '__main__':
+    main()
@@ -1,83 +1,121 @@
 import duckdb
-import pandas as pd
 
-def create_exclusions_report(db_path="mydata.duckdb", output_csv="03_exclusions.csv"):
+# Default exclusion terms, in priority order (first match wins).
+# To change them without editing this file, create an "exclusion_terms"
+# table in the DuckDB file with columns (term VARCHAR, term_order INTEGER).
+DEFAULT_EXCLUSION_TERMS = [
+    'copper',
+    'spears',
+    'tyler',
+    'JM eagle',
+    'lasco',
+    'ipex',
+    'nibco'
+]
+
+
+def load_exclusion_terms(con, terms_table="exclusion_terms", exclusion_terms=None):
     """
-    Creates exclusions report by validating contractor_transactions
-    against exclusion terms.
+    Create the temp table _exclusion_terms(term_order, term, term_lower) used by the scan.
+    Explicit exclusion_terms win, then terms_table if it exists in the database,
+    then DEFAULT_EXCLUSION_TERMS.
     """
+    con.execute("""
+        CREATE OR REPLACE TEMPORARY TABLE _exclusion_terms(term_order INTEGER, term VARCHAR, term_lower VARCHAR)
+    """)
 
-    exclusion_terms = [
-        'copper',
-        'spears',
-        'tyler',
-        'JM eagle',
-        'lasco',
-        'ipex',
-        'nibco'
-    ]
+    if exclusion_terms is None and terms_table:
+        exists = con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [terms_table]
+        ).fetchone()[0]
+        if exists:
+            con.execute(f"""
+                INSERT INTO _exclusion_terms
+                SELECT ROW_NUMBER() OVER (ORDER BY term_order, term), TRIM(term), LOWER(TRIM(term))
+                FROM {terms_table}
+                WHERE TRIM(COALESCE(term, '')) <> ''
+            """)
+            return
+
+    terms = exclusion_terms if exclusion_terms is not None else DEFAULT_EXCLUSION_TERMS
+    # Blank terms are dropped, as from the table: '' would be contained in every description
+    terms = [term.strip() for term in terms if term and term.strip()]
+    if terms:
+        con.executemany(
+            "INSERT INTO _exclusion_terms VALUES (?, ?, ?)",
+            [(i, term, term.lower()) for i, term in enumerate(terms, start=1)]
+        )
 
-    con = duckdb.connect(db_path)
 
-    # Load data from contractor_transactions
-    df = con.execute("""
-        SELECT contractor_name,
+def exclusion_issues_sql(table_name="contractor_transactions", row_id="rowid", include_row_id=False):
+    """
+    SQL returning one row per exclusion issue, in table order.
+
+    Each transaction is matched against _exclusion_terms once (descriptions are
+    lower-cased a single time per row) and keeps only its first matching term.
+    That row then yields up to two issues: exclude is not "Y", and
+    potential_earnings is not empty. row_id names the column that gives table
+    order (the QC runner passes the row_id of its scan table); include_row_id
+    adds it to the output as the first column.
+    """
+    return f"""
+        WITH tx AS (
+            SELECT {row_id} AS row_id,
+                   contractor_name,
+                   file_name,
+                   item_description,
+                   TRIM(COALESCE(CAST(exclude AS VARCHAR), '')) AS exclude_flag,
+                   LOWER(TRIM(COALESCE(CAST(potential_earnings AS VARCHAR), ''))) NOT IN ('', 'nan')
+                       AS has_earnings,
+                   LOWER(COALESCE(CAST(item_description AS VARCHAR), '')) AS desc_lower
+            FROM {table_name}
+        ),
+        first_match AS (
+            SELECT tx.*, t.term
+            FROM tx
+            JOIN _exclusion_terms t ON contains(tx.desc_lower, t.term_lower)
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY tx.row_id ORDER BY t.term_order) = 1
+        ),
+        issues AS (
+            SELECT row_id, 1 AS issue_order, contractor_name, file_name, item_description, exclude_flag,
+                   'Found "' || term || '" but exclude is not "Y"' AS issue_type
+            FROM first_match
+            WHERE exclude_flag <> 'Y'
+            UNION ALL
+            SELECT row_id, 2 AS issue_order, contractor_name, file_name, item_description, exclude_flag,
+                   'Found "' || term || '" but potential_earnings is not empty' AS issue_type
+            FROM first_match
+            WHERE has_earnings
+        )
+        SELECT {'row_id,' if include_row_id else ''}
+               contractor_name,
                file_name,
                item_description,
-               exclude,
-               potential_earnings
-        FROM contractor_transactions
-    """).df()
-
-    results = []
-    for _, row in df.iterrows():
-        item_desc = str(row["item_description"] or "").lower()
-        exclude_flag = str(row["exclude"] or "").strip()
-        potential_earnings = row["potential_earnings"]
-
-        for term in exclusion_terms:
-            if term.lower() in item_desc:
-                # Issue: Found exclusion term but exclude != "Y"
-                if exclude_flag != "Y":
-                    results.append([
-                        row["contractor_name"],
-                        row["file_name"], #fixed 06/08/2026
-                        row["item_description"],
-                        exclude_flag,
-                        f'Found "{term}" but exclude is not "Y"'
-                    ])
-                # Issue: Found exclusion term but potential_earnings is not empty
-                if pd.notna(potential_earnings) and str(potential_earnings).strip() != "":
-                    results.append([
-                        row["contractor_name"],
-                        row["file_name"],
-                        row["item_description"],
-                        exclude_flag,
-                        f'Found "{term}" but potential_earnings is not empty'
-                    ])
-                break  # stop checking after first term match
-
-    if results:
-        report_df = pd.DataFrame(results, columns=[
-            "contractor_name",
-            "file_name",
-            "item_description",
-            "exclude",
-            "issue_type"
-        ])
-    else:
-        # Empty report but with headers
-        report_df = pd.DataFrame(columns=[
-            "contractor_name",
-            "file_name",
-            "item_description",
-            "exclude",
-            "issue_type"
-        ])
-
-    # Save to CSV
-    report_df.to_csv(output_csv, index=False)
-    print(f"Exclusions report written to {output_csv} with {len(report_df)} issues.")
+               exclude_flag AS exclude,
+               issue_type
+        FROM issues
+        ORDER BY row_id, issue_order
+    """
+
+
+def create_exclusions_report(db_path="mydata.duckdb", output_csv="03_exclusions.csv",
+                             terms_table="exclusion_terms", exclusion_terms=None):
+    """
+    Creates exclusions report by validating contractor_transactions
+    against exclusion terms, in a single DuckDB scan.
+    """
+
+    con = duckdb.connect(db_path)
+
+    load_exclusion_terms(con, terms_table, exclusion_terms)
+
+    con.execute(f"CREATE OR REPLACE TEMPORARY TABLE _exclusion_issues AS {exclusion_issues_sql()}")
+    issue_count = con.execute("SELECT COUNT(*) FROM _exclusion_issues").fetchone()[0]
+
+    # Save to CSV (empty report still gets headers)
+    csv_path = str(output_csv).replace("'", "''")
+    con.execute(f"COPY _exclusion_issues TO '{csv_path}' (HEADER, DELIMITER ',')")
+    print(f"Exclusions report written to {output_csv} with {issue_count} issues.")
 
     con.close()
 
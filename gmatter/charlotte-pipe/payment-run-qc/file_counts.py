@@ -1,18 +1,24 @@
+import argparse
 import duckdb
 import re
 import pandas as pd
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "payment-run-prep"))
+from template_counts import count_folder
+
+from load_transactions_table import FILE_KEY
+
+# Per-file row counts written by load_transactions_table.py at load time
+stats_table = "transaction_load_stats"
 
 def compare_file_names_with_counts(db_path, table_name, output_csv):
-    con = duckdb.connect(db_path)
+    con = duckdb.connect(db_path, read_only=True)
 
-    # Query DB: get file_name and row counts
-    query = f"""
-        SELECT file_name, COUNT(*) AS row_count
-        FROM {table_name}
-        GROUP BY file_name
-    """
-    db_counts = {row[0].strip(): row[1] for row in con.execute(query).fetchall() if row[0]}
+    # Per-file row counts (load stats, or a GROUP BY on older databases)
+    db_counts = load_db_counts(con, table_name)
+    con.close()
     archive_set = set(db_counts.keys())
 
     print("Paste your file names and counts below (one per line).")
@@ -78,9 +84,106 @@ def compare_file_names_with_counts(db_path, table_name, output_csv):
 
     return df
 
+def load_db_counts(con, table_name):
+    """
+    {file_name: row_count} from the load stats table when the loader has
+    written it; otherwise a GROUP BY over table_name (older databases).
+    """
+    has_stats = con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [stats_table]
+    ).fetchone()[0]
+    if has_stats:
+        query = f"SELECT file_name, row_count FROM {stats_table}"
+    else:
+        print(f"⚠️  {stats_table} not found — counting {table_name} directly. "
+              f"Reload with load_transactions_table.py to create it.")
+        query = f"""
+            SELECT {FILE_KEY}, COUNT(*)
+            FROM {table_name}
+            WHERE {FILE_KEY} IS NOT NULL
+            GROUP BY 1
+        """
+    return {row[0]: row[1] for row in con.execute(query).fetchall()}
+
+
+def reconcile_with_source_folder(db_path, table_name, source_folder, output_csv, cache_file=None):
+    """
+    Non-interactive reconciliation: expected row counts come from the source
+    templates (counted in parallel, cached by file hash — see template_counts.py)
+    and are joined to the per-file load stats. Returns the results DataFrame.
+    """
+    source_counts = {
+        fname: counts['transaction_count']
+        for fname, counts in count_folder(source_folder, cache_file).items()
+    }
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        db_counts = load_db_counts(con, table_name)
+        # Key the source files by FILE_KEY, as the load stats are keyed: a name
+        # with leading / trailing spaces meets its loaded rows, blank names drop out
+        con.register("_source_counts", pd.DataFrame({
+            "file_name": pd.Series(list(source_counts), dtype=object),
+            "source_count": pd.Series(list(source_counts.values()), dtype="Int64"),
+        }))
+        source = con.execute(f"""
+            SELECT {FILE_KEY} AS file_name,
+                   CASE WHEN COUNT(*) = COUNT(source_count) THEN SUM(source_count) END AS source_count
+            FROM _source_counts
+            WHERE {FILE_KEY} IS NOT NULL
+            GROUP BY 1
+        """).df()
+    finally:
+        con.close()
+
+    source_keys = set(source["file_name"])
+    db = pd.DataFrame(list(db_counts.items()), columns=["file_name", "db_count"])
+    df = source.merge(db, on="file_name", how="outer")
+
+    def status(row):
+        if pd.isna(row.db_count):
+            return "not loaded"
+        if row.file_name not in source_keys:
+            return "MISSING"
+        if pd.isna(row.source_count):
+            return "found (no source count)"
+        if row.source_count == row.db_count:
+            return "found (count matches)"
+        return f"found (count mismatch: source={int(row.source_count)}, db={int(row.db_count)})"
+
+    df["status"] = df.apply(status, axis=1) if len(df) else pd.Series(dtype=str)
+    df["source_count"] = df["source_count"].astype("Int64")
+    df["db_count"] = df["db_count"].astype("Int64")
+    df = df.sort_values("file_name").reset_index(drop=True)
+    df.to_csv(output_csv, index=False)
+
+    print(f"\nResults written to: {output_csv}")
+    print(f"\nSummary:")
+    print(f"- Source files: {len(source_counts)}")
+    print(f"- Found with matching count: {(df['status'] == 'found (count matches)').sum()}")
+    print(f"- Found with count mismatch: {df['status'].str.contains('count mismatch').sum()}")
+    print(f"- Not loaded: {(df['status'] == 'not loaded').sum()}")
+    print(f"- Loaded but not in source folder: {(df['status'] == 'MISSING').sum()}")
+
+    return df
+
+
 if __name__ == "__main__":
     db_path = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
     table_name = "contractor_transactions"
     output_csv = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/file_count_results.csv"
+    source_folder = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/templates"
+
+    parser = argparse.ArgumentParser(description="Compare per-file row counts with contractor_transactions.")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="count the source folder instead of reading pasted names/counts (cron-friendly)")
+    parser.add_argument("--folder", default=source_folder)
+    parser.add_argument("--output", default=output_csv)
+    args = parser.parse_args()
 
-    compare_file_names_with_counts(db_path, table_name, output_csv)
+    if args.reconcile:
+        results = reconcile_with_source_folder(db_path, table_name, args.folder, args.output)
+        # Non-zero exit when anything disagrees, so cron / schedulers can alert
+        sys.exit(0 if (results["status"] == "found (count matches)").all() else 1)
+    else:
+        compare_file_names_with_counts(db_path, table_name, args.output)
@@ -0,0 +1,152 @@
+"""
+Keyword classifier for item descriptions.
+
+Compiles a (keyword, category, priority) list into an Aho-Corasick automaton
+so every description is scanned once, in time linear in its length, no
+matter how many keywords there are.
+
+Matching rules:
+  • case-insensitive;
+  • a keyword must start at a word boundary and end at a word boundary,
+    optionally followed by a plural suffix ("s" / "es"). Only letters count
+    as word characters, so sizes running into words still match
+    ("3/4CAP", "2-TEE") while "cap" no longer fires inside "capacity".
+
+The winning category is the one of the matched keyword with the highest
+priority; ties go to the longer keyword, then to the earlier position.
+
+Usage:
+    clf = KeywordClassifier(KEYWORDS)
+    clf.classify("PVC 90 ELBOW 2IN")      # (['elbow'], 'fitting')
+
+    # Classify every distinct description of a DuckDB table once:
+    df = clf.classify_column(con, "contractor_transactions", "item_description")
+
+    # Or use it inline in SQL:
+    clf.register_udf(con)                  # classify_keywords(text) → STRUCT
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+PLURAL_SUFFIXES = ("es", "s")
+
+
+class KeywordClassifier:
+    def __init__(self, keywords: Iterable[Tuple[str, str, int]], plural_suffixes=PLURAL_SUFFIXES):
+        self.plural_suffixes = plural_suffixes
+        self.keywords: Dict[str, Tuple[str, int]] = {}
+        for keyword, category, priority in keywords:
+            self.keywords[keyword.lower()] = (category, int(priority))
+        self._build()
+
+    # ── Automaton ────────────────────────────────────────────────────────────
+
+    def _build(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(keyword)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _ends_word(self, text: str, end: int) -> bool:
+        if end >= len(text) or not text[end].isalpha():
+            return True
+        for suffix in self.plural_suffixes:
+            stop = end + len(suffix)
+            if text.startswith(suffix, end) and (stop >= len(text) or not text[stop].isalpha()):
+                return True
+        return False
+
+    def find(self, text) -> List[Tuple[int, str]]:
+        """All (start, keyword) matches in text that respect the word-boundary rules."""
+        if text is None:
+            return []
+        text = str(text).lower()
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for keyword in self._out[state]:
+                start = i - len(keyword) + 1
+                if (start == 0 or not text[start - 1].isalpha()) and self._ends_word(text, i + 1):
+                    matches.append((start, keyword))
+        matches.sort()
+        return matches
+
+    # ── Classification ───────────────────────────────────────────────────────
+
+    def classify(self, text) -> Tuple[List[str], Optional[str]]:
+        """(matched keywords in order of appearance, winning category or None)."""
+        matches = self.find(text)
+        if not matches:
+            return [], None
+
+        found: List[str] = []
+        for _, keyword in matches:
+            if keyword not in found:
+                found.append(keyword)
+
+        _, _, _, winner = max(
+            (self.keywords[kw][1], len(kw), -start, kw) for start, kw in matches
+        )
+        return found, self.keywords[winner][0]
+
+    def classify_many(self, texts: Iterable) -> pd.DataFrame:
+        """DataFrame (text, keywords_found, final_category), one row per distinct text."""
+        records = []
+        for text in dict.fromkeys(texts):
+            found, category = self.classify(text)
+            records.append((text, ", ".join(found) if found else None, category))
+        return pd.DataFrame(records, columns=["text", "keywords_found", "final_category"])
+
+    def classify_column(self, con, table_name: str, column: str) -> pd.DataFrame:
+        """
+        Classify each distinct value of table_name.column once. The result is
+        also registered on con as the view "<column>_keywords" so it can be
+        joined back to the table on <column>.
+        """
+        distinct = con.execute(
+            f"SELECT DISTINCT {column} FROM {table_name} WHERE {column} IS NOT NULL"
+        ).fetchall()
+        df = self.classify_many(row[0] for row in distinct).rename(columns={"text": column})
+        con.register(f"{column}_keywords", df)
+        return df
+
+    def register_udf(self, con, name: str = "classify_keywords"):
+        """Register name(text) → STRUCT(keywords_found VARCHAR, final_category VARCHAR) on con."""
+        def _udf(text):
+            found, category = self.classify(text)
+            return {"keywords_found": ", ".join(found) if found else None, "final_category": category}
+
+        con.create_function(
+            name, _udf, ["VARCHAR"],
+            "STRUCT(keywords_found VARCHAR, final_category VARCHAR)",
+            null_handling="special",
+        )
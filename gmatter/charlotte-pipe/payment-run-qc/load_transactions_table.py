@@ -1,32 +1,298 @@
+"""
+Load a transactions export (CSV or XLSX) into the contractor_transactions table.
+
+Rows are streamed straight into DuckDB instead of going through pandas:
+  • CSV  — DuckDB's native read_csv (all columns read as text, then typed);
+  • XLSX — the first sheet is streamed through shared/workbook_reader.py and
+           handed to DuckDB as Arrow record batches of BATCH_ROWS rows.
+
+Every load lands in a staging table first, typed by TRANSACTION_SCHEMA
+(columns not listed there stay VARCHAR; values that don't convert become NULL).
+The live table is only touched in one short transaction at the end, so QC
+readers see either the old table or the new one — never a missing or
+half-loaded table. The same transaction keeps transaction_load_stats
+(rows per file_name) in step with the table, so reconciliation
+(file_counts.py --reconcile) can compare counts without scanning it.
+
+Modes:
+  replace       — the export becomes the whole table (default)
+  append        — add the export's rows to the table
+  replace_file  — delete rows whose file_name appears in the export, then add
+                  the export's rows (reload corrected files only)
+
+Run with:  python load_transactions_table.py [--mode MODE] [FILE ...]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
 import duckdb
-import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from workbook_reader import open_workbook
+
+# --- Configuration ---
+database_file = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
+table_name = "contractor_transactions"
+stats_table = "transaction_load_stats"
+input_file = "/Users/lorimartella/Downloads/transactions_20260427.xlsx"
+
+BATCH_ROWS = 50_000
+MODES = ("replace", "append", "replace_file")
+
+# The file a row came from, as the load stats and replace_file match it
+FILE_KEY = "NULLIF(TRIM(file_name), '')"
+
+# Column → DuckDB type. Flag columns stay text: QC compares them to Y / 1 / true.
+TRANSACTION_SCHEMA = {
+    "file_name":          "VARCHAR",
+    "contractor_name":    "VARCHAR",
+    "contractor_number":  "VARCHAR",
+    "customer_name":      "VARCHAR",
+    "vendor":             "VARCHAR",
+    "ordered_on":         "DATE",
+    "item_sku":           "VARCHAR",
+    "item_sku_alt":       "VARCHAR",
+    "item_upc":           "VARCHAR",
+    "item_description":   "VARCHAR",
+    "unit_price":         "DOUBLE",
+    "ship_quantity":      "DOUBLE",
+    "uom":                "VARCHAR",
+    "extended_price":     "DOUBLE",
+    "potential_earnings": "DOUBLE",
+    "cast_iron":          "VARCHAR",
+    "plastic":            "VARCHAR",
+    "pipe":               "VARCHAR",
+    "fittings":           "VARCHAR",
+    "pvc":                "VARCHAR",
+    "abs":                "VARCHAR",
+    "dwv":                "VARCHAR",
+    "cpvc":               "VARCHAR",
+    "cts":                "VARCHAR",
+    "neither":            "VARCHAR",
+    "questionable":       "VARCHAR",
+    "exclude":            "VARCHAR",
+}
+
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def header_names(header):
+    """Clean header cells; blanks become column<N>, repeats get a .1 / .2 suffix."""
+    names, seen = [], {}
+    for i, cell in enumerate(header, start=1):
+        name = str(cell).strip() if cell is not None else ""
+        name = name or f"column{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def typed_column(name):
+    """SELECT expression converting the text column `name` to its schema type."""
+    col = f"NULLIF(TRIM({quote_ident(name)}), '')"
+    dtype = TRANSACTION_SCHEMA.get(name, "VARCHAR")
+    if dtype == "VARCHAR":
+        expr = f"{quote_ident(name)}"
+    elif dtype == "DATE":
+        expr = f"COALESCE(TRY_CAST({col} AS DATE), CAST(TRY_CAST({col} AS TIMESTAMP) AS DATE))"
+    elif dtype in ("DOUBLE", "INTEGER", "BIGINT") or dtype.startswith("DECIMAL"):
+        expr = f"TRY_CAST(REPLACE(REPLACE({col}, ',', ''), '$', '') AS {dtype})"
+    else:
+        expr = f"TRY_CAST({col} AS {dtype})"
+    return f"{expr} AS {quote_ident(name)}"
+
+
+def cell_text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def xlsx_batches(path):
+    """(column names, Arrow RecordBatchReader) streaming the first sheet as text."""
+    wb = open_workbook(path)
+    sheet = wb.sheet_names[0]
+    rows = wb.rows(sheet)
+    header = next(rows, None)
+    if header is None:
+        wb.close()
+        raise ValueError(f"{Path(path).name}: first sheet '{sheet}' is empty")
+    names = header_names(header)
+    schema = pa.schema([(name, pa.string()) for name in names])
+    width = len(names)
+
+    def batches():
+        try:
+            columns = [[] for _ in names]
+            for row in rows:
+                if all(v is None or (isinstance(v, str) and not v.strip()) for v in row):
+                    continue
+                for i in range(width):
+                    columns[i].append(cell_text(row[i]) if i < len(row) else None)
+                if len(columns[0]) >= BATCH_ROWS:
+                    yield pa.RecordBatch.from_arrays([pa.array(c, pa.string()) for c in columns], schema=schema)
+                    columns = [[] for _ in names]
+            if columns[0]:
+                yield pa.RecordBatch.from_arrays([pa.array(c, pa.string()) for c in columns], schema=schema)
+        finally:
+            wb.close()
+
+    return names, pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def stage_file(conn, path, staging_table, create):
+    """Stream one export into staging_table (created when create=True). Returns rows staged."""
+    path = str(path)
+    if path.lower().endswith(".csv"):
+        escaped = path.replace("'", "''")
+        source = f"read_csv('{escaped}', header = true, all_varchar = true)"
+        names = [row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    else:
+        names, reader = xlsx_batches(path)
+        conn.register("_xlsx_rows", reader)
+        source = "_xlsx_rows"
+
+    select = ", ".join(typed_column(name) for name in names)
+    before = 0
+    if create:
+        conn.execute(f"CREATE OR REPLACE TABLE {staging_table} AS SELECT {select} FROM {source}")
+    else:
+        before = conn.execute(f"SELECT COUNT(*) FROM {staging_table}").fetchone()[0]
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info('{staging_table}')").fetchall()}
+        for name in names:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {staging_table} ADD COLUMN {quote_ident(name)} "
+                             f"{TRANSACTION_SCHEMA.get(name, 'VARCHAR')}")
+        conn.execute(f"INSERT INTO {staging_table} BY NAME SELECT {select} FROM {source}")
+    if source == "_xlsx_rows":
+        conn.unregister("_xlsx_rows")
+    return conn.execute(f"SELECT COUNT(*) FROM {staging_table}").fetchone()[0] - before
+
+
+def table_exists(conn, name):
+    return conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+def update_load_stats(conn, staging_table, mode, stats=stats_table):
+    """
+    Maintain stats(file_name, row_count, loaded_at) from the staged rows, inside
+    the caller's transaction: replace rebuilds it, replace_file overwrites the
+    staged files' counts, append adds to them. Staged rows without a
+    file_name column count for nothing (replace still clears the stats).
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {stats} (
+            file_name VARCHAR PRIMARY KEY,
+            row_count BIGINT,
+            loaded_at TIMESTAMP
+        )
+    """)
+    if mode == "replace":
+        conn.execute(f"DELETE FROM {stats}")
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info('{staging_table}')").fetchall()}
+    if "file_name" not in columns:
+        return
+    staged = f"""
+        SELECT {FILE_KEY} AS file_name, COUNT(*) AS row_count, now() AS loaded_at
+        FROM {staging_table}
+        WHERE {FILE_KEY} IS NOT NULL
+        GROUP BY 1
+    """
+    if mode == "append":
+        conn.execute(f"""
+            INSERT INTO {stats} {staged}
+            ON CONFLICT (file_name) DO UPDATE
+            SET row_count = {stats}.row_count + excluded.row_count, loaded_at = excluded.loaded_at
+        """)
+    else:
+        conn.execute(f"INSERT OR REPLACE INTO {stats} {staged}")
+
 
 def load_file_to_duckdb(
-    input_file,
-    duckdb_file="/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
+    input_files,
+    duckdb_file=database_file,
+    mode="replace",
+    table=table_name,
 ):
-    if input_file.lower().endswith(".csv"):
-        df = pd.read_csv(input_file)
-    else:
-        df = pd.read_excel(input_file)
+    """
+    Stream one or more exports into `table` (see module docstring for modes).
+    Returns {'rows_loaded', 'rows_deleted', 'mode'}.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}, got {mode!r}")
+    if isinstance(input_files, (str, Path)):
+        input_files = [input_files]
 
+    staging = f"{table}__staging"
     conn = duckdb.connect(duckdb_file)
+    try:
+        rows_loaded = 0
+        for i, path in enumerate(input_files):
+            staged = stage_file(conn, path, staging, create=(i == 0))
+            print(f"  staged {staged:,} row(s) from {Path(path).name}")
+            rows_loaded += staged
 
-    conn.execute("DROP TABLE IF EXISTS contractor_transactions")
-    conn.register("df_view", df)
-    conn.execute("""
-        CREATE TABLE contractor_transactions AS
-        SELECT * FROM df_view
-    """)
+        rows_deleted = 0
+        has_file_name = "file_name" in {
+            row[1] for row in conn.execute(f"PRAGMA table_info('{staging}')").fetchall()
+        }
+        if mode == "replace_file" and not has_file_name:
+            raise ValueError("replace_file needs a file_name column in the export")
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            stats_mode = "replace" if not table_exists(conn, table) else mode
+            update_load_stats(conn, staging, stats_mode)
+            if mode == "replace" or not table_exists(conn, table):
+                if table_exists(conn, table):
+                    rows_deleted = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+            else:
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info('{table}')").fetchall()}
+                for _, name, dtype, *_ in conn.execute(f"PRAGMA table_info('{staging}')").fetchall():
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote_ident(name)} {dtype}")
+                if mode == "replace_file":
+                    rows_deleted = conn.execute(f"""
+                        DELETE FROM {table}
+                        WHERE {FILE_KEY} IN (SELECT DISTINCT {FILE_KEY} FROM {staging})
+                    """).fetchone()[0]
+                conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {staging}")
+                conn.execute(f"DROP TABLE {staging}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
-    print("Table created with columns:")
-    print(conn.execute(
-        "PRAGMA table_info('contractor_transactions')"
-    ).fetchall())
+        print(f"{table}: {rows_loaded:,} row(s) loaded, {rows_deleted:,} replaced ({mode})")
+        print("Table columns:")
+        print(conn.execute(f"PRAGMA table_info('{table}')").fetchall())
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.close()
+
+    return {"rows_loaded": rows_loaded, "rows_deleted": rows_deleted, "mode": mode}
 
-    conn.close()
 
 if __name__ == "__main__":
-    input_file = "/Users/lorimartella/Downloads/transactions_20260427.xlsx"
-    load_file_to_duckdb(input_file)
-    print("Data successfully loaded into contractor_transactions table.")
+    parser = argparse.ArgumentParser(description="Load transactions exports into DuckDB.")
+    parser.add_argument("files", nargs="*", default=[input_file])
+    parser.add_argument("--mode", choices=MODES, default="replace")
+    parser.add_argument("--db", default=database_file)
+    args = parser.parse_args()
+
+    load_file_to_duckdb(args.files, args.db, mode=args.mode)
+    print(f"Data successfully loaded into {table_name} table.")
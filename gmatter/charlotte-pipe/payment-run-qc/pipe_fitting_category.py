@@ -1,9 +1,18 @@
+import sys
+from pathlib import Path
+
 import duckdb
-import pandas as pd
+
+from keyword_classifier import KeywordClassifier
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from material_catalog import (NORMALIZE_CODE_MACRO, TRANSACTION_CODE_COLUMNS, catalog_available,
+                              catalog_matches_sql)
 
 # --- Configuration ---
 database_file = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
 table_name = "contractor_transactions"
+output_csv = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/pipe_fitting_discrepancies_duckdb.csv"
 
 # Keywords with priority
 keywords = [
@@ -23,82 +32,78 @@ original_cols = [
     'cpvc', 'cts', 'neither', 'questionable', 'exclude'
 ]
 
-# --- Connect to DuckDB ---
-con = duckdb.connect(database_file)
 
-# --- Create a temporary table for keywords ---
-con.execute("CREATE TEMPORARY TABLE keyword_table(keyword VARCHAR, category VARCHAR, priority INTEGER)")
-con.executemany("INSERT INTO keyword_table VALUES (?, ?, ?)", keywords)
+def find_pipe_fitting_discrepancies(con, table_name=table_name, classifier=None, row_id="rowid",
+                                    use_catalog=True):
+    """
+    Decide pipe vs fitting for every row and return rows whose pipe / fittings
+    flag disagrees. row_id names the column reported as row_number.
+
+    Rows whose item_sku / item_upc / item_sku_alt is in the local material
+    catalog (shared/material_catalog.py, synced by materials_data.py) take the
+    catalog category via one hash join. Only the remaining rows fall back to
+    the keyword engine: each of their distinct item_descriptions is
+    classified once (word-boundary matches, highest priority wins).
+    category_source tells which one decided.
+    """
+    classifier = classifier or KeywordClassifier(keywords)
+    columns = {row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {table_name}").fetchall()}
+    code_columns = [c for c in TRANSACTION_CODE_COLUMNS if c in columns]
 
-# --- SQL query: collect all matching keywords per row ---
-sql = f"""
-WITH matches AS (
-    SELECT 
-        t.rowid AS row_number,
+    con.execute("CREATE OR REPLACE TEMPORARY TABLE _catalog_matches(row_id BIGINT, catalog_category VARCHAR)")
+    if use_catalog and code_columns and catalog_available(con):
+        con.execute(NORMALIZE_CODE_MACRO)
+        con.execute(f"""
+            INSERT INTO _catalog_matches
+            SELECT row_id, catalog_category FROM ({catalog_matches_sql(table_name, row_id, code_columns)})
+        """)
+
+    unmatched = f"""(
+        SELECT t.item_description FROM {table_name} t
+        ANTI JOIN _catalog_matches m ON m.row_id = t.{row_id}
+    ) unmatched"""
+    classifier.classify_column(con, unmatched, "item_description")
+
+    sql = f"""
+    SELECT
+        t.{row_id} AS row_number,
         t.contractor_name,
         t.item_description,
-        t.pipe,
-        t.fittings,
+        k.keywords_found,
+        COALESCE(m.catalog_category, k.final_category) AS final_category,
+        CASE
+            WHEN m.catalog_category IS NOT NULL THEN 'catalog'
+            WHEN k.final_category IS NOT NULL THEN 'keywords'
+        END AS category_source,
+        t.pipe AS pipe_column_value,
+        t.fittings AS fittings_column_value,
         {', '.join('t.' + col for col in original_cols)},
-        k.keyword,
-        k.category AS expected_category,
-        k.priority,
-        POSITION(LOWER(k.keyword) IN LOWER(t.item_description)) AS pos
+        CASE
+            WHEN COALESCE(m.catalog_category, k.final_category)='pipe'
+                 AND COALESCE(LOWER(CAST(t.pipe AS VARCHAR)), '') NOT IN ('y','1','true')
+                THEN 'Should be marked as pipe but pipe column is not true'
+            WHEN COALESCE(m.catalog_category, k.final_category)='fitting'
+                 AND COALESCE(LOWER(CAST(t.fittings AS VARCHAR)), '') NOT IN ('y','1','true')
+                THEN 'Should be marked as fitting but fittings column is not true'
+        END AS discrepancy_type
     FROM {table_name} t
-    JOIN keyword_table k
-    ON POSITION(LOWER(k.keyword) IN LOWER(t.item_description)) > 0
-),
-agg_keywords AS (
-    SELECT
-        row_number,
-        contractor_name,
-        item_description,
-        pipe,
-        fittings,
-        {', '.join(original_cols)},
-        STRING_AGG(keyword, ', ') AS keywords_found,
-        MAX(priority) AS highest_priority
-    FROM matches
-    GROUP BY row_number, contractor_name, item_description, pipe, fittings, {', '.join(original_cols)}
-),
-highest_category AS (
-    SELECT
-        m.row_number,
-        m.contractor_name,
-        m.item_description,
-        m.pipe,
-        m.fittings,
-        {', '.join('m.' + col for col in original_cols)},
-        m.keywords_found,
-        FIRST_VALUE(k.category) OVER (PARTITION BY m.row_number ORDER BY k.priority DESC) AS final_category
-    FROM agg_keywords m
-    LEFT JOIN keyword_table k
-    ON POSITION(LOWER(k.keyword) IN LOWER(m.keywords_found)) > 0
-)
-SELECT
-    row_number,
-    contractor_name,
-    item_description,
-    keywords_found,
-    final_category,
-    pipe AS pipe_column_value,
-    fittings AS fittings_column_value,
-    {', '.join(original_cols)},
-    CASE
-        WHEN final_category='pipe' AND (LOWER(pipe) NOT IN ('y','1','true')) 
-            THEN 'Should be marked as pipe but pipe column is not true'
-        WHEN final_category='fitting' AND (LOWER(fittings) NOT IN ('y','1','true')) 
-            THEN 'Should be marked as fitting but fittings column is not true'
-    END AS discrepancy_type
-FROM highest_category
-WHERE discrepancy_type IS NOT NULL
-ORDER BY row_number;
-"""
-
-# --- Execute query ---
-discrepancies_df = con.execute(sql).fetchdf()
-
-# --- Save to CSV ---
-discrepancies_df.to_csv("/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/pipe_fitting_discrepancies_duckdb.csv", index=False)
-
-print(f"Validation complete. Found {len(discrepancies_df)} discrepancies.")
+    LEFT JOIN _catalog_matches m ON m.row_id = t.{row_id}
+    LEFT JOIN item_description_keywords k ON k.item_description = t.item_description
+    WHERE discrepancy_type IS NOT NULL
+    ORDER BY row_number
+    """
+    return con.execute(sql).fetchdf()
+
+
+if __name__ == "__main__":
+    # --- Connect to DuckDB ---
+    con = duckdb.connect(database_file)
+
+    # --- Execute query ---
+    discrepancies_df = find_pipe_fitting_discrepancies(con)
+
+    # --- Save to CSV ---
+    discrepancies_df.to_csv(output_csv, index=False)
+
+    print(f"Validation complete. Found {len(discrepancies_df)} discrepancies.")
+    con.close()
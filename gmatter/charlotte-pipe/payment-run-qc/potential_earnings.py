@@ -0,0 +1,252 @@
+"""
+Potential-earnings calculator for contractor_transactions.
+
+Computes potential earnings for a whole payment run in one DuckDB query:
+transactions are joined to the local program material catalog
+(shared/material_catalog.py, synced by materials_data.py) on their normalized
+item_sku / item_upc / item_sku_alt, exclusions are applied (exclude = "Y" or a
+description containing an exclusion term, same terms as contractor_exclusions.py)
+and earnings are
+
+    extended_price × rate_pct / 100  +  ship_quantity × rate_per_unit
+
+Rows that are excluded or not in the catalog earn 0. Catalog rows without a
+rate fall back to CATEGORY_RATES (percent, by pipe / fitting category). A run
+is refused when neither the catalog (RATE_PCT_FIELD / RATE_PER_UNIT_FIELD in
+shared/material_catalog.py) nor CATEGORY_RATES supplies any rate, and codes
+left without a rate are reported before the run.
+
+Each run is reproducible: the rates used are snapshotted in
+earnings_run_rates, the run's inputs (catalog signature, exclusion terms,
+category rates, transaction fingerprint) go to earnings_runs, and the
+per-row results to potential_earnings — all under one run_id, in one
+transaction. The run's results are also written to output_csv.
+
+Run with:  python potential_earnings.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import duckdb
+
+from contractor_exclusions import load_exclusion_terms
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from material_catalog import (CODES_TABLE, NORMALIZE_CODE_MACRO, TRANSACTION_CODE_COLUMNS, catalog_available,
+                              catalog_signature)
+
+# --- Configuration ---
+database_file = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
+table_name = "contractor_transactions"
+output_csv = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs/potential_earnings.csv"
+
+# Fallback rate (percent of extended_price) when the catalog has no rate for a material
+CATEGORY_RATES = {"pipe": None, "fitting": None}  # fill in
+
+
+def ensure_tables(con):
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS earnings_runs (
+            run_id            INTEGER PRIMARY KEY,
+            run_at            TIMESTAMP,
+            source_table      VARCHAR,
+            source_rows       BIGINT,
+            source_signature  VARCHAR,
+            catalog_signature VARCHAR,
+            exclusion_terms   VARCHAR,
+            category_rates    VARCHAR,
+            rows_earning      BIGINT,
+            total_earnings    DECIMAL(18, 2)
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS earnings_run_rates (
+            run_id        INTEGER,
+            code          VARCHAR,
+            category      VARCHAR,
+            rate_pct      DOUBLE,
+            rate_per_unit DOUBLE
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS potential_earnings (
+            run_id             INTEGER,
+            row_id             BIGINT,
+            file_name          VARCHAR,
+            contractor_name    VARCHAR,
+            item_description   VARCHAR,
+            material_code      VARCHAR,
+            category           VARCHAR,
+            excluded           BOOLEAN,
+            exclusion_reason   VARCHAR,
+            extended_price     DOUBLE,
+            ship_quantity      DOUBLE,
+            rate_pct           DOUBLE,
+            rate_per_unit      DOUBLE,
+            potential_earnings DECIMAL(18, 2)
+        )
+    """)
+
+
+def optional_column(columns, name, cast=None):
+    """Column reference, or a typed NULL when the table doesn't have it."""
+    if name not in columns:
+        return f"CAST(NULL AS {cast or 'VARCHAR'}) AS {name}"
+    if cast == "DOUBLE":
+        return f"TRY_CAST(REPLACE(CAST({name} AS VARCHAR), ',', '') AS DOUBLE) AS {name}"
+    return name
+
+
+def earnings_sql(table_name, columns, run_id):
+    """
+    INSERT … SELECT computing every row's earnings for run_id from the run's
+    rate snapshot and the _exclusion_terms temp table.
+    """
+    code_columns = [c for c in TRANSACTION_CODE_COLUMNS if c in columns]
+    unpivot = " UNION ALL ".join(
+        f"SELECT row_id, {i} AS priority, normalize_code({col}) AS code FROM tx"
+        for i, col in enumerate(code_columns)
+    ) or "SELECT NULL::BIGINT AS row_id, 0 AS priority, NULL::VARCHAR AS code WHERE FALSE"
+
+    return f"""
+        INSERT INTO potential_earnings
+        WITH tx AS (
+            SELECT rowid AS row_id,
+                   {optional_column(columns, 'file_name')},
+                   {optional_column(columns, 'contractor_name')},
+                   {optional_column(columns, 'item_description')},
+                   {optional_column(columns, 'exclude')},
+                   {optional_column(columns, 'extended_price', 'DOUBLE')},
+                   {optional_column(columns, 'ship_quantity', 'DOUBLE')}
+                   {''.join(f', {c}' for c in code_columns)}
+            FROM {table_name}
+        ),
+        matched AS (
+            SELECT c.row_id, r.code, r.category, r.rate_pct, r.rate_per_unit
+            FROM ({unpivot}) c
+            JOIN earnings_run_rates r ON r.run_id = {run_id} AND r.code = c.code
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY c.row_id ORDER BY c.priority) = 1
+        ),
+        term_match AS (
+            SELECT tx.row_id, t.term
+            FROM tx
+            JOIN _exclusion_terms t
+              ON contains(LOWER(COALESCE(CAST(tx.item_description AS VARCHAR), '')), t.term_lower)
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY tx.row_id ORDER BY t.term_order) = 1
+        ),
+        scored AS (
+            SELECT tx.*, m.code, m.category, m.rate_pct, m.rate_per_unit,
+                   CASE
+                       WHEN UPPER(TRIM(COALESCE(CAST(tx.exclude AS VARCHAR), ''))) = 'Y' THEN 'exclude = Y'
+                       WHEN e.term IS NOT NULL THEN 'term: ' || e.term
+                   END AS exclusion_reason
+            FROM tx
+            LEFT JOIN matched m USING (row_id)
+            LEFT JOIN term_match e USING (row_id)
+        )
+        SELECT {run_id}, row_id, file_name, contractor_name, item_description,
+               code, category,
+               exclusion_reason IS NOT NULL,
+               exclusion_reason,
+               extended_price, ship_quantity, rate_pct, rate_per_unit,
+               CASE
+                   WHEN exclusion_reason IS NOT NULL OR code IS NULL THEN 0
+                   ELSE ROUND(COALESCE(extended_price * rate_pct / 100, 0)
+                              + COALESCE(ship_quantity * rate_per_unit, 0), 2)
+               END
+        FROM scored
+        ORDER BY row_id
+    """
+
+
+def check_rates(con, fallback_sql):
+    """
+    Refuse a run where no catalog code has a rate (rate fields not configured
+    and no CATEGORY_RATES), and warn about codes that will earn 0 for lack of one.
+    """
+    codes, unrated = con.execute(f"""
+        SELECT COUNT(*),
+               COUNT(*) FILTER (WHERE rate_pct IS NULL AND rate_per_unit IS NULL AND ({fallback_sql}) IS NULL)
+        FROM {CODES_TABLE}
+    """).fetchone()
+    if unrated == codes:
+        raise RuntimeError(
+            f"None of the {codes:,} catalog code(s) has a rate, so every row would earn 0. Set RATE_PCT_FIELD / "
+            f"RATE_PER_UNIT_FIELD in shared/material_catalog.py and re-run materials_data.py, or set CATEGORY_RATES."
+        )
+    if unrated:
+        print(f"⚠️  {unrated:,} of {codes:,} catalog code(s) have no rate and no category fallback — "
+              f"their rows earn 0")
+
+
+def calculate_potential_earnings(db_path=database_file, table=table_name, output=output_csv,
+                                 category_rates=None, exclusion_terms=None):
+    """
+    Compute a new earnings run over `table` and write it to `output`.
+    Returns the run_id.
+    """
+    category_rates = CATEGORY_RATES if category_rates is None else category_rates
+
+    con = duckdb.connect(db_path)
+    try:
+        if not catalog_available(con):
+            raise RuntimeError(f"{CODES_TABLE} not found — run endpoint-data/materials_data.py first")
+
+        ensure_tables(con)
+        con.execute(NORMALIZE_CODE_MACRO)
+        load_exclusion_terms(con, exclusion_terms=exclusion_terms)
+        columns = {row[1] for row in con.execute(f"PRAGMA table_info('{table}')").fetchall()}
+
+        fallback = " ".join(
+            f"WHEN '{category}' THEN {float(rate)}"
+            for category, rate in category_rates.items() if rate is not None
+        )
+        fallback_sql = f"CASE category {fallback} END" if fallback else "NULL"
+        check_rates(con, fallback_sql)
+        fingerprint_columns = ", ".join(f'"{c}"' for c in sorted(columns))
+        terms = [row[0] for row in con.execute("SELECT term FROM _exclusion_terms ORDER BY term_order").fetchall()]
+
+        con.execute("BEGIN TRANSACTION")
+        try:
+            run_id = con.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM earnings_runs").fetchone()[0]
+            con.execute(f"""
+                INSERT INTO earnings_run_rates
+                SELECT {run_id}, code, category,
+                       CASE WHEN rate_pct IS NULL AND rate_per_unit IS NULL THEN {fallback_sql} ELSE rate_pct END,
+                       rate_per_unit
+                FROM {CODES_TABLE}
+            """)
+            con.execute(earnings_sql(table, columns, run_id))
+            source_rows, source_signature = con.execute(f"""
+                SELECT COUNT(*), CAST(COALESCE(SUM(hash({fingerprint_columns})), 0) AS VARCHAR) FROM {table}
+            """).fetchone()
+            rows_earning, total = con.execute(f"""
+                SELECT COUNT(*) FILTER (WHERE potential_earnings > 0), COALESCE(SUM(potential_earnings), 0)
+                FROM potential_earnings WHERE run_id = {run_id}
+            """).fetchone()
+            con.execute("INSERT INTO earnings_runs VALUES (?, now(), ?, ?, ?, ?, ?, ?, ?, ?)", [
+                run_id, table, source_rows, source_signature, catalog_signature(con),
+                json.dumps(terms), json.dumps(category_rates, sort_keys=True), rows_earning, total,
+            ])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+        csv_path = str(output).replace("'", "''")
+        con.execute(f"""
+            COPY (SELECT * EXCLUDE (run_id) FROM potential_earnings WHERE run_id = {run_id} ORDER BY row_id)
+            TO '{csv_path}' (HEADER, DELIMITER ',')
+        """)
+        print(f"Earnings run {run_id}: {source_rows:,} row(s), {rows_earning:,} earning, total {total:,.2f}")
+        print(f"Results written to {output}")
+    finally:
+        con.close()
+
+    return run_id
+
+
+if __name__ == "__main__":
+    calculate_potential_earnings()
@@ -0,0 +1,395 @@
+"""
+QC runner for contractor_transactions.
+
+Reads the table once: the columns every registered check needs are projected
+into a temporary scan table (_qc_scan, with a stable row_id), and each check
+is then evaluated against that in-memory copy instead of scanning the DuckDB
+file again. All reports are written from the same pass, along with a timing
+report (qc_timings.csv) with the scan time and per-check time / issue count.
+
+Incremental mode (the default when run as a script) keeps QC state in the
+DuckDB file:
+
+    qc_row_state        — (check, content hash) of every row each row-level
+                          check has already evaluated
+    qc_issues_<check>   — stored issues of each row-level check, by row hash
+    qc_runs             — one row per run (the watermark: rules signature,
+                          rows scanned / checked / removed)
+
+Each run hashes the columns the checks read, evaluates each row-level check
+only on rows whose hash that check has not evaluated yet, drops state for
+rows that no longer exist, and rebuilds the reports from the stored issues —
+so after correcting and reloading a few files only those rows are
+re-checked. State is kept per check: a check that errors records nothing and
+sees the same rows again next run, while the others move on. The new issues,
+the row state and the qc_runs row of a run are committed in one transaction.
+
+Changing the check rules (exclusion terms, keywords, the material catalog,
+the set of checks) changes the rules signature and forces a full re-check;
+so does --full.
+
+Add a check by subclassing QCCheck and calling register_check() — or by
+passing checks=[...] to run_qc().
+
+Run with:  python qc_runner.py [--full]
+"""
+
+import hashlib
+import sys
+from abc import ABC, abstractmethod
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import duckdb
+import pandas as pd
+
+from contractor_exclusions import exclusion_issues_sql, load_exclusion_terms
+from pipe_fitting_category import find_pipe_fitting_discrepancies, keywords, original_cols
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from material_catalog import TRANSACTION_CODE_COLUMNS, catalog_signature
+
+# --- Configuration ---
+database_file = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/charlotte_pipe.duckdb"
+table_name = "contractor_transactions"
+output_dir = "/Users/lorimartella/Documents/gmatter/charlotte_pipe/cpf_python_scripts/outputs"
+
+SCAN_TABLE = "_qc_scan"
+DELTA_TABLE = "_qc_delta"
+
+# Bump when check logic changes in a way the rules signature can't see.
+# (2: row state kept per check)
+QC_VERSION = 2
+
+
+class QCCheck(ABC):
+    """
+    A check evaluated over the shared scan table.
+
+    name           — label used in logs, the timing report and qc_issues_<name>
+    output_csv     — report file name, written to the runner's output_dir
+    columns        — source columns the check needs (projected into the scan)
+    optional_columns — columns projected when the table has them
+    row_id_column  — column of the result holding the scan row_id; set for
+                     row-level checks, which can then run incrementally.
+                     None means the check aggregates and always sees the full scan.
+    report_row_id  — keep row_id_column in the written report
+    """
+
+    name = ""
+    output_csv = ""
+    columns: List[str] = []
+    optional_columns: List[str] = []
+    row_id_column: Optional[str] = None
+    report_row_id = True
+
+    def signature(self, con) -> str:
+        """Text that changes whenever the check's rules change."""
+        return ""
+
+    @abstractmethod
+    def run(self, con, scan_table: str) -> pd.DataFrame:
+        """The check's report, evaluated over scan_table."""
+
+
+class ExclusionsCheck(QCCheck):
+    name = "exclusions"
+    output_csv = "03_exclusions.csv"
+    columns = ["contractor_name", "file_name", "item_description", "exclude", "potential_earnings"]
+    row_id_column = "row_id"
+    report_row_id = False
+
+    def __init__(self, terms_table="exclusion_terms", exclusion_terms=None):
+        self.terms_table = terms_table
+        self.exclusion_terms = exclusion_terms
+
+    def signature(self, con):
+        load_exclusion_terms(con, self.terms_table, self.exclusion_terms)
+        terms = con.execute("SELECT term FROM _exclusion_terms ORDER BY term_order").fetchall()
+        return "|".join(t[0] for t in terms)
+
+    def run(self, con, scan_table):
+        load_exclusion_terms(con, self.terms_table, self.exclusion_terms)
+        return con.execute(exclusion_issues_sql(scan_table, row_id="row_id", include_row_id=True)).df()
+
+
+class PipeFittingCheck(QCCheck):
+    name = "pipe_fitting"
+    output_csv = "pipe_fitting_discrepancies_duckdb.csv"
+    columns = ["contractor_name", "item_description", *original_cols]
+    optional_columns = TRANSACTION_CODE_COLUMNS
+    row_id_column = "row_number"
+
+    def signature(self, con):
+        return f"{keywords!r}|catalog:{catalog_signature(con)}"
+
+    def run(self, con, scan_table):
+        return find_pipe_fitting_discrepancies(con, scan_table, row_id="row_id")
+
+
+class FileCountsCheck(QCCheck):
+    name = "file_counts"
+    output_csv = "file_counts.csv"
+    columns = ["file_name"]
+
+    def run(self, con, scan_table):
+        return con.execute(f"""
+            SELECT TRIM(file_name) AS file_name, COUNT(*) AS row_count
+            FROM {scan_table}
+            WHERE file_name IS NOT NULL
+            GROUP BY 1
+            ORDER BY 1
+        """).df()
+
+
+QC_CHECKS: List[QCCheck] = [ExclusionsCheck(), PipeFittingCheck(), FileCountsCheck()]
+
+
+def register_check(check: QCCheck):
+    """Add a check to the default set run by run_qc()."""
+    QC_CHECKS.append(check)
+
+
+# ============================================================
+# INCREMENTAL STATE
+# ============================================================
+
+def _ensure_state_tables(con):
+    columns = {row[1] for row in con.execute("PRAGMA table_info('qc_row_state')").fetchall()} \
+        if _table_exists(con, "qc_row_state") else set()
+    if columns and "check_name" not in columns:
+        # Shared row state from QC_VERSION 1; the version bump forces a full re-check
+        con.execute("DROP TABLE qc_row_state")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS qc_row_state (
+            check_name VARCHAR,
+            row_hash   VARCHAR,
+            checked_at TIMESTAMP,
+            PRIMARY KEY (check_name, row_hash)
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS qc_runs (
+            run_at          TIMESTAMP,
+            rules_signature VARCHAR,
+            rows_scanned    BIGINT,
+            rows_checked    BIGINT,
+            rows_removed    BIGINT
+        )
+    """)
+
+
+def _reset_state(con, checks):
+    con.execute("DELETE FROM qc_row_state")
+    for check in checks:
+        con.execute(f"DROP TABLE IF EXISTS qc_issues_{check.name}")
+
+
+def _delta_table(check) -> str:
+    return f"{DELTA_TABLE}_{check.name}"
+
+
+def _store_issues(con, check, report: pd.DataFrame):
+    """Append a delta result to qc_issues_<check>, keyed by row_hash instead of row_id."""
+    issues_table = f"qc_issues_{check.name}"
+    report = report.copy()
+    report["_seq"] = range(len(report))
+    con.register("_qc_new_issues", report)
+    con.execute(f"""
+        CREATE OR REPLACE TEMPORARY TABLE _qc_new_issues_hashed AS
+        SELECT d.row_hash, n.* EXCLUDE ("{check.row_id_column}")
+        FROM _qc_new_issues n
+        JOIN {_delta_table(check)} d ON d.row_id = n."{check.row_id_column}"
+    """)
+    con.unregister("_qc_new_issues")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {issues_table} AS SELECT * FROM _qc_new_issues_hashed LIMIT 0")
+    con.execute(f"INSERT INTO {issues_table} BY NAME SELECT * FROM _qc_new_issues_hashed")
+
+
+def _issues_report(con, check, columns: List[str]) -> pd.DataFrame:
+    """Stored issues joined to the current scan, in table order, with current row ids."""
+    issues_table = f"qc_issues_{check.name}"
+    select = []
+    for c in columns:
+        if c == check.row_id_column:
+            if check.report_row_id:
+                select.append(f's.row_id AS "{c}"')
+        else:
+            select.append(f'i."{c}"')
+    return con.execute(f"""
+        SELECT {', '.join(select)}
+        FROM {issues_table} i
+        JOIN {SCAN_TABLE} s USING (row_hash)
+        ORDER BY s.row_id, i._seq
+    """).df()
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def run_qc(db_path=database_file, out_dir=output_dir, checks: Optional[List[QCCheck]] = None,
+           table=table_name, incremental=False, full=False) -> pd.DataFrame:
+    """
+    Run every check from a single scan of `table`. Returns the timing report.
+    incremental=True re-checks only rows whose content hash is new (see module
+    docstring); full=True clears the stored state first.
+    """
+    checks = QC_CHECKS if checks is None else checks
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    con = duckdb.connect(db_path, read_only=not incremental)
+    timings = []
+
+    try:
+        available = {row[1] for row in con.execute(f"PRAGMA table_info('{table}')").fetchall()}
+
+        runnable = []
+        for check in checks:
+            missing = [c for c in check.columns if c not in available]
+            if missing:
+                print(f"⚠️  Skipping {check.name}: {table} is missing {', '.join(missing)}")
+                timings.append({"check": check.name, "seconds": None, "issues": None,
+                                "output": "", "status": f"skipped (missing {', '.join(missing)})"})
+            else:
+                runnable.append(check)
+
+        # --- Single scan: project every column the checks need ---
+        columns = list(dict.fromkeys(
+            c for check in runnable
+            for c in [*check.columns, *(o for o in check.optional_columns if o in available)]
+        ))
+        hash_expr = "md5(concat_ws(chr(31), {}))".format(
+            ", ".join(f"""COALESCE(CAST("{c}" AS VARCHAR), chr(0))""" for c in columns) or "''"
+        )
+        start = time.perf_counter()
+        con.execute(f"""
+            CREATE OR REPLACE TEMPORARY TABLE {SCAN_TABLE} AS
+            SELECT rowid AS row_id{''.join(f', "{c}"' for c in columns)}
+                   {f', {hash_expr} AS row_hash' if incremental else ''}
+            FROM {table}
+        """)
+        scan_rows = con.execute(f"SELECT COUNT(*) FROM {SCAN_TABLE}").fetchone()[0]
+        scan_seconds = time.perf_counter() - start
+        print(f"Scanned {scan_rows:,} rows from {table} in {scan_seconds:.2f}s")
+        timings.insert(0, {"check": "scan", "seconds": round(scan_seconds, 3), "issues": scan_rows,
+                           "output": "", "status": "ok"})
+
+        # --- Incremental: diff against the last run ---
+        checked_rows, removed_rows = scan_rows, 0
+        if incremental:
+            _ensure_state_tables(con)
+            signature = hashlib.md5("\n".join(
+                [f"v{QC_VERSION}", *columns, *(f"{c.name}:{c.signature(con)}" for c in runnable)]
+            ).encode()).hexdigest()
+            last = con.execute("SELECT rules_signature FROM qc_runs ORDER BY run_at DESC LIMIT 1").fetchone()
+            if full or not last or last[0] != signature:
+                print("Full re-check" + ("" if full or not last else " (check rules changed)"))
+                _reset_state(con, runnable)
+
+            removed_rows = con.execute(f"""
+                SELECT COUNT(DISTINCT row_hash) FROM qc_row_state
+                WHERE row_hash NOT IN (SELECT row_hash FROM {SCAN_TABLE})
+            """).fetchone()[0]
+            con.execute(f"DELETE FROM qc_row_state WHERE row_hash NOT IN (SELECT row_hash FROM {SCAN_TABLE})")
+            for check in runnable:
+                if check.row_id_column and _table_exists(con, f"qc_issues_{check.name}"):
+                    con.execute(f"""
+                        DELETE FROM qc_issues_{check.name}
+                        WHERE row_hash NOT IN (SELECT row_hash FROM {SCAN_TABLE})
+                    """)
+
+            # Per row-level check: one representative row per hash it hasn't evaluated
+            checked_rows = 0
+            for check in runnable:
+                if not check.row_id_column:
+                    continue
+                con.execute(f"""
+                    CREATE OR REPLACE TEMPORARY TABLE {_delta_table(check)} AS
+                    SELECT * FROM {SCAN_TABLE}
+                    WHERE row_hash NOT IN (SELECT row_hash FROM qc_row_state WHERE check_name = ?)
+                    QUALIFY ROW_NUMBER() OVER (PARTITION BY row_hash ORDER BY row_id) = 1
+                """, [check.name])
+                delta_rows = con.execute(f"SELECT COUNT(*) FROM {_delta_table(check)}").fetchone()[0]
+                checked_rows = max(checked_rows, delta_rows)
+            print(f"  {checked_rows:,} new or changed row(s) to check, {removed_rows:,} removed")
+
+        # --- Evaluate each check against the scan ---
+        # Row-level results of an incremental run are stored first (pending) and
+        # their reports rebuilt from the stored issues afterwards.
+        pending = []
+        for check in runnable:
+            start = time.perf_counter()
+            output_path = out_dir / check.output_csv
+            entry = {"check": check.name, "seconds": None, "issues": None,
+                     "output": str(output_path), "status": "ok"}
+            deferred = False
+            try:
+                if incremental and check.row_id_column:
+                    pending.append((check, check.run(con, _delta_table(check)), entry))
+                    deferred = True
+                else:
+                    report = check.run(con, SCAN_TABLE)
+                    if check.row_id_column and not check.report_row_id:
+                        report = report.drop(columns=[check.row_id_column])
+                    report.to_csv(output_path, index=False)
+                    entry["issues"] = len(report)
+            except Exception as e:
+                entry["status"] = f"error: {e}"
+            entry["seconds"] = round(time.perf_counter() - start, 3)
+            timings.append(entry)
+            if not deferred:
+                _print_check(entry)
+
+        if incremental:
+            # A check that errored stores nothing, so its rows stay unchecked
+            con.execute("BEGIN TRANSACTION")
+            try:
+                for check, delta, _ in pending:
+                    _store_issues(con, check, delta)
+                    con.execute(f"""
+                        INSERT OR IGNORE INTO qc_row_state
+                        SELECT ?, row_hash, now() FROM {_delta_table(check)}
+                    """, [check.name])
+                con.execute("INSERT INTO qc_runs VALUES (now(), ?, ?, ?, ?)",
+                            [signature, scan_rows, checked_rows, removed_rows])
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+
+            for check, delta, entry in pending:
+                start = time.perf_counter()
+                try:
+                    report = _issues_report(con, check, list(delta.columns))
+                    report.to_csv(entry["output"], index=False)
+                    entry["issues"] = len(report)
+                except Exception as e:
+                    entry["status"] = f"error: {e}"
+                entry["seconds"] = round(entry["seconds"] + time.perf_counter() - start, 3)
+                _print_check(entry)
+    finally:
+        con.close()
+
+    timings_df = pd.DataFrame(timings, columns=["check", "seconds", "issues", "output", "status"])
+    timings_df.to_csv(out_dir / "qc_timings.csv", index=False)
+    print(f"QC complete. Reports and timings written to {out_dir}")
+    return timings_df
+
+
+def _print_check(entry):
+    issues = entry["issues"] if entry["issues"] is not None else '-'
+    print(f"  {entry['check']}: {issues} row(s) in {entry['seconds']:.2f}s"
+          f"{'' if entry['status'] == 'ok' else ' — ' + entry['status']}")
+
+
+def _table_exists(con, name) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+if __name__ == "__main__":
+    run_qc(incremental=True, full="--full" in sys.argv[1:])
@@ -0,0 +1,578 @@
+"""
+Streaming ingestion of large JSON API responses into DuckDB or Parquet.
+
+JsonRecordStream parses the response incrementally as it arrives — one
+record at a time, with a buffer that never holds more than the record being
+decoded plus one network chunk — so memory stays flat however large the
+extract is. It accepts the same shapes as materials_data.fetch_api_data: a
+top-level array, an object holding the array under one of RECORD_ARRAY_KEYS,
+or a single object. It also tracks the byte offset just past the last record
+it yielded, so an interrupted download can be resumed there with an HTTP
+Range request (resume=True parses a stream that starts at such an offset).
+
+Records are grouped into Arrow record batches (BATCH_RECORDS each) whose
+schema is inferred from the JSON values and evolves as the stream goes on:
+
+  • a column seen for the first time is added;
+  • a column that was all-null takes the first real type it gets;
+  • integers widen to floats, and any other conflict widens to text.
+
+Nested lists / objects are stored as JSON text (as in material_catalog).
+
+Sinks:
+  DuckDBSink   — writes into <table>__staging and swaps it in for <table> in
+                 one transaction on commit(); readers never see a half load.
+  ParquetSink  — writes one part-NNNNN.parquet file per batch into <dir>.tmp,
+                 which replaces <dir> on commit(). Parts may differ in schema,
+                 so read the folder with
+                 read_parquet('<dir>/*.parquet', union_by_name = true).
+
+Part files written by separate ParquetSinks (e.g. one per fetch partition)
+are combined with load_parquet_parts (into a DuckDB table, in one swap) or
+publish_parquet_parts (into one Parquet folder).
+
+Checkpoints: a sink opened with resume=True keeps what it has written when a
+load fails, and stores a checkpoint with every batch atomically — in the same
+DuckDB transaction as the rows, or after the part file is in place. Opening
+it again with resume=True carries on from the last checkpoint (sink.rows
+records, sink.checkpoint holding whatever the caller saved with them).
+"""
+
+import codecs
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Keys that hold the record array when the response is an object
+RECORD_ARRAY_KEYS = ("data", "results", "items", "records", "list")
+BATCH_RECORDS = 10_000
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}:"
+_decoder = json.JSONDecoder()
+
+
+class TruncatedJSONError(ValueError):
+    """The stream ended in the middle of the JSON document."""
+
+
+# ============================================================
+# INCREMENTAL PARSING
+# ============================================================
+
+def decode_chunks(byte_chunks: Iterable[bytes], on_bytes: Optional[Callable[[int], None]] = None,
+                  encoding: str = "utf-8") -> Iterator[str]:
+    """Decode a byte stream to text (multi-byte characters may span chunks)."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        if not chunk:
+            continue
+        if on_bytes:
+            on_bytes(len(chunk))
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _Buffer:
+    """Text buffer over a chunk iterator, trimmed as values are consumed."""
+
+    def __init__(self, chunks: Iterable[str], encoding: str = "utf-8", start_offset: int = 0):
+        self._chunks = iter(chunks)
+        self.encoding = encoding
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        # Bytes of the stream before text[_mark]
+        self._mark = 0
+        self._mark_bytes = start_offset
+
+    def offset(self) -> int:
+        """Byte offset of the current position in the stream."""
+        seg = self.text[self._mark:self.pos]
+        self._mark_bytes += len(seg) if seg.isascii() else len(seg.encode(self.encoding))
+        self._mark = self.pos
+        return self._mark_bytes
+
+    def more(self) -> bool:
+        """Read another chunk; False at the end of the stream."""
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.offset()
+        self.text = self.text[self.pos:] + chunk
+        self.pos = self._mark = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the stream)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            if not found:
+                raise TruncatedJSONError(f"Stream ended early: expected {char!r}")
+            raise ValueError(f"Invalid JSON: expected {char!r}, got {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        if not self.peek():
+            raise TruncatedJSONError("Stream ended early: expected a value")
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                if self.more():
+                    continue
+                raise TruncatedJSONError(f"Stream ended early: {e}") from e
+            # A number or literal is complete only once a delimiter follows it
+            # ("4" may be the start of "4.5e3" in the next chunk)
+            if self.text[self.pos] not in '{["' and (end == len(self.text) or self.text[end] not in _DELIMITERS):
+                if self.more():
+                    continue
+            self.pos = end
+            return value
+
+
+def _iter_array(buf: _Buffer, continuing: bool = False) -> Iterator[Any]:
+    """Array elements; continuing=True starts just after an element, before its separator."""
+    if not continuing:
+        buf.expect("[")
+        if buf.peek() == "]":
+            buf.pos += 1
+            return
+        yield buf.value()
+    while True:
+        sep = buf.peek()
+        if not sep:
+            raise TruncatedJSONError("Stream ended early: expected ',' or ']' in array")
+        buf.pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"Invalid JSON: expected ',' or ']' in array, got {sep!r}")
+        yield buf.value()
+
+
+class JsonRecordStream:
+    """
+    Records of a JSON response, yielded one at a time while it streams in.
+
+    offset is the byte offset just past the last record yielded, and in_object
+    tells whether the records are an array inside an object. A stream that
+    was cut off can be re-requested from that offset and parsed with
+    JsonRecordStream(chunks, start_offset=offset, resume=True, in_object=...);
+    the rest of the document, up to the object's closing brace, is still
+    checked.
+    """
+
+    def __init__(self, text_chunks: Iterable[str], array_keys: Tuple[str, ...] = RECORD_ARRAY_KEYS,
+                 encoding: str = "utf-8", start_offset: int = 0, resume: bool = False, in_object: bool = False):
+        self._buf = _Buffer(text_chunks, encoding, start_offset)
+        self.array_keys = array_keys
+        self.resume = resume
+        self.in_object = in_object
+        self.offset = start_offset
+
+    def _records(self) -> Iterator[Any]:
+        buf = self._buf
+        if self.resume:
+            yield from _iter_array(buf, continuing=True)
+            if self.in_object:
+                if buf.peek() == ",":
+                    buf.pos += 1
+                yield from self._members(buf, streamed=True)
+            return
+        first = buf.peek()
+        if first == "[":
+            yield from _iter_array(buf)
+            return
+        if first != "{":
+            if not first:
+                raise TruncatedJSONError("Stream ended early: empty response")
+            raise ValueError(f"Expected a JSON array or object, got {first!r}")
+        buf.expect("{")
+        yield from self._members(buf, streamed=False)
+
+    def _members(self, buf: _Buffer, streamed: bool) -> Iterator[Any]:
+        """
+        Object members up to the closing brace: streams the first record array
+        found (unless already streamed) and keeps the other (small) fields.
+        Parsing goes on to the brace, so a cut after the array is still caught.
+        """
+        fields: Dict[str, Any] = {}
+        while buf.peek() != "}":
+            key = buf.value()
+            buf.expect(":")
+            if not streamed and key in self.array_keys and buf.peek() == "[":
+                self.in_object = True
+                yield from _iter_array(buf)
+                streamed = True
+            else:
+                fields[key] = buf.value()
+            if buf.peek() == ",":
+                buf.pos += 1
+        buf.expect("}")
+        if not streamed:
+            # No record array: the object itself is the only record
+            yield fields
+
+    def __iter__(self) -> Iterator[Any]:
+        for record in self._records():
+            self.offset = self._buf.offset()
+            yield record
+
+
+def iter_json_records(text_chunks: Iterable[str], array_keys: Tuple[str, ...] = RECORD_ARRAY_KEYS) -> Iterator[Any]:
+    """Yield the records of a JSON response one at a time while it streams in."""
+    yield from JsonRecordStream(text_chunks, array_keys)
+
+
+# ============================================================
+# ARROW BATCHES WITH SCHEMA EVOLUTION
+# ============================================================
+
+_TYPES_BY_NAME = {str(t): t for t in (pa.null(), pa.int64(), pa.float64(), pa.bool_(), pa.string())}
+
+
+def _json_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _column(values: List) -> pa.Array:
+    """Arrow array for one column of a batch; mixed types become text."""
+    values = [json.dumps(v) if isinstance(v, (list, dict)) else v for v in values]
+    try:
+        arr = pa.array(values)
+        if str(arr.type) in _TYPES_BY_NAME:
+            return arr
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        pass
+    return pa.array([_json_text(v) for v in values], pa.string())
+
+
+def _widen(old: pa.DataType, new: pa.DataType) -> pa.DataType:
+    if pa.types.is_null(new) or old == new:
+        return old
+    if pa.types.is_null(old):
+        return new
+    if {old, new} == {pa.int64(), pa.float64()}:
+        return pa.float64()
+    return pa.string()
+
+
+def _cast(arr: pa.Array, dtype: pa.DataType) -> pa.Array:
+    if arr.type == dtype:
+        return arr
+    if pa.types.is_string(dtype) and not pa.types.is_null(arr.type):
+        return pa.array([_json_text(v) for v in arr.to_pylist()], pa.string())
+    return arr.cast(dtype)
+
+
+class SchemaTracker:
+    """Column types seen so far; each batch may add or widen columns."""
+
+    def __init__(self, type_names: Optional[Dict[str, str]] = None):
+        self.types: Dict[str, pa.DataType] = {
+            name: _TYPES_BY_NAME[t] for name, t in (type_names or {}).items()
+        }
+
+    def type_names(self) -> Dict[str, str]:
+        """The schema as {column: type name}, for checkpoints."""
+        return {name: str(dtype) for name, dtype in self.types.items()}
+
+    def batch(self, records: List[Dict]) -> Tuple[pa.RecordBatch, Dict[str, pa.DataType]]:
+        """
+        (record batch typed by the evolved schema, {column: type} for columns
+        added or retyped by this batch).
+        """
+        names: Dict[str, None] = {}
+        for record in records:
+            names.update(dict.fromkeys(record))
+
+        arrays = {name: _column([r.get(name) for r in records]) for name in names}
+        changes = {}
+        for name, arr in arrays.items():
+            old = self.types.get(name)
+            dtype = arr.type if old is None else _widen(old, arr.type)
+            if old is None or dtype != old:
+                self.types[name] = dtype
+                changes[name] = dtype
+
+        columns = [
+            _cast(arrays[name], dtype) if name in arrays else pa.nulls(len(records), dtype)
+            for name, dtype in self.types.items()
+        ]
+        return pa.RecordBatch.from_arrays(columns, schema=pa.schema(list(self.types.items()))), changes
+
+
+def iter_record_batches(records: Iterable[Any], tracker: SchemaTracker,
+                        batch_records: int = BATCH_RECORDS) -> Iterator[Tuple[pa.RecordBatch, Dict]]:
+    batch: List[Dict] = []
+    for record in records:
+        batch.append(record if isinstance(record, dict) else {"value": record})
+        if len(batch) >= batch_records:
+            yield tracker.batch(batch)
+            batch = []
+    if batch:
+        yield tracker.batch(batch)
+
+
+# ============================================================
+# SINKS
+# ============================================================
+
+# All-null columns are created as text; ALTER ... TYPE retypes them once values arrive
+DUCKDB_TYPES = {
+    pa.null(): "VARCHAR", pa.int64(): "BIGINT", pa.float64(): "DOUBLE", pa.bool_(): "BOOLEAN", pa.string(): "VARCHAR",
+}
+
+
+def quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def write_json_atomic(path: Path, data: Dict):
+    """Write JSON to path via a synced temp file, so readers never see a partial file."""
+    tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class DuckDBSink:
+    """Loads batches into <table>__staging; commit() swaps it in for <table>."""
+
+    def __init__(self, con, table: str, resume: bool = False):
+        self.con = con
+        self.table = table
+        self.staging = f"{table}__staging"
+        self.checkpoint_table = f"{table}__checkpoint"
+        self.resumable = resume
+        self.con.execute(f"CREATE TABLE IF NOT EXISTS {self.checkpoint_table} (state VARCHAR)")
+        row = self.con.execute(f"SELECT state FROM {self.checkpoint_table}").fetchone()
+        staged = self.con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [self.staging]
+        ).fetchone()[0]
+        if resume and row and staged:
+            self.checkpoint = json.loads(row[0])
+            self.rows = self.checkpoint["rows"]
+            self.tracker = SchemaTracker(self.checkpoint["types"])
+            self._created = True
+        else:
+            self.reset()
+
+    def reset(self):
+        """Discard anything staged and start the load from scratch."""
+        self.con.execute(f"DROP TABLE IF EXISTS {self.staging}")
+        self.con.execute(f"DELETE FROM {self.checkpoint_table}")
+        self.checkpoint: Optional[Dict] = None
+        self.rows = 0
+        self.tracker = SchemaTracker()
+        self._created = False
+
+    def write(self, batch: pa.RecordBatch, changes: Dict[str, pa.DataType], state: Optional[Dict] = None):
+        """Append a batch; state, if given, is checkpointed in the same transaction."""
+        table = pa.Table.from_batches([batch])
+        for i, field in enumerate(table.schema):
+            if pa.types.is_null(field.type):
+                table = table.set_column(i, field.name, pa.nulls(table.num_rows, pa.string()))
+        checkpoint = None
+        self.con.register("_json_batch", table)
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            if not self._created:
+                self.con.execute(f"CREATE TABLE {self.staging} AS SELECT * FROM _json_batch")
+            else:
+                existing = {row[1] for row in self.con.execute(f"PRAGMA table_info('{self.staging}')").fetchall()}
+                for name, dtype in changes.items():
+                    sql_type = DUCKDB_TYPES[dtype]
+                    if name in existing:
+                        self.con.execute(f"ALTER TABLE {self.staging} ALTER COLUMN {quote_ident(name)} TYPE {sql_type}")
+                    else:
+                        self.con.execute(f"ALTER TABLE {self.staging} ADD COLUMN {quote_ident(name)} {sql_type}")
+                self.con.execute(f"INSERT INTO {self.staging} BY NAME SELECT * FROM _json_batch")
+            if state is not None:
+                checkpoint = {**state, "rows": self.rows + batch.num_rows, "types": self.tracker.type_names()}
+                self.con.execute(f"DELETE FROM {self.checkpoint_table}")
+                self.con.execute(f"INSERT INTO {self.checkpoint_table} VALUES (?)", [json.dumps(checkpoint)])
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+        finally:
+            self.con.unregister("_json_batch")
+        self._created = True
+        self.rows += batch.num_rows
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+
+    def commit(self):
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            self.con.execute(f"DROP TABLE IF EXISTS {self.table}")
+            if self._created:
+                self.con.execute(f"ALTER TABLE {self.staging} RENAME TO {self.table}")
+            self.con.execute(f"DROP TABLE {self.checkpoint_table}")
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+
+    def abort(self):
+        self.con.execute(f"DROP TABLE IF EXISTS {self.staging}")
+        self.con.execute(f"DROP TABLE IF EXISTS {self.checkpoint_table}")
+
+
+class ParquetSink:
+    """Writes part files into <dir>.tmp; commit() replaces <dir> with it."""
+
+    def __init__(self, directory: Path, resume: bool = False):
+        self.directory = Path(directory)
+        self.tmp_dir = self.directory.with_name(self.directory.name + ".tmp")
+        self.checkpoint_path = self.tmp_dir / "_checkpoint.json"
+        self.resumable = resume
+        checkpoint = None
+        if resume and self.checkpoint_path.exists():
+            try:
+                with open(self.checkpoint_path, encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                checkpoint = None
+        if checkpoint:
+            self.checkpoint = checkpoint
+            self.rows = checkpoint["rows"]
+            self.parts = checkpoint["parts"]
+            self.tracker = SchemaTracker(checkpoint["types"])
+            # Parts written after the last checkpoint are written again
+            for path in self.tmp_dir.glob("part-*"):
+                if path.name >= self._part_name(self.parts):
+                    path.unlink()
+        else:
+            self.reset()
+
+    @staticmethod
+    def _part_name(n: int) -> str:
+        return f"part-{n:05d}.parquet"
+
+    def reset(self):
+        """Discard anything written and start the load from scratch."""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.tmp_dir.mkdir(parents=True)
+        self.checkpoint: Optional[Dict] = None
+        self.rows = 0
+        self.parts = 0
+        self.tracker = SchemaTracker()
+
+    def write(self, batch: pa.RecordBatch, changes: Dict[str, pa.DataType], state: Optional[Dict] = None):
+        """Write a batch as the next part; state, if given, is checkpointed once the part is in place."""
+        path = self.tmp_dir / self._part_name(self.parts)
+        tmp_path = path.with_name(path.name + ".tmp")
+        pq.write_table(pa.Table.from_batches([batch]), str(tmp_path))
+        os.replace(tmp_path, path)
+        self.parts += 1
+        self.rows += batch.num_rows
+        if state is not None:
+            self.checkpoint = {**state, "rows": self.rows, "parts": self.parts, "types": self.tracker.type_names()}
+            write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+    def commit(self):
+        self.checkpoint_path.unlink(missing_ok=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.tmp_dir.replace(self.directory)
+
+    def abort(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def merged_types(parts: Iterable[Path]) -> Dict[str, pa.DataType]:
+    """Column types over several part files, widened as in SchemaTracker."""
+    types: Dict[str, pa.DataType] = {}
+    for part in parts:
+        for field in pq.read_schema(str(part)):
+            types[field.name] = _widen(types[field.name], field.type) if field.name in types else field.type
+    return types
+
+
+def load_parquet_parts(con, table: str, parts: List[Path]) -> int:
+    """
+    Replace `table` with the rows of the part files, in order, in one
+    transaction. Columns are cast to the merged types. Returns rows loaded
+    (0, leaving the table alone, if the parts hold no records).
+    """
+    types = merged_types(parts)
+    if not types:
+        # No records at all: leave the table as it is
+        return 0
+    files = ", ".join("'" + str(p).replace("'", "''") + "'" for p in parts)
+    columns = ", ".join(f"CAST({quote_ident(name)} AS {DUCKDB_TYPES[dtype]}) AS {quote_ident(name)}"
+                        for name, dtype in types.items())
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(
+            f"CREATE OR REPLACE TABLE {table} AS SELECT {columns} "
+            f"FROM read_parquet([{files}], union_by_name = true)"
+        )
+        rows = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return rows
+
+
+def publish_parquet_parts(parts: List[Path], directory: Path):
+    """Copy the part files, in order, into a fresh folder that replaces `directory`."""
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for n, part in enumerate(parts):
+        shutil.copyfile(part, tmp_dir / ParquetSink._part_name(n))
+    shutil.rmtree(directory, ignore_errors=True)
+    tmp_dir.replace(directory)
+
+
+def ingest_records(records: Iterable[Any], sink, batch_records: int = BATCH_RECORDS,
+                   on_batch: Optional[Callable[[int], None]] = None,
+                   checkpoint: Optional[Callable[[], Dict]] = None) -> int:
+    """
+    Write records to sink in evolving-schema batches and commit. Returns the
+    sink's total rows. checkpoint(), if given, is called after each batch and
+    its dict is stored with it. On failure a resumable sink keeps what it has
+    written; any other sink is aborted.
+    """
+    try:
+        for batch, changes in iter_record_batches(records, sink.tracker, batch_records):
+            sink.write(batch, changes, checkpoint() if checkpoint else None)
+            if on_batch:
+                on_batch(sink.rows)
+        sink.commit()
+    except BaseException:
+        if not sink.resumable:
+            sink.abort()
+        raise
+    return sink.rows
@@ -0,0 +1,191 @@
+"""
+Local copy of the Charlotte Pipe program material catalog
+(GET_ContractorDB_ContractorProgram_ContractorProgramMaterial) in DuckDB.
+
+Two tables, replaced together in one transaction:
+
+    program_materials  — the raw catalog records, every field as text
+    material_codes     — one row per normalized code (SKU, UPC, alt number)
+                         of every catalog material, with its program rates
+                         (rate_pct of extended price, rate_per_unit per
+                         shipped unit) and the catalog category (pipe /
+                         fitting, NULL when the catalog doesn't say)
+
+Codes are normalized by upper-casing, dropping everything but letters and
+digits, and stripping leading zeros (so "02-1234" and "021234" and UPCs with
+or without their leading 0 meet). A code that maps to both categories in the
+catalog keeps no category rather than a guessed one.
+
+Transactions are looked up with one hash join on the normalized code
+(catalog_matches_sql): item_sku first, then item_upc, then item_sku_alt.
+
+The catalog's field names vary between API versions, so the code and category
+fields are found from the candidate lists below (case and "_" insensitive).
+The rate fields are not guessed — a generic "Rate" read as the wrong kind of
+rate skews every earnings run — and are configured by name instead
+(RATE_PCT_FIELD / RATE_PER_UNIT_FIELD).
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+RAW_TABLE = "program_materials"
+CODES_TABLE = "material_codes"
+
+# Catalog field candidates, by role (first present field wins for category)
+SKU_FIELDS = ["MaterialNumber", "ItemNumber", "Sku", "PartNumber", "ProductNumber", "Material"]
+UPC_FIELDS = ["Upc", "UpcCode", "Gtin", "Ean"]
+ALT_FIELDS = ["AltItemNumber", "AlternateItemNumber", "AltSku", "AlternateSku", "CustomerItemNumber"]
+CATEGORY_FIELDS = ["ProductType", "MaterialType", "ProductCategory", "Category", "ItemType", "Type"]
+
+# Catalog fields holding the program rates (None: the catalog has no such rate)
+RATE_PCT_FIELD = None       # fill in: percent of extended price, e.g. "RebatePercent"
+RATE_PER_UNIT_FIELD = None  # fill in: dollars per shipped unit, e.g. "RebatePerUnit"
+
+# Transaction columns looked up against the catalog, in priority order
+TRANSACTION_CODE_COLUMNS = ["item_sku", "item_upc", "item_sku_alt"]
+
+NORMALIZE_CODE_MACRO = """
+    CREATE OR REPLACE TEMPORARY MACRO normalize_code(_code) AS
+    NULLIF(LTRIM(regexp_replace(UPPER(CAST(_code AS VARCHAR)), '[^A-Z0-9]', '', 'g'), '0'), '')
+"""
+
+
+def _key(name: str) -> str:
+    return name.replace("_", "").replace(" ", "").lower()
+
+
+def find_fields(columns: Iterable[str], candidates: List[str]) -> List[str]:
+    """Catalog columns matching the candidate names, in candidate order."""
+    columns = list(columns)
+    return [col for cand in candidates for col in columns if _key(col) == _key(cand)]
+
+
+def _number(fields: List[str]) -> str:
+    """SQL for the numeric value of the first field ("5%", "$1.20" → 5, 1.2), or NULL."""
+    if not fields:
+        return "CAST(NULL AS DOUBLE)"
+    return f"""TRY_CAST(NULLIF(regexp_replace("{fields[0]}", '[%$,\\s]', '', 'g'), '') AS DOUBLE)"""
+
+
+def records_frame(records: List[Dict]) -> pd.DataFrame:
+    """Catalog records as an all-text DataFrame (nested values as JSON)."""
+    columns = sorted({key for record in records if isinstance(record, dict) for key in record})
+
+    def text(value):
+        if value is None:
+            return None
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return str(value)
+
+    return pd.DataFrame(
+        [[text(record.get(col)) for col in columns] for record in records if isinstance(record, dict)],
+        columns=columns,
+    )
+
+
+def _configured_field(columns, name: Optional[str]) -> List[str]:
+    if name is None:
+        return []
+    found = find_fields(columns, [name])[:1]
+    if not found:
+        raise ValueError(f"Configured rate field '{name}' is not in the catalog (columns: {', '.join(columns)})")
+    return found
+
+
+def store_catalog(con, records: List[Dict], rate_pct_field: Optional[str] = RATE_PCT_FIELD,
+                  rate_per_unit_field: Optional[str] = RATE_PER_UNIT_FIELD) -> int:
+    """
+    Replace program_materials and material_codes from the API records.
+    Returns the number of codes indexed.
+    """
+    df = records_frame(records)
+    sku, upc, alt = (find_fields(df.columns, f) for f in (SKU_FIELDS, UPC_FIELDS, ALT_FIELDS))
+    category = find_fields(df.columns, CATEGORY_FIELDS)[:1]
+    rate_pct = _configured_field(df.columns, rate_pct_field)
+    rate_per_unit = _configured_field(df.columns, rate_per_unit_field)
+    if not (sku or upc or alt):
+        raise ValueError(f"Catalog has no recognizable code fields (columns: {', '.join(df.columns)})")
+    category_sql = f"""CASE
+                           WHEN LOWER("{category[0]}") LIKE '%fitting%' THEN 'fitting'
+                           WHEN LOWER("{category[0]}") LIKE '%pipe%' THEN 'pipe'
+                       END""" if category else "CAST(NULL AS VARCHAR)"
+
+    code_selects = [
+        f"""SELECT normalize_code("{col}") AS code, '{kind}' AS code_type, category, rate_pct, rate_per_unit
+            FROM raw"""
+        for kind, cols in (("sku", sku), ("upc", upc), ("alt", alt))
+        for col in cols
+    ]
+
+    con.execute(NORMALIZE_CODE_MACRO)
+    con.register("_catalog_records", df)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"CREATE OR REPLACE TABLE {RAW_TABLE} AS SELECT * FROM _catalog_records")
+        con.execute(f"""
+            CREATE OR REPLACE TABLE {CODES_TABLE} AS
+            WITH raw AS (
+                SELECT *,
+                       {category_sql} AS category,
+                       {_number(rate_pct)} AS rate_pct,
+                       {_number(rate_per_unit)} AS rate_per_unit
+                FROM {RAW_TABLE}
+            ),
+            codes AS ({' UNION ALL '.join(code_selects)})
+            SELECT code, MIN(code_type) AS code_type,
+                   CASE WHEN COUNT(DISTINCT category) = 1 THEN MIN(category) END AS category,
+                   MAX(rate_pct) AS rate_pct, MAX(rate_per_unit) AS rate_per_unit
+            FROM codes
+            WHERE code IS NOT NULL
+            GROUP BY code
+        """)
+        con.execute(f"CREATE UNIQUE INDEX {CODES_TABLE}_code ON {CODES_TABLE} (code)")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.unregister("_catalog_records")
+
+    return con.execute(f"SELECT COUNT(*) FROM {CODES_TABLE}").fetchone()[0]
+
+
+def catalog_available(con) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [CODES_TABLE]
+    ).fetchone()[0] > 0
+
+
+def catalog_signature(con) -> str:
+    """Changes whenever material_codes changes (used by incremental QC)."""
+    if not catalog_available(con):
+        return ""
+    count, digest = con.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(hash(code, category, rate_pct, rate_per_unit)), 0) FROM {CODES_TABLE}
+    """).fetchone()
+    return f"{count}:{digest}"
+
+
+def catalog_matches_sql(table_name: str, row_id: str, code_columns: Optional[List[str]] = None) -> str:
+    """
+    SQL returning (row_id, catalog_category, catalog_code) for rows of
+    table_name whose codes are in the catalog with a category — the first
+    code column in TRANSACTION_CODE_COLUMNS order that matches wins. Needs
+    normalize_code (NORMALIZE_CODE_MACRO) on the connection.
+    """
+    code_columns = code_columns or TRANSACTION_CODE_COLUMNS
+    unpivot = " UNION ALL ".join(
+        f"SELECT {row_id} AS row_id, {i} AS priority, normalize_code({col}) AS code FROM {table_name}"
+        for i, col in enumerate(code_columns)
+    )
+    return f"""
+        SELECT t.row_id, c.category AS catalog_category, c.code AS catalog_code
+        FROM ({unpivot}) t
+        JOIN {CODES_TABLE} c USING (code)
+        WHERE c.category IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY t.row_id ORDER BY t.priority) = 1
+    """
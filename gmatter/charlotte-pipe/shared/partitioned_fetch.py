@@ -0,0 +1,192 @@
+"""
+Partitioned, concurrent fetching of large Charlotte Pipe endpoint extracts.
+
+Instead of one long request, an extract is split into partitions — date
+windows, value ranges (contractor numbers, …), single values or pages;
+whatever query parameters the endpoint accepts. A partition is a dict
+{"name": ..., "params": {...}}; its params are added to the base params of
+every request.
+
+fetch_partitions runs one function per partition on a thread pool. Requests
+share one connection pool (make_session), each partition is retried on its
+own, so a timeout costs one partition rather than the whole pull, and
+throughput grows with the number of workers (mind the API's rate limits).
+
+Merging is up to the caller: materials_data concatenates the records in
+partition order; pos_data spools each partition to Parquet and loads them
+all in one swap.
+
+Partition specs (plan_partitions), as kept in a script's configuration:
+  {"by": "date",  "start": "2026-01-01", "end": "2026-06-30", "days": 7,
+   "start_param": "StartDate", "end_param": "EndDate"}
+  {"by": "range", "ranges": [[1, 4999], [5000, 9999]],
+   "low_param": "ContractorFrom", "high_param": "ContractorTo"}
+  {"by": "value", "param": "ContractorNumber", "values": ["1001", "1002"]}
+  {"by": "page",  "param": "Page", "pages": 20, "first": 1,
+   "size_param": "PageSize", "size": 5000}
+"""
+
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from json_ingest import TruncatedJSONError
+
+DEFAULT_WORKERS = 4
+# HTTP statuses worth retrying (rate limits, gateway hiccups)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+# ============================================================
+# PLANNING
+# ============================================================
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def date_windows(start, end, days: int, start_param: str, end_param: str, fmt: str = "%Y-%m-%d") -> List[Dict]:
+    """Consecutive windows of `days` days covering start..end, both ends inclusive."""
+    start, end = _as_date(start), _as_date(end)
+    partitions = []
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        partitions.append({
+            "name": f"{start:%Y-%m-%d}..{stop:%Y-%m-%d}",
+            "params": {start_param: start.strftime(fmt), end_param: stop.strftime(fmt)},
+        })
+        start = stop + timedelta(days=1)
+    return partitions
+
+
+def value_ranges(ranges: Iterable[Tuple[Any, Any]], low_param: str, high_param: str) -> List[Dict]:
+    """One partition per (low, high) pair, bounds as the endpoint defines them."""
+    return [{"name": f"{low}..{high}", "params": {low_param: low, high_param: high}} for low, high in ranges]
+
+
+def value_list(values: Iterable, param: str) -> List[Dict]:
+    return [{"name": str(v), "params": {param: v}} for v in values]
+
+
+def pages(count: int, param: str, first: int = 1, size_param: Optional[str] = None,
+          size: Optional[int] = None) -> List[Dict]:
+    extra = {size_param: size} if size_param and size else {}
+    return [{"name": f"page {n}", "params": {param: n, **extra}} for n in range(first, first + count)]
+
+
+def plan_partitions(spec: Optional[Dict]) -> List[Dict]:
+    """Partitions for a spec dict (see module docstring); no spec → the whole extract in one request."""
+    if not spec:
+        return [{"name": "all", "params": {}}]
+    by = spec["by"]
+    if by == "date":
+        return date_windows(spec["start"], spec["end"], spec.get("days", 7),
+                            spec["start_param"], spec["end_param"], spec.get("format", "%Y-%m-%d"))
+    if by == "range":
+        return value_ranges(spec["ranges"], spec["low_param"], spec["high_param"])
+    if by == "value":
+        return value_list(spec["values"], spec["param"])
+    if by == "page":
+        return pages(spec["pages"], spec["param"], spec.get("first", 1), spec.get("size_param"), spec.get("size"))
+    raise ValueError(f"Unknown partition type: {by!r}")
+
+
+def plan_key(endpoint_url: str, params: Optional[Dict], partitions: List[Dict]) -> str:
+    """Short hash identifying a partition plan (endpoint, base params, partitions)."""
+    blob = json.dumps([endpoint_url, params or {}, partitions], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+
+
+# ============================================================
+# FETCHING
+# ============================================================
+
+def make_session(workers: int = DEFAULT_WORKERS, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """Session whose connection pool is shared by `workers` threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_partition(session: requests.Session, endpoint_url: str, params: Optional[Dict], partition: Dict,
+                  stream: bool = True, timeout: int = 300) -> requests.Response:
+    response = session.get(
+        endpoint_url,
+        params={**(params or {}), **partition["params"]},
+        stream=stream,
+        timeout=(15, timeout),  # (connect timeout, read timeout)
+    )
+    response.raise_for_status()
+    return response
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUS
+    return isinstance(error, (
+        requests.exceptions.Timeout,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        TruncatedJSONError,
+    ))
+
+
+def fetch_partitions(
+    partitions: List[Dict],
+    fetch: Callable[[Dict], Any],
+    workers: int = DEFAULT_WORKERS,
+    max_retries: int = 3,
+    backoff: float = 5.0
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Run fetch(partition) for every partition on `workers` threads, retrying a
+    partition up to max_retries times on transient errors (backoff, 2×backoff,
+    …). Returns ({name: result}, {name: error}) for the partitions that
+    succeeded and failed.
+    """
+    started = time.perf_counter()
+    done_count = 0
+
+    def run(partition: Dict):
+        for attempt in range(max_retries):
+            try:
+                return fetch(partition)
+            except Exception as e:
+                if not is_retryable(e) or attempt == max_retries - 1:
+                    raise
+                wait_time = backoff * (2 ** attempt)
+                print(f"🔁 {partition['name']}: attempt {attempt + 1} failed ({e}) — retrying in {wait_time:.0f}s")
+                time.sleep(wait_time)
+
+    results: Dict[str, Any] = {}
+    failures: Dict[str, str] = {}
+    print(f"🧩 Fetching {len(partitions)} partition(s) with {workers} worker(s)...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, p): p for p in partitions}
+        for future in as_completed(futures):
+            name = futures[future]["name"]
+            done_count += 1
+            try:
+                results[name] = future.result()
+                print(f"  [{done_count}/{len(partitions)}] ✅ {name}")
+            except Exception as e:
+                failures[name] = str(e)
+                print(f"  [{done_count}/{len(partitions)}] ❌ {name}: {e}")
+
+    elapsed = time.perf_counter() - started
+    print(f"🧩 {len(results)}/{len(partitions)} partition(s) fetched in {elapsed:.1f}s")
+    return results, failures
@@ -0,0 +1,190 @@
+"""
+Shared workbook reader for the Charlotte Pipe scripts.
+
+One values-only API over every spreadsheet format the scripts receive:
+
+    with open_workbook(path) as wb:
+        for name in wb.sheet_names:
+            for row in wb.rows(name, min_row=1, max_col=10):
+                ...
+
+Backends:
+  • python-calamine (Rust) — used whenever it is installed. Reads xlsx, xlsm,
+    xls, xlsb and ods without building any style objects, so malformed font
+    or fill values in vendor files are never parsed at all.
+  • openpyxl read-only — fallback for xlsx/xlsm when calamine is missing.
+    openpyxl still validates the stylesheet, so a single tolerant patch is
+    installed once (see _install_tolerant_descriptors) instead of each script
+    monkey-patching descriptors at import time.
+
+Rows are always tuples of cell values, 1-based row/column arguments, padded
+from A1 so row numbers and column indexes line up with Excel. Empty cells are
+None. Whole-number floats from calamine are returned as int, matching what
+openpyxl yields for integer cells (so SKUs stay "12345", not "12345.0").
+
+Install the fast backend with:
+    pip install python-calamine
+"""
+
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # pragma: no cover - optional dependency
+    CalamineWorkbook = None
+
+OPENPYXL_EXTENSIONS = {".xlsx", ".xlsm", ".xltx", ".xltm"}
+CALAMINE_EXTENSIONS = OPENPYXL_EXTENSIONS | {".xls", ".xlsb", ".ods"}
+
+
+# ============================================================
+# OPENPYXL TOLERANCE
+# ============================================================
+
+_descriptors_patched = False
+
+
+def _install_tolerant_descriptors():
+    """
+    Make openpyxl's Min/Max descriptors tolerate out-of-range values (e.g. font
+    family=34, max 14): numbers are clamped to the bound, anything else that
+    fails validation is stored as-is. Installed once, only when the openpyxl
+    backend is actually used.
+    """
+    global _descriptors_patched
+    if _descriptors_patched:
+        return
+
+    from openpyxl.descriptors.base import Max, Min
+
+    def tolerant(original, bound_attr):
+        def __set__(self, instance, value):
+            try:
+                original(self, instance, value)
+            except (ValueError, TypeError):
+                try:
+                    bound = getattr(self, bound_attr)
+                    value = self.expected_type(value)
+                    value = max(value, bound) if bound_attr == "min" else min(value, bound)
+                except (ValueError, TypeError, AttributeError):
+                    pass
+                instance.__dict__[self.name] = value
+        return __set__
+
+    Min.__set__ = tolerant(Min.__set__, "min")
+    Max.__set__ = tolerant(Max.__set__, "max")
+    _descriptors_patched = True
+
+
+# ============================================================
+# READER
+# ============================================================
+
+def _clean_calamine_value(v):
+    if v == "":
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+class WorkbookReader:
+    """Values-only view of a workbook. Use open_workbook() to create one."""
+
+    def __init__(self, path: Path, backend: str, book):
+        self.path = path
+        self.backend = backend
+        self._book = book
+        if backend == "calamine":
+            self.sheet_names: List[str] = list(book.sheet_names)
+        else:
+            self.sheet_names = list(book.sheetnames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.backend == "openpyxl":
+            self._book.close()
+        else:
+            close = getattr(self._book, "close", None)
+            if close:
+                close()
+
+    def rows(
+        self,
+        sheet_name: str,
+        min_row: int = 1,
+        max_row: Optional[int] = None,
+        min_col: int = 1,
+        max_col: Optional[int] = None,
+    ) -> Iterator[Tuple]:
+        """Yield value tuples for rows min_row..max_row, columns min_col..max_col (1-based, inclusive)."""
+        if self.backend == "openpyxl":
+            yield from self._book[sheet_name].iter_rows(
+                min_row=min_row, max_row=max_row,
+                min_col=min_col, max_col=max_col,
+                values_only=True,
+            )
+            return
+
+        sheet = self._book.get_sheet_by_name(sheet_name)
+        # iter_rows streams rows from row 1 but starts each row at the first
+        # used column; pad back to column A so indexes match Excel.
+        lead = [None] * (sheet.start[1] if sheet.start else 0)
+        for row_num, row in enumerate(sheet.iter_rows(), start=1):
+            if row_num < min_row:
+                continue
+            if max_row is not None and row_num > max_row:
+                break
+            cells = (lead + row)[min_col - 1:max_col]
+            yield tuple(_clean_calamine_value(v) for v in cells)
+
+    def first_sheet_matching(self, sheet_name: str, keywords: Tuple[str, ...] = ()) -> str:
+        """
+        Sheet whose name equals sheet_name (case-insensitive), else the first
+        whose name contains one of keywords, else the first sheet.
+        """
+        for name in self.sheet_names:
+            if name.strip().lower() == sheet_name.lower():
+                return name
+        for name in self.sheet_names:
+            if any(kw in name.lower() for kw in keywords):
+                return name
+        return self.sheet_names[0]
+
+
+def open_workbook(path, backend: Optional[str] = None) -> WorkbookReader:
+    """
+    Open a workbook for values-only reading.
+    backend: None (auto), "calamine" or "openpyxl".
+    """
+    path = Path(path)
+    ext = path.suffix.lower()
+
+    if backend is None:
+        backend = "calamine" if CalamineWorkbook is not None and ext in CALAMINE_EXTENSIONS else "openpyxl"
+
+    if backend == "calamine":
+        if CalamineWorkbook is None:
+            raise ImportError("python-calamine is not installed (pip install python-calamine)")
+        return WorkbookReader(path, "calamine", CalamineWorkbook.from_path(str(path)))
+
+    if ext not in OPENPYXL_EXTENSIONS:
+        raise ValueError(
+            f"Cannot read '{path.name}' without python-calamine "
+            f"(openpyxl only supports {', '.join(sorted(OPENPYXL_EXTENSIONS))})"
+        )
+
+    import openpyxl
+    import warnings
+
+    _install_tolerant_descriptors()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    return WorkbookReader(path, "openpyxl", book)
@@ -0,0 +1,12 @@
+"""
+Test setup: the scripts live in hyphenated folders and import each other by
+module name, so put those folders on sys.path the way the scripts do.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+for folder in ("shared", "payment-run-qc", "payment-run-prep", "base_convert_to_template", "endpoint-data"):
+    sys.path.insert(0, str(ROOT / folder))
@@ -0,0 +1,27 @@
+import duckdb
+import pytest
+
+from contractor_exclusions import load_exclusion_terms
+
+
+def loaded_terms(con):
+    return [row[0] for row in con.execute("SELECT term FROM _exclusion_terms ORDER BY term_order").fetchall()]
+
+
+@pytest.mark.parametrize("source", ["list", "table"])
+def test_blank_terms_are_dropped(source):
+    con = duckdb.connect()
+    terms = ["copper", "", "  ", None, " Nibco "]
+    if source == "table":
+        con.execute("CREATE TABLE exclusion_terms (term VARCHAR, term_order INTEGER)")
+        con.executemany("INSERT INTO exclusion_terms VALUES (?, ?)", [(t, i) for i, t in enumerate(terms)])
+        load_exclusion_terms(con)
+    else:
+        load_exclusion_terms(con, exclusion_terms=terms)
+    assert loaded_terms(con) == ["copper", "Nibco"]
+
+
+def test_only_blank_terms_exclude_nothing():
+    con = duckdb.connect()
+    load_exclusion_terms(con, exclusion_terms=["", " "])
+    assert loaded_terms(con) == []
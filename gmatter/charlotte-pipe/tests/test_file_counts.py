@@ -0,0 +1,33 @@
+import file_counts
+from load_transactions_table import load_file_to_duckdb
+
+
+def test_source_names_are_keyed_like_the_load_stats(tmp_path, monkeypatch):
+    db = str(tmp_path / "t.duckdb")
+    csv = tmp_path / "tx.csv"
+    csv.write_text("file_name,item_sku\n a.xlsx,1\n a.xlsx,2\nb.xlsx ,3\nc.xlsx,4\n")
+    load_file_to_duckdb(str(csv), db)
+
+    source = {" a.xlsx": 2, "b.xlsx ": 1, "c.xlsx": 5, "d.xlsx": 3, " ": 7}
+    monkeypatch.setattr(file_counts, "count_folder",
+                        lambda folder, cache_file=None: {k: {"transaction_count": v} for k, v in source.items()})
+    df = file_counts.reconcile_with_source_folder(db, "contractor_transactions", "unused", str(tmp_path / "out.csv"))
+
+    assert dict(zip(df["file_name"], df["status"])) == {
+        "a.xlsx": "found (count matches)",
+        "b.xlsx": "found (count matches)",
+        "c.xlsx": "found (count mismatch: source=5, db=1)",
+        "d.xlsx": "not loaded",
+    }
+
+
+def test_unreadable_source_file_has_no_source_count(tmp_path, monkeypatch):
+    db = str(tmp_path / "t.duckdb")
+    csv = tmp_path / "tx.csv"
+    csv.write_text("file_name,item_sku\na.xlsx,1\nz.xlsx,2\n")
+    load_file_to_duckdb(str(csv), db)
+
+    monkeypatch.setattr(file_counts, "count_folder",
+                        lambda folder, cache_file=None: {"a.xlsx": {"transaction_count": None}})
+    df = file_counts.reconcile_with_source_folder(db, "contractor_transactions", "unused", str(tmp_path / "out.csv"))
+    assert dict(zip(df["file_name"], df["status"])) == {"a.xlsx": "found (no source count)", "z.xlsx": "MISSING"}
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+import jobs
+from jobs import JobManager, SessionState
+
+
+def double(item):
+    return {"filename": item["filename"], "value": item["value"] * 2}
+
+
+def echo(item):
+    return {"item": list(item)}
+
+
+def crash(item):
+    os._exit(1)
+
+
+def wait(job, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.05)
+    return job.snapshot()
+
+
+@pytest.fixture
+def manager():
+    m = JobManager(max_workers=2)
+    yield m
+    m.shutdown()
+
+
+def test_results_come_back(manager):
+    items = [{"filename": f"f{i}.xlsx", "value": i} for i in range(4)]
+    snap = wait(manager.submit(SessionState(), "t", double, items))
+    assert snap["status"] == "done"
+    assert sorted(r["value"] for r in snap["results"]) == [0, 2, 4, 6]
+
+
+def test_worker_crash_reports_the_file_and_the_pool_recovers(manager):
+    snap = wait(manager.submit(SessionState(), "t", crash, [{"filename": "huge.xlsx"}]))
+    assert snap["results"] == [{"filename": "huge.xlsx", "status": "error", "error": snap["results"][0]["error"]}]
+
+    snap = wait(manager.submit(SessionState(), "t", double, [{"filename": "a.xlsx", "value": 1}]))
+    assert snap["results"] == [{"filename": "a.xlsx", "value": 2}]
+
+
+def test_on_result_errors_keep_the_filename(manager):
+    def on_result(result):
+        raise ValueError("bad")
+
+    snap = wait(manager.submit(SessionState(), "t", echo, [("/in/a.xlsx", 1)], on_result))
+    assert snap["results"] == [{"filename": "a.xlsx", "status": "error", "error": "bad"}]
+
+
+def test_custom_on_error(manager):
+    snap = wait(manager.submit(SessionState(), "t", crash, [("/in/a.xlsx",)],
+                               on_error=lambda item, e: {"filename": item[0], "status": "error", "headers": []}))
+    assert snap["results"] == [{"filename": "/in/a.xlsx", "status": "error", "headers": []}]
+
+
+def test_sessions_are_evicted(manager, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_SESSIONS", 3)
+    busy = manager.session("busy")
+    busy.add_job(jobs.Job("t", 1))  # never finishes
+    for i in range(5):
+        manager.session(f"s{i}")
+    assert set(manager._sessions) == {"busy", "s3", "s4"}
+
+    monkeypatch.setattr(jobs, "SESSION_IDLE_SECONDS", 0)
+    manager.session("s5")
+    assert set(manager._sessions) == {"busy", "s5"}
+
+
+@pytest.mark.parametrize("module", ["base_convert_to_template", "template_processor"])
+def test_scan_errors_and_job_failures_share_the_file_info(module, tmp_path):
+    scripts = pytest.importorskip(module)
+    broken = tmp_path / "broken.xlsx"
+    broken.write_text("not a workbook")
+    info = scripts.scan_file(broken, {}, None)
+    assert info["status"] == "error" and info["filename"] == "broken.xlsx"
+    assert info == scripts.scan_error_info(broken, info["error"])
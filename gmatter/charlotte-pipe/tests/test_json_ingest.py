@@ -0,0 +1,212 @@
+import json
+from contextlib import nullcontext
+
+import duckdb
+import pytest
+
+from json_ingest import (DuckDBSink, JsonRecordStream, ParquetSink, TruncatedJSONError, decode_chunks, ingest_records,
+                         iter_json_records)
+
+RECORDS = [{"id": i, "name": f"ä{i}", "qty": i * 1.5, "tags": [i]} for i in range(25)]
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+@pytest.mark.parametrize("shape", ["array", "object", "nested"])
+def test_records_parse_across_any_chunking(shape, size):
+    doc = {"array": RECORDS, "object": {"count": 25, "data": RECORDS},
+           "nested": {"meta": {"data": [1]}, "results": RECORDS}}[shape]
+    assert list(iter_json_records(chunked(json.dumps(doc), size))) == RECORDS
+
+
+def test_numbers_split_across_chunks_are_not_cut_short():
+    assert list(iter_json_records(["[12", "34.5", "e1, tr", "ue]"])) == [12345.0, True]
+
+
+def test_single_object_is_one_record():
+    assert list(iter_json_records(chunked('{"a": 1, "b": [2]}', 2))) == [{"a": 1, "b": [2]}]
+
+
+def test_multibyte_characters_split_across_byte_chunks():
+    data = json.dumps([{"name": "Größe €"}], ensure_ascii=False).encode()
+    chunks = [data[i:i + 1] for i in range(len(data))]
+    assert list(iter_json_records(decode_chunks(chunks))) == [{"name": "Größe €"}]
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1}, {"a"', '[{"a": 1},', '{"data": [1, 2', ""])
+def test_truncated_stream_is_reported(text):
+    with pytest.raises(TruncatedJSONError):
+        list(iter_json_records(chunked(text, 4)))
+
+
+def test_malformed_stream_is_not_mistaken_for_truncation():
+    with pytest.raises(ValueError) as e:
+        list(iter_json_records(['[1 2]']))
+    assert not isinstance(e.value, TruncatedJSONError)
+
+
+EVOLVING = [
+    {"id": 1, "note": None},
+    {"id": 2, "note": None},
+    {"id": 3, "note": "x", "price": 1},
+    {"id": 4, "price": 2.5, "extra": {"k": 1}},
+    {"id": "5a", "price": 3},
+]
+
+
+def test_duckdb_sink_evolves_the_schema_and_swaps_in(tmp_path):
+    con = duckdb.connect(str(tmp_path / "t.duckdb"))
+    con.execute("CREATE TABLE pos AS SELECT 1 AS old")
+    rows = ingest_records(EVOLVING, DuckDBSink(con, "pos"), batch_records=2)
+    assert rows == 5
+    types = {name: dtype for _, name, dtype, *_ in con.execute("PRAGMA table_info('pos')").fetchall()}
+    assert types == {"id": "VARCHAR", "note": "VARCHAR", "price": "DOUBLE", "extra": "VARCHAR"}
+    assert con.execute("SELECT id, price, extra FROM pos ORDER BY rowid").fetchall() == [
+        ("1", None, None), ("2", None, None), ("3", 1.0, None), ("4", 2.5, '{"k": 1}'), ("5a", 3.0, None),
+    ]
+    tables = {row[0] for row in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+    assert tables == {"pos"}
+
+
+def test_failed_duckdb_load_leaves_the_table_alone(tmp_path):
+    con = duckdb.connect(str(tmp_path / "t.duckdb"))
+    con.execute("CREATE TABLE pos AS SELECT 1 AS old")
+
+    def records():
+        yield from EVOLVING[:3]
+        raise TruncatedJSONError("cut")
+
+    with pytest.raises(TruncatedJSONError):
+        ingest_records(records(), DuckDBSink(con, "pos"), batch_records=2)
+    assert con.execute("SELECT * FROM pos").fetchall() == [(1,)]
+    assert con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'pos__staging'").fetchone()[0] == 0
+
+
+def test_parquet_sink_replaces_the_folder(tmp_path):
+    target = tmp_path / "pos"
+    target.mkdir()
+    (target / "stale.parquet").write_text("old")
+    assert ingest_records(EVOLVING, ParquetSink(target), batch_records=2) == 5
+    assert not target.with_name("pos.tmp").exists()
+    rows = duckdb.sql(f"SELECT id, price FROM read_parquet('{target}/*.parquet', union_by_name = true)").fetchall()
+    assert sorted(rows) == sorted([("1", None), ("2", None), ("3", 1.0), ("4", 2.5), ("5a", 3.0)])
+
+
+def test_failed_parquet_load_leaves_the_folder_alone(tmp_path):
+    target = tmp_path / "pos"
+    target.mkdir()
+    (target / "part-00000.parquet").write_text("old")
+
+    def records():
+        yield from EVOLVING[:3]
+        raise TruncatedJSONError("cut")
+
+    with pytest.raises(TruncatedJSONError):
+        ingest_records(records(), ParquetSink(target), batch_records=2)
+    assert [p.name for p in target.iterdir()] == ["part-00000.parquet"]
+    assert not target.with_name("pos.tmp").exists()
+
+
+def test_empty_extract_makes_an_empty_folder(tmp_path):
+    assert ingest_records([], ParquetSink(tmp_path / "pos")) == 0
+    assert list((tmp_path / "pos").iterdir()) == []
+
+
+def test_non_object_records_are_wrapped(tmp_path):
+    con = duckdb.connect()
+    ingest_records([1, 2, "x"], DuckDBSink(con, "v"))
+    assert con.execute("SELECT value FROM v").fetchall() == [("1",), ("2",), ("x",)]
+
+
+@pytest.mark.parametrize("shape", ["array", "object"])
+def test_resuming_at_any_record_offset_gives_the_rest(shape):
+    doc = RECORDS if shape == "array" else {"count": 25, "data": RECORDS, "more": {"x": [1]}}
+    data = json.dumps(doc, ensure_ascii=False).encode()
+    stream = JsonRecordStream(decode_chunks([data[i:i + 5] for i in range(0, len(data), 5)]))
+    offsets = []
+    for _ in stream:
+        offsets.append(stream.offset)
+    assert offsets == sorted(offsets) and len(offsets) == len(RECORDS)
+
+    for n, offset in enumerate(offsets):
+        rest = JsonRecordStream(decode_chunks([data[offset:]]), start_offset=offset,
+                                resume=True, in_object=stream.in_object)
+        assert list(rest) == RECORDS[n + 1:]
+        assert rest.offset == (offsets[-1] if n + 1 < len(offsets) else offset)
+
+
+@pytest.mark.parametrize("in_object", [False, True])
+def test_resumed_stream_still_checks_the_end_of_the_document(in_object):
+    data = json.dumps({"data": RECORDS[:3], "count": 3}).encode()
+    offset = data.index(b"}") + 1  # just past the first record
+    with pytest.raises(TruncatedJSONError) if in_object else nullcontext():
+        list(JsonRecordStream(decode_chunks([data[offset:-4]]), start_offset=offset, resume=True,
+                              in_object=in_object))
+
+
+def test_cut_after_the_record_array_is_truncation():
+    with pytest.raises(TruncatedJSONError):
+        list(iter_json_records(['{"data": [1, 2], "count": 2']))
+
+
+def failing_load(sink, records, fail_after):
+    def stream():
+        for n, record in enumerate(records):
+            if n == fail_after:
+                raise TruncatedJSONError("cut")
+            yield record
+
+    seen = iter(range(1, len(records) + 1))
+    with pytest.raises(TruncatedJSONError):
+        ingest_records(stream(), sink, batch_records=2, checkpoint=lambda: {"seen": next(seen) * 2})
+
+
+ROWS = [{"id": i, "v": "x" * i if i > 2 else None} for i in range(9)]
+
+
+@pytest.mark.parametrize("kind", ["duckdb", "parquet"])
+def test_resumable_sink_carries_on_from_its_checkpoint(tmp_path, kind):
+    con = duckdb.connect(str(tmp_path / "t.duckdb"))
+
+    def open_sink():
+        return DuckDBSink(con, "pos", resume=True) if kind == "duckdb" else ParquetSink(tmp_path / "pos", resume=True)
+
+    failing_load(open_sink(), ROWS, fail_after=5)
+    sink = open_sink()
+    assert (sink.rows, sink.checkpoint["seen"]) == (4, 4)
+    assert ingest_records(ROWS[sink.rows:], sink, batch_records=2) == len(ROWS)
+
+    if kind == "duckdb":
+        rows = con.execute("SELECT id, v FROM pos ORDER BY id").fetchall()
+    else:
+        rows = duckdb.sql(f"SELECT id, v FROM read_parquet('{tmp_path}/pos/*.parquet', union_by_name = true) "
+                          f"ORDER BY id").fetchall()
+    assert rows == [(r["id"], r["v"]) for r in ROWS]
+
+
+@pytest.mark.parametrize("kind", ["duckdb", "parquet"])
+def test_reset_sink_starts_over_and_stays_resumable(tmp_path, kind):
+    con = duckdb.connect(str(tmp_path / "t.duckdb"))
+
+    def open_sink():
+        return DuckDBSink(con, "pos", resume=True) if kind == "duckdb" else ParquetSink(tmp_path / "pos", resume=True)
+
+    failing_load(open_sink(), ROWS, fail_after=5)
+    sink = open_sink()
+    sink.reset()
+    assert (sink.rows, sink.checkpoint) == (0, None)
+    failing_load(sink, ROWS, fail_after=3)
+    assert open_sink().rows == 2
+
+
+def test_parquet_parts_after_the_checkpoint_are_rewritten(tmp_path):
+    sink = ParquetSink(tmp_path / "pos", resume=True)
+    failing_load(sink, ROWS, fail_after=5)
+    # A part written after the last checkpoint (crash between part and checkpoint)
+    (tmp_path / "pos.tmp" / "part-00002.parquet").write_text("partial")
+    sink = ParquetSink(tmp_path / "pos", resume=True)
+    assert sink.parts == 2
+    assert sorted(p.name for p in (tmp_path / "pos.tmp").glob("part-*")) == ["part-00000.parquet", "part-00001.parquet"]
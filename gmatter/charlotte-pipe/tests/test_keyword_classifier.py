@@ -0,0 +1,61 @@
+import pytest
+
+from keyword_classifier import KeywordClassifier
+
+KEYWORDS = [
+    ("pipe", "pipe", 1),
+    ("cap", "fitting", 2),
+    ("tee", "fitting", 2),
+    ("elbow", "fitting", 2),
+    ("pipe cap", "fitting", 3),
+    ("ell", "fitting", 2),
+]
+
+
+@pytest.fixture(scope="module")
+def clf():
+    return KeywordClassifier(KEYWORDS)
+
+
+@pytest.mark.parametrize("text", ["CAPACITY VALVE", "ESCAPE", "TEETH", "SHELLS", "BELL"])
+def test_keyword_inside_a_word_does_not_match(clf, text):
+    assert clf.find(text) == []
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("3/4CAP", "cap"),
+    ("2-TEE", "tee"),
+    ("PVC 90 ELBOW 2IN", "elbow"),
+    ("ELBOWS 2IN", "elbow"),
+    ("CAPS", "cap"),
+    ("TEES", "tee"),
+    ("cap", "cap"),
+])
+def test_keyword_at_word_boundaries_matches(clf, text, keyword):
+    assert keyword in [kw for _, kw in clf.find(text)]
+
+
+def test_only_plural_suffixes_are_allowed_after_a_keyword(clf):
+    assert clf.find("CAPSTONE") == []
+    assert clf.find("ELLES") == [(0, "ell")]
+
+
+def test_overlapping_keywords_are_all_found(clf):
+    assert clf.find("PVC PIPE CAP 2") == [(4, "pipe"), (4, "pipe cap"), (9, "cap")]
+
+
+def test_highest_priority_then_longest_keyword_wins(clf):
+    assert clf.classify("PVC PIPE CAP 2") == (["pipe", "pipe cap", "cap"], "fitting")
+    assert clf.classify("PIPE 10FT") == (["pipe"], "pipe")
+    assert clf.classify("PIPE ELBOW") == (["pipe", "elbow"], "fitting")
+
+
+def test_tie_goes_to_the_earlier_position():
+    clf = KeywordClassifier([("alpha", "a", 1), ("bravo", "b", 1)])
+    assert clf.classify("BRAVO ALPHA")[1] == "b"
+    assert clf.classify("ALPHA BRAVO")[1] == "a"
+
+
+def test_no_match_and_none(clf):
+    assert clf.classify("GLUE") == ([], None)
+    assert clf.classify(None) == ([], None)
@@ -0,0 +1,51 @@
+import duckdb
+
+from load_transactions_table import load_file_to_duckdb
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([",".join(header)] + [",".join(r) for r in rows]) + "\n")
+    return str(path)
+
+
+def stats(db):
+    con = duckdb.connect(db, read_only=True)
+    try:
+        return dict(con.execute("SELECT file_name, row_count FROM transaction_load_stats").fetchall())
+    finally:
+        con.close()
+
+
+def test_replace_without_file_name_clears_stats(tmp_path):
+    db = str(tmp_path / "t.duckdb")
+    load_file_to_duckdb(write_csv(tmp_path / "a.csv", ["file_name", "item_sku"], [["a.xlsx", "1"], ["b.xlsx", "2"]]), db)
+    assert stats(db) == {"a.xlsx": 1, "b.xlsx": 1}
+
+    load_file_to_duckdb(write_csv(tmp_path / "b.csv", ["item_sku"], [["1"]]), db)
+    assert stats(db) == {}
+
+
+def test_replace_file_matches_file_names_like_the_stats(tmp_path):
+    db = str(tmp_path / "t.duckdb")
+    first = write_csv(tmp_path / "a.csv", ["file_name", "item_sku"],
+                      [['" a.xlsx"', "1"], ['" a.xlsx"', "2"], ["b.xlsx", "3"]])
+    load_file_to_duckdb(first, db)
+    assert stats(db) == {"a.xlsx": 2, "b.xlsx": 1}
+
+    fix = write_csv(tmp_path / "fix.csv", ["file_name", "item_sku"], [["a.xlsx", "9"]])
+    result = load_file_to_duckdb(fix, db, mode="replace_file")
+    assert result["rows_deleted"] == 2
+    assert stats(db) == {"a.xlsx": 1, "b.xlsx": 1}
+
+    con = duckdb.connect(db, read_only=True)
+    counts = dict(con.execute(
+        "SELECT TRIM(file_name), COUNT(*) FROM contractor_transactions GROUP BY 1").fetchall())
+    con.close()
+    assert counts == stats(db)
+
+
+def test_append_adds_to_counts(tmp_path):
+    db = str(tmp_path / "t.duckdb")
+    load_file_to_duckdb(write_csv(tmp_path / "a.csv", ["file_name"], [["a.xlsx"]]), db)
+    load_file_to_duckdb(write_csv(tmp_path / "b.csv", ["file_name"], [["a.xlsx"], ["c.xlsx"]]), db, mode="append")
+    assert stats(db) == {"a.xlsx": 2, "c.xlsx": 1}
@@ -0,0 +1,187 @@
+import random
+import re
+import sys
+import types
+
+import pytest
+
+try:
+    import gspread  # noqa: F401
+except ImportError:
+    # The Google client libraries are only needed to talk to Sheets; the tests use a fake client
+    for name in ("gspread", "google", "google.oauth2", "google.oauth2.credentials", "google_auth_oauthlib",
+                 "google_auth_oauthlib.flow", "google.auth", "google.auth.transport", "google.auth.transport.requests"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["gspread"].Client = object
+    sys.modules["gspread"].WorksheetNotFound = type("WorksheetNotFound", (Exception,), {})
+    sys.modules["google.oauth2.credentials"].Credentials = object
+    sys.modules["google_auth_oauthlib.flow"].InstalledAppFlow = object
+    sys.modules["google.auth.transport.requests"].Request = object
+
+import materials_data
+from materials_data import _runs, column_letter, diff_sheet_rows, row_keys, sync_to_sheet
+
+
+def cell(ref):
+    letters, row = re.fullmatch(r"([A-Z]+)(\d+)", ref).groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - 64
+    return int(row), col
+
+
+class FakeWorksheet:
+    """Grid of values with the gspread calls sync_to_sheet makes; counts writes."""
+
+    id = 7
+
+    def __init__(self):
+        self.grid = []
+        self.row_count, self.col_count = 100, 26
+        self.writes = []
+
+    def row_values(self, n):
+        return list(self.grid[n - 1]) if len(self.grid) >= n else []
+
+    def clear(self):
+        self.writes.append("clear")
+        self.grid = []
+
+    def resize(self, rows, cols):
+        self.writes.append("resize")
+        self.row_count, self.col_count = rows, cols
+
+    def batch_update(self, data, value_input_option=None):
+        self.writes.append("values")
+        for d in data:
+            (r0, c0), (r1, c1) = (cell(ref) for ref in d["range"].split(":"))
+            assert r1 <= self.row_count and c1 <= self.col_count, d["range"]
+            assert len(d["values"]) == r1 - r0 + 1
+            self.grid.extend([] for _ in range(r1 - len(self.grid)))
+            self.grid[r0 - 1:r1] = [list(row) for row in d["values"]]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.ws = FakeWorksheet()
+
+    def worksheet(self, name):
+        return self.ws
+
+    def batch_update(self, body):
+        self.ws.writes.append("delete")
+        last = None
+        for request in body["requests"]:
+            rng = request["deleteDimension"]["range"]
+            assert last is None or rng["endIndex"] <= last  # bottom-up
+            last = rng["startIndex"]
+            del self.ws.grid[rng["startIndex"]:rng["endIndex"]]
+            self.ws.row_count -= rng["endIndex"] - rng["startIndex"]
+
+
+class FakeClient:
+    def __init__(self):
+        self.ss = FakeSpreadsheet()
+
+    def open_by_key(self, key):
+        return self.ss
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(materials_data, "MAX_CELLS_PER_CALL", 40)
+    return FakeClient()
+
+
+def sync(client, tmp_path, headers, rows, **kwargs):
+    assert sync_to_sheet(client, "sheet", "ws", headers, rows, snapshot_file=str(tmp_path / "snap.json"), **kwargs)
+    return client.ss.ws
+
+
+def assert_sheet_holds(ws, headers, rows):
+    assert ws.grid[0] == headers
+    assert sorted(map(tuple, ws.grid[1:])) == sorted(map(tuple, rows))
+
+
+def test_diff_keeps_sheet_order_and_appends_new_rows():
+    old_keys, old_rows = ["a", "b", "c", "d"], [["a", "1"], ["b", "2"], ["c", "3"], ["d", "4"]]
+    diff = diff_sheet_rows(old_keys, old_rows, ["e", "d", "b", "a"], [["e", "5"], ["d", "9"], ["b", "2"], ["a", "1"]])
+    assert diff["deleted"] == [2]
+    assert diff["keys"] == ["a", "b", "d", "e"]
+    assert diff["rows"] == [["a", "1"], ["b", "2"], ["d", "9"], ["e", "5"]]
+    assert diff["updated"] == [2]
+    assert diff["appended"] == [3]
+
+
+def test_runs_merge_contiguous_indexes():
+    assert _runs([5, 1, 2, 3, 9, 10]) == [(1, 3), (5, 5), (9, 10)]
+    assert _runs([]) == []
+
+
+def test_content_keys_number_repeated_rows():
+    rows = [["a", "1"], ["a", "1"], ["b", "2"]]
+    keys = row_keys(["X", "Y"], rows, [])
+    assert len(set(keys)) == 3
+    assert row_keys(["X", "Y"], rows, ["X"]) == keys  # repeating key values fall back to content
+
+
+def test_unchanged_catalog_makes_no_writes(client, tmp_path):
+    headers = ["SKU_ID", "Desc"]
+    rows = [[f"S{i}", f"item {i}"] for i in range(30)]
+    ws = sync(client, tmp_path, headers, rows)
+    ws.writes.clear()
+    sync(client, tmp_path, headers, rows)
+    assert ws.writes == []
+
+
+def test_delta_syncs_match_a_full_write(client, tmp_path):
+    headers = ["SKU_ID", "Desc", "Price"]
+    rng = random.Random(7)
+    catalog = {f"S{i}": [f"S{i}", f"item {i}", str(i)] for i in range(60)}
+    ws = sync(client, tmp_path, headers, list(catalog.values()))
+    for step in range(25):
+        for key in rng.sample(sorted(catalog), 3):
+            catalog[key][2] = str(rng.random())
+        for key in rng.sample(sorted(catalog), 2):
+            del catalog[key]
+        for j in range(rng.randint(0, 4)):
+            key = f"N{step}-{j}"
+            catalog[key] = [key, "new", "1"]
+        ws.writes.clear()
+        sync(client, tmp_path, headers, list(catalog.values()))
+        assert "clear" not in ws.writes
+        assert_sheet_holds(ws, headers, catalog.values())
+        assert len(ws.grid) == len(catalog) + 1
+
+
+def test_content_keyed_rows_sync(client, tmp_path):
+    ws = sync(client, tmp_path, ["X", "Y"], [["a", "1"], ["a", "1"], ["b", "2"], ["c", "3"], ["d", "4"]])
+    new = [["a", "1"], ["b", "2"], ["c", "3"], ["d", "4"], ["e", "5"]]
+    ws.writes.clear()
+    sync(client, tmp_path, ["X", "Y"], new)
+    assert "clear" not in ws.writes
+    assert_sheet_holds(ws, ["X", "Y"], new)
+    assert len(ws.grid) == len(new) + 1
+
+
+def test_column_change_rewrites_the_sheet(client, tmp_path):
+    rows = [["a", "1"], ["b", "2"]]
+    ws = sync(client, tmp_path, ["X", "Y"], rows)
+    ws.writes.clear()
+    sync(client, tmp_path, ["X", "Z"], rows)
+    assert "clear" in ws.writes
+    assert_sheet_holds(ws, ["X", "Z"], rows)
+
+
+def test_sheet_edited_since_the_last_push_is_rewritten(client, tmp_path):
+    rows = [[f"S{i}", "x"] for i in range(5)]
+    ws = sync(client, tmp_path, ["SKU_ID", "Desc"], rows)
+    ws.grid[0] = ["someone", "else"]
+    ws.writes.clear()
+    sync(client, tmp_path, ["SKU_ID", "Desc"], rows)
+    assert "clear" in ws.writes
+    assert_sheet_holds(ws, ["SKU_ID", "Desc"], rows)
+
+
+def test_column_letters():
+    assert [column_letter(n) for n in (1, 26, 27, 52, 703)] == ["A", "Z", "AA", "AZ", "AAA"]
@@ -0,0 +1,133 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import duckdb
+import pytest
+
+import pos_data
+
+RECORDS = [{"id": i, "sku": f"SKU-{i:04d}", "qty": i % 7, "price": i * 1.25} for i in range(200)]
+BODY = json.dumps({"data": RECORDS, "count": len(RECORDS)}).encode()
+
+
+class Extract(BaseHTTPRequestHandler):
+    """Serves BODY; each request drops the connection at the next byte in server.cuts (None: no cut)."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get("Range"))
+        start = 0
+        if server.ranges and self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        else:
+            self.send_response(200)
+        if server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        if server.length:
+            self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        cut = server.cuts.pop(0) if server.cuts else None
+        self.wfile.write(BODY[start:cut])
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(pos_data.time, "sleep", lambda seconds: None)
+    servers = []
+
+    def start(cuts=(), ranges=False, length=False):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Extract)
+        server.cuts, server.ranges, server.length, server.requests = list(cuts), ranges, length, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}/pos"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+CUT = len(BODY) * 3 // 5
+VARIANTS = [
+    pytest.param(dict(ranges=False, length=False), id="no-range-no-length"),
+    pytest.param(dict(ranges=True, length=False), id="range-no-length"),
+    pytest.param(dict(ranges=False, length=True), id="no-range-length"),
+    pytest.param(dict(ranges=True, length=True), id="range-length"),
+]
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+@pytest.mark.parametrize("cut", [CUT, len(BODY) - 3])
+def test_file_mode_retries_a_dropped_connection(serve, tmp_path, variant, cut):
+    server, url = serve(cuts=[cut], **variant)
+    output = tmp_path / "api_data.json"
+    assert pos_data.fetch_and_save_data(url, str(output), chunk_size=512)
+    assert output.read_bytes() == BODY
+    assert len(server.requests) == 2
+    if variant["ranges"]:
+        assert 0 < int(server.requests[1][len("bytes="):-1]) <= cut
+    else:
+        assert server.requests[1] is None
+    assert not (tmp_path / "api_data.json.part").exists()
+
+
+def test_file_mode_never_saves_a_truncated_body(serve, tmp_path):
+    _, url = serve(cuts=[CUT, CUT, CUT])
+    output = tmp_path / "api_data.json"
+    assert not pos_data.fetch_and_save_data(url, str(output), chunk_size=512)
+    assert not output.exists()
+    assert (tmp_path / "api_data.json.part").read_bytes() == BODY[:CUT]
+
+
+def pos_rows(db):
+    con = duckdb.connect(db, read_only=True)
+    try:
+        return con.execute("SELECT id, sku, qty, price FROM pos_data ORDER BY id").fetchall()
+    finally:
+        con.close()
+
+
+def parquet_rows(folder):
+    return duckdb.sql(
+        f"SELECT id, sku, qty, price FROM read_parquet('{folder}/*.parquet', union_by_name = true) ORDER BY id"
+    ).fetchall()
+
+
+EXPECTED = [(r["id"], r["sku"], r["qty"], r["price"]) for r in RECORDS]
+
+
+@pytest.mark.parametrize("restart", [False, True])
+@pytest.mark.parametrize("variant", VARIANTS)
+@pytest.mark.parametrize("mode", ["duckdb", "parquet"])
+def test_ingest_retries_a_dropped_connection(serve, tmp_path, mode, variant, restart):
+    server, url = serve(cuts=[CUT, len(BODY) - 3], **variant)
+    db, folder = str(tmp_path / "pos.duckdb"), tmp_path / "pos_parquet"
+    target = dict(db_path=db) if mode == "duckdb" else dict(parquet_dir=str(folder))
+    assert pos_data.fetch_and_ingest(url, **target, chunk_size=512, batch_records=20, restart=restart)
+    assert (pos_rows(db) if mode == "duckdb" else parquet_rows(folder)) == EXPECTED
+    assert len(server.requests) == 3
+    if variant["ranges"]:
+        assert all(r and r.startswith("bytes=") for r in server.requests[1:])
+
+
+@pytest.mark.parametrize("mode", ["duckdb", "parquet"])
+def test_restart_discards_an_earlier_run_only(serve, tmp_path, mode):
+    db, folder = str(tmp_path / "pos.duckdb"), tmp_path / "pos_parquet"
+    target = dict(db_path=db) if mode == "duckdb" else dict(parquet_dir=str(folder))
+    _, url = serve(cuts=[CUT])
+    assert not pos_data.fetch_and_ingest(url, **target, chunk_size=512, batch_records=20, max_retries=1)
+
+    server, url = serve(cuts=[CUT], ranges=True)
+    assert pos_data.fetch_and_ingest(url, **target, chunk_size=512, batch_records=20, restart=True)
+    assert (pos_rows(db) if mode == "duckdb" else parquet_rows(folder)) == EXPECTED
+    assert server.requests[0] is None
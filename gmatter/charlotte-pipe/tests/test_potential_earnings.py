@@ -0,0 +1,112 @@
+import duckdb
+import pytest
+
+from material_catalog import store_catalog
+from potential_earnings import calculate_potential_earnings
+
+CATALOG = [
+    {"MaterialNumber": "02-1234", "ProductType": "PVC Pipe", "RebatePercent": "5%", "Rate": "9"},
+    {"MaterialNumber": "5555", "ProductType": "DWV Fitting", "RebatePercent": "10", "Rate": "9"},
+    {"MaterialNumber": "7777", "ProductType": "Solvent Cement", "RebatePercent": "2", "Rate": "9"},
+    {"MaterialNumber": "8888", "ProductType": "Primer", "RebatePercent": None, "Rate": "9"},
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "e.duckdb")
+    con = duckdb.connect(path)
+    con.execute("""
+        CREATE TABLE contractor_transactions AS SELECT * FROM (VALUES
+            ('a.xlsx', 'Acme', 'PVC PIPE', '21234', '', 100.0, 1.0),
+            ('a.xlsx', 'Acme', 'DWV TEE', '005555', '', 50.0, 2.0),
+            ('a.xlsx', 'Acme', 'CEMENT', '7777', '', 10.0, 1.0),
+            ('a.xlsx', 'Acme', 'PRIMER', '8888', '', 10.0, 1.0),
+            ('a.xlsx', 'Acme', 'PVC PIPE', '21234', 'Y', 100.0, 1.0)
+        ) t(file_name, contractor_name, item_description, item_sku, exclude, extended_price, ship_quantity)
+    """)
+    con.close()
+    return path
+
+
+def store(db, records=CATALOG, **fields):
+    con = duckdb.connect(db)
+    try:
+        return store_catalog(con, records, **fields)
+    finally:
+        con.close()
+
+
+def earnings(db, tmp_path, **kwargs):
+    run_id = calculate_potential_earnings(db, output=str(tmp_path / "out.csv"), exclusion_terms=["glue"], **kwargs)
+    con = duckdb.connect(db, read_only=True)
+    try:
+        return [float(r[0]) for r in con.execute(
+            "SELECT potential_earnings FROM potential_earnings WHERE run_id = ? ORDER BY row_id", [run_id]
+        ).fetchall()]
+    finally:
+        con.close()
+
+
+def test_every_catalog_code_can_earn(db, tmp_path):
+    assert store(db, rate_pct_field="RebatePercent") == 4
+    assert earnings(db, tmp_path) == [5.0, 5.0, 0.2, 0.0, 0.0]
+
+
+def test_category_fallback_applies_to_unrated_codes(db, tmp_path, capsys):
+    store(db, rate_pct_field="RebatePercent")
+    catalog = [dict(r, RebatePercent=None) if r["MaterialNumber"] == "5555" else r for r in CATALOG]
+    store(db, catalog, rate_pct_field="RebatePercent")
+    assert earnings(db, tmp_path, category_rates={"fitting": 1.0}) == [5.0, 0.5, 0.2, 0.0, 0.0]
+    assert "1 of 4 catalog code(s) have no rate" in capsys.readouterr().out
+
+
+def test_rate_fields_are_not_guessed(db, tmp_path):
+    store(db)
+    with pytest.raises(RuntimeError, match="has a rate"):
+        earnings(db, tmp_path, category_rates={})
+
+
+def test_missing_configured_rate_field_is_an_error(db):
+    with pytest.raises(ValueError, match="RebatePct"):
+        store(db, rate_pct_field="RebatePct")
+
+
+def test_source_fingerprint_sees_changes_to_duplicate_rows(db, tmp_path):
+    store(db, rate_pct_field="RebatePercent")
+
+    def signature(description):
+        con = duckdb.connect(db)
+        con.execute("""
+            CREATE OR REPLACE TABLE contractor_transactions AS
+            SELECT * FROM (VALUES (?, '7777', 10.0), (?, '7777', 10.0)) t(item_description, item_sku, extended_price)
+        """, [description, description])
+        con.close()
+        earnings(db, tmp_path)
+        con = duckdb.connect(db, read_only=True)
+        try:
+            return con.execute("SELECT source_signature FROM earnings_runs ORDER BY run_id DESC LIMIT 1").fetchone()[0]
+        finally:
+            con.close()
+
+    assert signature("CEMENT") != signature("CEMENT 2")
+
+
+def test_codes_without_a_category_leave_classification_to_keywords(db):
+    from pipe_fitting_category import find_pipe_fitting_discrepancies, original_cols
+
+    store(db, rate_pct_field="RebatePercent")
+    con = duckdb.connect(db)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE tx AS
+        SELECT * FROM (VALUES ('CEMENT TEE', '7777'), ('PVC PIPE', '21234'))
+            t(item_description, item_sku)
+    """)
+    con.execute("ALTER TABLE tx ADD COLUMN contractor_name VARCHAR")
+    for col in original_cols:
+        con.execute(f"ALTER TABLE tx ADD COLUMN {col} VARCHAR")
+    df = find_pipe_fitting_discrepancies(con, "tx")
+    con.close()
+    assert list(zip(df["item_description"], df["category_source"])) == [
+        ("CEMENT TEE", "keywords"), ("PVC PIPE", "catalog"),
+    ]
@@ -0,0 +1,139 @@
+import duckdb
+import pandas as pd
+import pytest
+
+import qc_runner
+from qc_runner import FileCountsCheck, PipeFittingCheck, run_qc
+from pipe_fitting_category import original_cols
+
+ROWS = [
+    ("Acme", "PVC ELBOW 2IN", "a.xlsx", "", ""),        # fitting, not flagged
+    ("Acme", "PVC PIPE 10FT TUBING", "a.xlsx", "", ""),  # pipe, not flagged
+    ("Acme", "CPVC TEE 1/2", "a.xlsx", "", "Y"),         # fitting, flagged: fine
+    ("Bolt", "3/4CAP", "b.xlsx", "", ""),                # fitting, not flagged
+    ("Bolt", "GLUE", "b.xlsx", "", ""),                  # unclassified
+]
+
+
+def make_table(path, rows=ROWS):
+    con = duckdb.connect(str(path))
+    df = pd.DataFrame(rows, columns=["contractor_name", "item_description", "file_name", "pipe", "fittings"])
+    for col in original_cols:
+        if col not in df:
+            df[col] = ""
+    con.execute("CREATE OR REPLACE TABLE contractor_transactions AS SELECT * FROM df")
+    con.close()
+
+
+class FlakyPipeFittingCheck(PipeFittingCheck):
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def run(self, con, scan_table):
+        if self.fail:
+            raise RuntimeError("boom")
+        return super().run(con, scan_table)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "qc.duckdb"
+    make_table(path)
+    return path
+
+
+def run(db, tmp_path, *checks, **kwargs):
+    timings = run_qc(str(db), tmp_path / "out", checks=list(checks), incremental=True, **kwargs)
+    return timings.set_index("check")
+
+
+def report(tmp_path, check):
+    return pd.read_csv(tmp_path / "out" / check.output_csv)
+
+
+def test_incremental_report_matches_full_scan(db, tmp_path):
+    check = PipeFittingCheck()
+    full = run_qc(str(db), tmp_path / "full", checks=[check])
+    expected = pd.read_csv(tmp_path / "full" / check.output_csv)
+    assert len(expected) == 3
+
+    run(db, tmp_path, check)
+    assert report(tmp_path, check).equals(expected)
+    assert full.set_index("check").loc["pipe_fitting", "issues"] == 3
+
+    # Nothing changed: nothing re-checked, same report
+    run(db, tmp_path, check)
+    assert report(tmp_path, check).equals(expected)
+    con = duckdb.connect(str(db), read_only=True)
+    assert con.execute("SELECT rows_checked FROM qc_runs ORDER BY run_at").fetchall() == [(5,), (0,)]
+    con.close()
+
+
+def test_failed_check_rechecks_its_rows_next_run(db, tmp_path):
+    flaky, counts = FlakyPipeFittingCheck(fail=True), FileCountsCheck()
+    timings = run(db, tmp_path, flaky, counts)
+    assert timings.loc["pipe_fitting", "status"].startswith("error")
+
+    flaky.fail = False
+    timings = run(db, tmp_path, flaky, counts)
+    assert timings.loc["pipe_fitting", "status"] == "ok"
+    assert len(report(tmp_path, flaky)) == 3
+
+
+def test_failed_check_does_not_hold_back_other_checks(db, tmp_path):
+    class CapCheck(PipeFittingCheck):
+        name = "caps"
+        output_csv = "caps.csv"
+
+    flaky, caps = FlakyPipeFittingCheck(fail=True), CapCheck()
+    run(db, tmp_path, flaky, caps)
+    con = duckdb.connect(str(db), read_only=True)
+    state = dict(con.execute("SELECT check_name, COUNT(*) FROM qc_row_state GROUP BY 1").fetchall())
+    con.close()
+    assert state == {"caps": 5}
+
+
+def test_changed_rows_are_rechecked(db, tmp_path):
+    check = PipeFittingCheck()
+    run(db, tmp_path, check)
+    rows = list(ROWS)
+    rows[0] = ("Acme", "PVC ELBOW 2IN", "a.xlsx", "", "Y")   # fixed
+    rows[4] = ("Bolt", "GLUE TUBE", "b.xlsx", "", "")        # now a pipe
+    make_table(db, rows)
+
+    timings = run(db, tmp_path, check)
+    assert timings.loc["pipe_fitting", "issues"] == 3
+    assert sorted(report(tmp_path, check)["item_description"]) == ["3/4CAP", "GLUE TUBE", "PVC PIPE 10FT TUBING"]
+
+
+def test_crash_while_storing_keeps_no_partial_state(db, tmp_path, monkeypatch):
+    check = PipeFittingCheck()
+    store = qc_runner._store_issues
+
+    def crash_after_store(con, check, delta):
+        store(con, check, delta)
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr(qc_runner, "_store_issues", crash_after_store)
+    with pytest.raises(RuntimeError):
+        run(db, tmp_path, check)
+    monkeypatch.setattr(qc_runner, "_store_issues", store)
+
+    con = duckdb.connect(str(db), read_only=True)
+    assert con.execute("SELECT COUNT(*) FROM qc_row_state").fetchone()[0] == 0
+    assert con.execute("SELECT COUNT(*) FROM qc_runs").fetchone()[0] == 0
+    con.close()
+
+    run(db, tmp_path, check)
+    assert len(report(tmp_path, check)) == 3
+
+
+def test_state_from_before_per_check_state_is_replaced(db, tmp_path):
+    con = duckdb.connect(str(db))
+    con.execute("CREATE TABLE qc_row_state (row_hash VARCHAR PRIMARY KEY, checked_at TIMESTAMP)")
+    con.execute("INSERT INTO qc_row_state VALUES ('x', now())")
+    con.close()
+
+    check = PipeFittingCheck()
+    run(db, tmp_path, check)
+    assert len(report(tmp_path, check)) == 3
@@ -0,0 +1,31 @@
+import math
+
+import openpyxl
+import pytest
+
+from template_counts import count_template, to_number
+
+
+@pytest.mark.parametrize("value, expected", [
+    (12, 12), (2.5, 2.5), (" 3.25 ", 3.25), ("1e3", 1000.0),
+    (None, None), (True, None), ("n/a", None), ("", None),
+    ("nan", None), ("NaN", None), ("inf", None), ("-Infinity", None),
+    (float("nan"), None), (float("inf"), None),
+])
+def test_to_number(value, expected):
+    assert to_number(value) == expected
+
+
+def test_non_finite_text_does_not_poison_the_sales_total(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["contractor_name", "extended_price"])
+    for row in (["A", 10], ["B", "nan"], ["C", "inf"], ["D", "2.5"]):
+        ws.append(row)
+    path = tmp_path / "t.xlsx"
+    wb.save(path)
+
+    counts = count_template(str(path))
+    assert counts["transaction_count"] == 4
+    assert math.isfinite(counts["sales_total"]) and counts["sales_total"] == 12.5
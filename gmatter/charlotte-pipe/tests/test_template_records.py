@@ -0,0 +1,144 @@
+import random
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import base_convert_to_template as b
+import template_processor
+
+# The web app and the batch script keep their own copies of the record / output code
+MODULES = [pytest.param(b, id="base_convert_to_template"), pytest.param(template_processor, id="template_processor")]
+
+FIELDS = ["contractor_name", "sales_order_number", "order_date", "item_sku", "item_sku_category",
+          "item_upc", "item_description", "unit_price", "ship_quantity", "extended_price"]
+# Cells that exercise every parsing branch (but not the documented differences)
+CELLS = [
+    None, "", "  ", 0, 1, -3, 2.5, 7.0, float("nan"), float("inf"), True, False,
+    date(2024, 1, 2), datetime(2024, 1, 2, 3, 4),
+    "1_000", "1_0.5", "1__0", " $1,234.50 ", "(12)", "( 5 )", "$-5", "-$5", "n/a", "1e3", ".5", "5.",
+    "1.e5", "-0", "+.5e-3", "Total", "subtotal", " TOTAL ", "abc", "SKU-1", "  x  ", "0012",
+    10 ** 20, -2 ** 63, 2 ** 64,
+]
+
+
+def output(m, records, midnight_as_date=False):
+    def norm(v):
+        if isinstance(v, float) and v != v:
+            return "NaN"
+        if midnight_as_date and isinstance(v, datetime) and v == datetime(v.year, v.month, v.day):
+            return v.date()
+        return v
+    return [tuple(map(norm, row)) for row in m._output_rows(records)]
+
+
+def both(m, rows, col_map, batch_rows, monkeypatch, midnight_as_date=False):
+    monkeypatch.setattr(m, "RECORD_BATCH_ROWS", batch_rows)
+    records, _, missing = m.build_records(rows, "Acme", dict(col_map))
+    batches, _, batch_missing = m.build_record_batches(rows, "Acme", dict(col_map))
+    assert missing == batch_missing
+    return output(m, records, midnight_as_date), output(m, batches, midnight_as_date)
+
+
+@pytest.mark.parametrize("m", MODULES)
+@pytest.mark.parametrize("seed", range(200))
+def test_batches_match_build_records(m, seed, monkeypatch):
+    rng = random.Random(seed)
+    width = 12
+    col_map = dict(zip(FIELDS, rng.sample(range(width), len(FIELDS))), _header_row_index=0)
+    rows = [["h"] * width] + [
+        [rng.choice(CELLS) for _ in range(rng.randint(0, width + 2))] for _ in range(40)
+    ]
+    # Mixed date / datetime columns are a documented difference (see test_documented_differences)
+    records, batches = both(m, rows, col_map, rng.choice([1, 7, 50]), monkeypatch, midnight_as_date=True)
+    assert batches == records
+
+
+# template_processor also requires item_sku; it shares the description column
+COL_MAP = {"sales_order_number": 0, "order_date": 1, "item_sku": 2, "item_description": 2, "extended_price": 3,
+           "ship_quantity": 4, "_header_row_index": 0}
+
+
+@pytest.mark.parametrize("column", [
+    [date(2024, 1, 2), float("nan")],     # pa.array raises a plain ValueError
+    [2 ** 63 - 1, -2 ** 63],              # beyond float64's exact integers
+    [float("inf"), "12"],                 # mixed column keeps the number
+    ["1_000", "$1_000.5"],
+])
+@pytest.mark.parametrize("m", MODULES)
+def test_awkward_columns(m, column, monkeypatch):
+    rows = [["so", "date", "desc", "ext", "qty"]] + [["SO1", v, "PIPE", v, v] for v in column]
+    records, batches = both(m, rows, COL_MAP, 50, monkeypatch)
+    assert batches == records
+
+
+@pytest.mark.parametrize("m", MODULES)
+def test_documented_differences(m, monkeypatch):
+    rows = [["so", "date", "desc", "ext", "qty"],
+            ["SO1", date(2024, 1, 2), "PIPE", "nan", "inf"],
+            ["SO2", datetime(2024, 1, 3, 4, 5), "PIPE", "１２", "1"]]
+    records, batches = both(m, rows, COL_MAP, 50, monkeypatch)
+    assert records[0][2] == date(2024, 1, 2) and batches[0][2] == datetime(2024, 1, 2)
+    assert records[0][-1] == "NaN" and batches[0][-1] is None
+    assert records[1][-1] == 12.0 and batches[1][-1] is None
+
+
+def reference_parquet(m, records):
+    """The Parquet columns as written before streaming: _output_rows, then one value at a time."""
+    def text(value):
+        if value is None or value == "":
+            return None
+        return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+    values = list(zip(*m._output_rows(records))) or [()] * len(m.OUTPUT_HEADERS)
+    return {k: [v if k in m.NUMERIC_OUTPUT_FIELDS else text(v) for v in column]
+            for k, column in zip(m.OUTPUT_HEADERS, values)}
+
+
+def read_parquet(m, path):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    assert table.schema == m.PARQUET_SCHEMA
+    return {k: [("NaN" if isinstance(v, float) and v != v else v) for v in table.column(k).to_pylist()]
+            for k in m.OUTPUT_HEADERS}
+
+
+def nan_free(columns):
+    return {k: [("NaN" if isinstance(v, float) and v != v else v) for v in column] for k, column in columns.items()}
+
+
+PARQUET_CELLS = CELLS + [datetime(2024, 1, 2, 3, 4, 5, 600), datetime(1960, 5, 6, 7, 8, 9, 999999), "2024-01-02"]
+
+
+@pytest.mark.parametrize("m", MODULES)
+@pytest.mark.parametrize("seed", range(30))
+def test_parquet_output_matches_the_record_values(m, seed, tmp_path, monkeypatch):
+    rng = random.Random(seed)
+    monkeypatch.setattr(m, "RECORD_BATCH_ROWS", rng.choice([1, 7, 50]))
+    col_map = dict(zip(FIELDS, rng.sample(range(12), len(FIELDS))), _header_row_index=0)
+    rows = [["h"] * 12] + [[rng.choice(PARQUET_CELLS) for _ in range(rng.randint(0, 14))] for _ in range(40)]
+    records, _, _ = m.build_records(rows, "Acme", dict(col_map))
+    batches, _, _ = m.build_record_batches(rows, "Acme", dict(col_map))
+
+    m.write_output_parquet(records, tmp_path / "records.parquet")
+    assert read_parquet(m, tmp_path / "records.parquet") == nan_free(reference_parquet(m, records))
+
+    # Record batches are cast directly, never turned into Python rows
+    monkeypatch.setattr(m, "_output_rows", None)
+    m.write_output_parquet(batches, tmp_path / "batches.parquet")
+    monkeypatch.undo()
+    assert read_parquet(m, tmp_path / "batches.parquet") == nan_free(reference_parquet(m, batches))
+
+
+@pytest.mark.parametrize("m", MODULES)
+def test_parquet_is_written_batch_by_batch(m, tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+    monkeypatch.setattr(m, "RECORD_BATCH_ROWS", 10)
+    records = [{"sales_order_number": f"SO{i}", "extended_price": i} for i in range(35)]
+    m.write_output_parquet(iter(records), tmp_path / "out.parquet")
+    meta = pq.ParquetFile(tmp_path / "out.parquet").metadata
+    assert (meta.num_rows, meta.num_row_groups) == (35, 4)
+
+    m.write_output_parquet([], tmp_path / "empty.parquet")
+    assert pq.read_table(tmp_path / "empty.parquet").schema == m.PARQUET_SCHEMA
@@ -0,0 +1,48 @@
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("python_calamine")
+
+from workbook_reader import open_workbook
+
+
+@pytest.fixture
+def offset_workbook(tmp_path):
+    """A sheet whose data starts at C3, so both backends must pad from A1."""
+    path = tmp_path / "offset.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws["C3"] = "SKU"
+    ws["D3"] = "Qty"
+    ws["C4"] = 12345
+    ws["D4"] = 2.5
+    ws["E6"] = "tail"
+    wb.save(path)
+    return path
+
+
+def read(path, backend, **kwargs):
+    with open_workbook(path, backend) as wb:
+        return list(wb.rows("Data", **kwargs))
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"min_row": 3, "max_row": 4},
+    {"min_row": 4, "min_col": 3, "max_col": 4},
+    {"max_row": 2},
+])
+def test_calamine_rows_match_openpyxl(offset_workbook, kwargs):
+    assert read(offset_workbook, "calamine", **kwargs) == read(offset_workbook, "openpyxl", **kwargs)
+
+
+def test_calamine_rows_are_aligned_to_a1(offset_workbook):
+    rows = read(offset_workbook, "calamine")
+    assert rows[2][2:4] == ("SKU", "Qty")
+    assert rows[3][2:4] == (12345, 2.5)
+    assert rows[5][4] == "tail"
+
+
+def test_calamine_stops_at_max_row(offset_workbook):
+    assert len(read(offset_workbook, "calamine", max_row=4)) == 4